@@ -0,0 +1,270 @@
+'''
+Benchmark the solvers over the puzzle sets in `tests/test_data`.
+
+Run in the root directory of this project:
+
+```bash
+python -m src.bench hard hardest --solvers solve compiled --repeat 5 --output bench.json
+python -m src.bench --baseline bench.json --threshold 0.1
+python -m src.bench --startup-only --repeat 5
+```
+
+Each (solver, data set) is warmed up first (JIT compiling is timed separately as `warmup_time`),
+then every puzzle is solved `repeat` times. The latency of a puzzle is the median of its repeats.
+The exit code is `1` if some result regresses from the baseline by more than the threshold.
+
+With `--startup` (or `--startup-only`), the cold start is also measured in fresh interpreters, see `measure_startup`.
+The exit code is also `1` if `import src.solver` is over the budget (`--import-budget`) or loads a module of `HEAVY_MODULES`.
+'''
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import numba
+import numpy as np
+
+from src.solver import Sudoku
+
+DATA_SETS = ("easy", "mid", "hard", "zbrSuperhard", "hardest")
+SOLVERS = ("solve", "trail", "bitmask", "compiled")
+DATA_DIR = "./tests/test_data"
+
+# 和基线比较的指标，都是越小越好
+COMPARED_METRICS = ("latency_ms.p50", "latency_ms.p90", "latency_ms.p99", "nodes.mean")
+STARTUP_METRICS = ("import_s", "first_solve_s", "warmup_s")
+# import src.solver 不应加载的模块（只有 UI、数据集才用到），以及 import 的时间上限（秒）
+HEAVY_MODULES = ("pandas", "tkinter", "json_tricks", "src.ui", "concurrent.futures")
+IMPORT_BUDGET_S = 1.0
+
+# 在新的解释器里跑，输出一行 JSON
+_STARTUP_SCRIPT = """
+import json, sys, time
+HEAVY_MODULES = %r
+start = time.perf_counter()
+import src.solver
+import_s = time.perf_counter() - start
+heavy_modules = sorted(name for name in HEAVY_MODULES if name in sys.modules)
+from src.solver import Sudoku, warmup
+from src.solver.warmup import WARMUP_PUZZLE
+start = time.perf_counter()
+Sudoku(WARMUP_PUZZLE).solve_compiled()
+first_solve_s = time.perf_counter() - start
+start = time.perf_counter()
+warmup()
+warmup_s = time.perf_counter() - start
+print(json.dumps({"import_s": import_s, "first_solve_s": first_solve_s, "warmup_s": warmup_s, "heavy_modules": heavy_modules}))
+""" % (HEAVY_MODULES,)
+
+def load_puzzles(data_set: str, rows: int | None = None, data_dir: str = DATA_DIR) -> tuple[np.ndarray, np.ndarray | None]:
+    '''Return `(puzzles, solutions)`, both `(N, 9, 9)` int8 arrays. `solutions` is `None` if the data set has none.'''
+    import pandas as pd # 只有读数据集时才用到，--startup-only 不加载
+    df = pd.read_csv(f"{data_dir}/{data_set}.csv", nrows=rows, dtype=str)
+    puzzles = np.array([list(s) for s in df["puzzle"]], dtype=np.int8).reshape(-1, 9, 9)
+    if "solution" not in df.columns:
+        return puzzles, None
+    return puzzles, np.array([list(s) for s in df["solution"]], dtype=np.int8).reshape(-1, 9, 9)
+
+def solve_one(solver: str, puzzle: np.ndarray):
+    '''Return `(assigned_board | None, stats)`.'''
+    if solver == "compiled":
+        ret, stats = Sudoku(puzzle).solve_compiled(with_stats=True)
+    else:
+        ret, stats = Sudoku(puzzle, bitmask=solver == "bitmask", use_trail=solver == "trail").solve(with_stats=True)
+    return (None if ret is None else ret.assigned_board), stats
+
+def bench_one(solver: str, puzzles: np.ndarray, solutions: np.ndarray | None, repeat: int = 3) -> dict:
+    '''Benchmark `solver` over `puzzles`. The first puzzle is solved once more before timing as the warm-up.'''
+    start = time.perf_counter()
+    solve_one(solver, puzzles[0])
+    warmup_time = time.perf_counter() - start
+
+    latencies = np.empty((repeat, len(puzzles)))
+    nodes = np.empty(len(puzzles), dtype=np.int64)
+    run_times = []
+    unsolved = 0
+    for r in range(repeat):
+        run_start = time.perf_counter()
+        for k, puzzle in enumerate(puzzles):
+            start = time.perf_counter()
+            assigned_board, stats = solve_one(solver, puzzle)
+            latencies[r, k] = time.perf_counter() - start
+            if r == 0:
+                # 搜索是确定的，节点数每次都一样
+                nodes[k] = stats.nodes
+                if assigned_board is None or (solutions is not None and not np.array_equal(assigned_board, solutions[k])):
+                    unsolved += 1
+        run_times.append(time.perf_counter() - run_start)
+
+    latency_ms = np.median(latencies, axis=0) * 1000
+    return {
+        "puzzles": len(puzzles),
+        "repeat": repeat,
+        "warmup_time": warmup_time,
+        "latency_ms": {
+            "mean": float(latency_ms.mean()),
+            "p50": float(np.percentile(latency_ms, 50)),
+            "p90": float(np.percentile(latency_ms, 90)),
+            "p99": float(np.percentile(latency_ms, 99)),
+            "max": float(latency_ms.max()),
+        },
+        "nodes": {
+            "mean": float(nodes.mean()),
+            "p50": float(np.percentile(nodes, 50)),
+            "max": int(nodes.max()),
+        },
+        "puzzles_per_second": len(puzzles) / min(run_times),
+        "unsolved": unsolved,
+    }
+
+def measure_startup(repeat: int = 3) -> dict:
+    '''
+    The cold start of a new process, the median of `repeat` fresh interpreters (the numba cache on disk is used as usual):
+        `import_s`: `import src.solver`;
+        `first_solve_s`: the first `solve_compiled` right after the import, including the JIT compiling (or the loading from the cache);
+        `warmup_s`: the default `warmup()` after that, i.e. the kernels of the other paths.
+    Also `heavy_modules`: the `HEAVY_MODULES` loaded by `import src.solver` in any run, see `check_startup`.
+    '''
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = root + os.pathsep + env["PYTHONPATH"] if env.get("PYTHONPATH") else root
+    runs = []
+    for _ in range(repeat):
+        completed = subprocess.run([sys.executable, "-c", _STARTUP_SCRIPT], cwd=root, env=env, capture_output=True, text=True, check=True)
+        runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    return ({metric: float(np.median([run[metric] for run in runs])) for metric in STARTUP_METRICS}
+            | {"heavy_modules": sorted(set().union(*(run["heavy_modules"] for run in runs))), "repeat": repeat})
+
+def check_startup(startup: dict, import_budget: float = IMPORT_BUDGET_S) -> list[str]:
+    '''Return the violations of the import footprint (one line each): `import_s` over `import_budget`, or some `HEAVY_MODULES` loaded.'''
+    violations = []
+    if startup["import_s"] > import_budget:
+        violations.append(f"startup import_s: {startup['import_s']:.4g}s over the budget {import_budget:.4g}s")
+    if startup.get("heavy_modules"):
+        violations.append(f"startup heavy_modules: import src.solver loads {', '.join(startup['heavy_modules'])}")
+    return violations
+
+def format_startup(startup: dict) -> str:
+    return "startup " + " ".join(f"{metric}={startup[metric]:.3f}" for metric in STARTUP_METRICS)
+
+def run_benchmark(data_sets=DATA_SETS, solvers=("solve",), rows: int | None = None, repeat: int = 3, data_dir: str = DATA_DIR, log=None) -> dict:
+    '''Return the report, with the results keyed by `"solver/data_set"`.'''
+    report = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "numba": numba.__version__,
+            "platform": platform.platform(),
+            "rows": rows,
+            "repeat": repeat,
+        },
+        "results": {},
+    }
+    for data_set in data_sets:
+        puzzles, solutions = load_puzzles(data_set, rows, data_dir)
+        if len(puzzles) == 0:
+            continue
+        for solver in solvers:
+            result = bench_one(solver, puzzles, solutions, repeat)
+            report["results"][f"{solver}/{data_set}"] = result
+            if log is not None:
+                log(format_result(f"{solver}/{data_set}", result))
+    return report
+
+def format_result(key: str, result: dict) -> str:
+    latency = result["latency_ms"]
+    return (f"{key:<24} n={result['puzzles']:<5} "
+            f"p50={latency['p50']:.3f}ms p90={latency['p90']:.3f}ms p99={latency['p99']:.3f}ms max={latency['max']:.3f}ms "
+            f"nodes={result['nodes']['mean']:.1f} {result['puzzles_per_second']:.1f}/s "
+            f"warmup={result['warmup_time']:.3f}s" + (f" UNSOLVED={result['unsolved']}" if result["unsolved"] else ""))
+
+def _get_metric(result: dict, metric: str) -> float:
+    value = result
+    for key in metric.split("."):
+        value = value[key]
+    return value
+
+def _increase(old: float, new: float) -> str:
+    # 基线是 0 时（比如只靠传播就解完，nodes.mean 为 0）没有相对比例，写增加的绝对值
+    return f"+{(new / old - 1) * 100:.1f}%" if old > 0 else f"+{new - old:.4g}"
+
+def compare(report: dict, baseline: dict, threshold: float = 0.1) -> list[str]:
+    '''
+    Compare the results with the baseline report, both in the format of `run_benchmark`.
+
+    Return the regressions (one line each): a metric in `COMPARED_METRICS` larger than the baseline by more than `threshold` (relative,
+    so any increase from a baseline of `0`),
+    or a puzzle unsolved. Only the results present in both are compared, the same for the `STARTUP_METRICS` of `"startup"`.
+    '''
+    regressions = []
+    if "startup" in report and "startup" in baseline:
+        for metric in STARTUP_METRICS:
+            old = baseline["startup"][metric]
+            new = report["startup"][metric]
+            if new > old * (1 + threshold):
+                regressions.append(f"startup {metric}: {old:.4g}s -> {new:.4g}s ({_increase(old, new)})")
+    for key, result in report["results"].items():
+        base = baseline["results"].get(key)
+        if base is None:
+            continue
+        if result["unsolved"] > base["unsolved"]:
+            regressions.append(f"{key} unsolved: {base['unsolved']} -> {result['unsolved']}")
+        for metric in COMPARED_METRICS:
+            old = _get_metric(base, metric)
+            new = _get_metric(result, metric)
+            if new > old * (1 + threshold):
+                regressions.append(f"{key} {metric}: {old:.4g} -> {new:.4g} ({_increase(old, new)})")
+    return regressions
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m src.bench", description="Benchmark the solvers over tests/test_data.")
+    parser.add_argument("data_sets", nargs="*", metavar="DATA_SET",
+                        help=f"the data sets, default all of {', '.join(DATA_SETS)}")
+    parser.add_argument("--solvers", nargs="+", choices=SOLVERS, default=["solve"],
+                        help="solve: SolvingBoard; trail: SolvingBoard with the undo trail; bitmask: BitSolvingBoard; compiled: solve_compiled")
+    parser.add_argument("--rows", type=int, default=None, help="the puzzles read from each data set, default all")
+    parser.add_argument("--repeat", type=int, default=3, help="the runs of each puzzle, the latency is the median")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--output", help="write the report as JSON")
+    parser.add_argument("--baseline", help="a report written by --output to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1, help="the relative slowdown counted as a regression, default 0.1")
+    parser.add_argument("--startup", action="store_true", help="also measure the cold start in fresh interpreters (--repeat times)")
+    parser.add_argument("--startup-only", action="store_true", help="only measure the cold start")
+    parser.add_argument("--import-budget", type=float, default=IMPORT_BUDGET_S,
+                        help=f"the seconds allowed for import src.solver with --startup, default {IMPORT_BUDGET_S}")
+    args = parser.parse_args(argv)
+    # nargs="*" 的位置参数不能直接用 choices 加默认列表
+    for data_set in args.data_sets:
+        if data_set not in DATA_SETS:
+            parser.error(f"unknown data set {data_set!r}, choose from {', '.join(DATA_SETS)}")
+
+    data_sets = () if args.startup_only else (args.data_sets or DATA_SETS)
+    report = run_benchmark(data_sets, args.solvers, args.rows, args.repeat, args.data_dir, log=print)
+    violations = []
+    if args.startup or args.startup_only:
+        report["startup"] = measure_startup(args.repeat)
+        print(format_startup(report["startup"]))
+        violations = check_startup(report["startup"], args.import_budget)
+        for line in violations:
+            print(f"VIOLATION {line}")
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if not args.baseline:
+        return 1 if violations else 0
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    regressions = compare(report, baseline, args.threshold)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    if not regressions:
+        print(f"No regression beyond {args.threshold:.0%} from {args.baseline}.")
+    return 1 if regressions or violations else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,5 @@
 from .constraint import Constraint
 from .densemulticell import DenseMultiCellConstraint
-from .killer import KillerConstraint
+from .sparsemulticell import SparseMultiCellConstraint
+from .killer import KillerConstraint, SparseKillerConstraint
 from .ordarrow import OrdArrowConstraint
\ No newline at end of file
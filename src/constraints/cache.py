@@ -0,0 +1,162 @@
+'''
+A persistent on-disk cache of the preprocessing tables (`valid_combinations`, `valid_tuples`) of the multi-cell constraints.
+
+The key is the SHA-256 of the constraint type, the cell positions, the parameters from `cache_params()` (e.g. `killer_sum`)
+and `SCHEMA_VERSION`. Each table is one `.npy` file named by its key, loaded with `mmap_mode="r"`,
+so only the pages actually used are read.
+
+When the total size is over `max_bytes`, the least recently used files (by the modification time, touched on each load) are removed.
+
+The directory is `$SUDOKU_CACHE_DIR`, default `~/.cache/mySudokuSolver`. Set `SUDOKU_CACHE_DIR` to an empty string,
+or call `set_cache(None)`, to disable the cache.
+'''
+
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+
+# 表的格式或者生成方法变了就加一，旧文件自然不再命中
+SCHEMA_VERSION = 1
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+class PreprocessCache:
+    '''A directory of the preprocessing tables, see the module docstring.'''
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def key(self, constraint) -> str | None:
+        '''The key of the table of `constraint`. `None` if it's not cacheable (`cache_params()` returns `None`).'''
+        params = constraint.cache_params()
+        if params is None:
+            return None
+        content = json.dumps({
+            "schema": SCHEMA_VERSION,
+            "type": f"{type(constraint).__module__}.{type(constraint).__qualname__}",
+            "cells": constraint.cell_positions.tolist(),
+            "params": params,
+        }, sort_keys=True)
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.npy")
+
+    def load(self, key: str) -> np.ndarray | None:
+        '''Return the table as a read-only memmap, or `None` if missing (or unreadable).'''
+        path = self.path(key)
+        try:
+            table = np.load(path, mmap_mode="r")
+            # 记录最近使用
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return table
+
+    def store(self, key: str, table: np.ndarray) -> None:
+        '''
+        Write the table, then evict the old ones (not this one). The errors are ignored, the cache is only an optimization.
+        A table larger than `max_bytes` is not written at all.
+        '''
+        # 写了也会马上被删掉，白白写一遍
+        if table.nbytes > self.max_bytes:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # 先写临时文件再改名，其他进程不会读到写了一半的文件
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as file:
+                    np.save(file, np.ascontiguousarray(table))
+                os.replace(tmp_path, self.path(key))
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except OSError:
+            return
+        self.evict(keep=self.path(key))
+
+    def entries(self) -> list[tuple[float, int, str]]:
+        '''Return `(mtime, size, path)` of each table, the least recently used first.'''
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return entries
+        for name in names:
+            if not name.endswith(".npy"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        return entries
+
+    def evict(self, keep: str | None = None) -> None:
+        '''Remove the least recently used tables until the total size is at most `max_bytes`, except the file `keep`.'''
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self) -> None:
+        for _, _, path in self.entries():
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+def _default_cache() -> PreprocessCache | None:
+    directory = os.environ.get("SUDOKU_CACHE_DIR")
+    if directory is None:
+        directory = os.path.join(os.path.expanduser("~"), ".cache", "mySudokuSolver")
+    if not directory:
+        return None
+    return PreprocessCache(directory)
+
+_cache = _default_cache()
+
+def get_cache() -> PreprocessCache | None:
+    return _cache
+
+def set_cache(cache: PreprocessCache | None) -> PreprocessCache | None:
+    '''Replace the cache used by the constraints (`None` to disable). Return the old one.'''
+    global _cache
+    old, _cache = _cache, cache
+    return old
+
+def prepare_table(constraint, table_attr: str) -> None:
+    '''
+    Make the table `table_attr` of `constraint` ready: load it from the cache, or `preprocess()` and store it.
+    Set `constraint.preprocessed_flag`.
+    '''
+    if constraint.preprocessed_flag:
+        return
+    cache = _cache
+    key = None if cache is None else cache.key(constraint)
+    if key is not None:
+        table = cache.load(key)
+        expected = getattr(constraint, table_attr)
+        # SparseMultiCellConstraint 的表行数不定，只比较后面的维度
+        if table is not None and table.dtype == expected.dtype and table.shape[1:] == expected.shape[1:]:
+            # 换成普通的 ndarray 视图（仍然是映射的），numba 不认 np.memmap
+            setattr(constraint, table_attr, np.asarray(table))
+            constraint.preprocessed_flag = True
+            return
+    constraint.preprocess()
+    constraint.preprocessed_flag = True
+    if key is not None:
+        cache.store(key, getattr(constraint, table_attr))
@@ -6,13 +6,34 @@ from abc import ABC, abstractmethod
 import numpy as np
 from src.utils.type_definitions import *
 
+def unit_conflicts(rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+    '''Return an `(n, n)` bool array, whether each two of the cells share a row, column or box (`False` on the diagonal).'''
+    boxes = rows // 3 * 3 + cols // 3
+    conflicts = (rows[:, None] == rows) | (cols[:, None] == cols) | (boxes[:, None] == boxes)
+    np.fill_diagonal(conflicts, False)
+    return conflicts
+
+def masks_to_candboard(rows: np.ndarray, cols: np.ndarray, masks: np.ndarray) -> CandBoard:
+    '''The full candidates board of the 9-bit `masks` on the cells (`rows`, `cols`), the other cells are all `True`.'''
+    cand_board = np.ones((9, 9, 9), dtype=np.bool_)
+    cand_board[rows, cols] = (masks[:, None] >> np.arange(9)) & 1
+    return cand_board
+
+_BIT_WEIGHTS = (1 << np.arange(9)).astype(np.uint16)
+
 class Constraint(ABC):
     '''
     Base class for constraints applied on Sudoku.
 
     Subclasses must implement `is_valid` and `info`.
+
+    The solving boards call `scoped_candidates`, which only reports the cells of the constraint.
+    By default it's derived from `available_candidates` (or `available_candidates_in`), so overriding either one is enough.
     '''
 
+    # 为 `True` 时，求解时会把当前的候选数也传进来（`available_candidates_in`）
+    uses_candidates = False
+
     @property
     def info(self) -> str:
         raise NotImplementedError
@@ -41,3 +62,56 @@ class Constraint(ABC):
             return np.ones((9, 9, 9), dtype=bool)
         else:
             return np.zeros((9, 9, 9), dtype=bool)
+
+    def available_candidates_in(self, assigned_board: NumBoard, candidates_board: CandBoard) -> CandBoard:
+        '''
+        The same as `available_candidates`, but the current candidates of the board are also given,
+        so the constraint can eliminate by the candidates of the unassigned cells, not only by the assigned numbers.
+        The candidates of the assigned cells in `candidates_board` are all `False`.
+
+        The solving boards call this method instead of `available_candidates` if `uses_candidates` is `True`.
+        '''
+        return self.available_candidates(assigned_board)
+
+    def scope(self) -> np.ndarray | None:
+        '''
+        The cells (an `(n, 2)` array) which `scoped_candidates` reads and restricts.
+        The solving boards only evaluate the constraint again after a number is settled on one of them
+        (or on one of their peers, if `uses_candidates`), see `src.solver.watches`.
+
+        The default `None` means the whole board: evaluated after every settle.
+        '''
+        return None
+
+    def lower(self) -> tuple[np.ndarray, np.ndarray] | None:
+        '''
+        The constraint as a table, for the nopython search (see `src.solver.propagator`):
+        a `tuple` of `(cells, tuples)`, the flat indices (`i*9+j`, an `(n,)` int64 array) of the cells,
+        and the valid combinations of the numbers on them (an `(M, n)` int8 array of `1-9`).
+
+        The default `None` means the constraint can't be lowered, then only the Python search supports it.
+        '''
+        return None
+
+    def scoped_candidates(self, assigned_board: NumBoard, candidates_board: CandBoard | None) -> tuple[np.ndarray, np.ndarray]:
+        '''
+        The candidates allowed on the cells in the scope of the constraint, the protocol used by the solving boards.
+        The candidates missing from the masks are eliminated, and the cells not listed are left alone.
+
+        Args:
+            assigned_board: the numbers on the board.
+            candidates_board: the current candidates (all `False` on the assigned cells), given when `uses_candidates` is `True`, else may be `None`.
+
+        Return a `tuple` of `(positions, masks)`: an `(n, 2)` intp array of the cells, and an `(n,)` uint16 array of 9-bit masks
+        (bit `k` for the number `k+1`). A cell may be listed more than once, the masks are then all applied.
+
+        The default packs the full board from `available_candidates_in` (or `available_candidates`),
+        and lists the cells with something eliminated.
+        '''
+        if self.uses_candidates and candidates_board is not None:
+            cand_board = self.available_candidates_in(assigned_board, candidates_board)
+        else:
+            cand_board = self.available_candidates(assigned_board)
+        masks = cand_board.reshape(81, 9) @ _BIT_WEIGHTS
+        cells = np.flatnonzero(masks != 0x1FF)
+        return np.stack((cells // 9, cells % 9), axis=1).astype(np.intp), masks[cells].astype(np.uint16)
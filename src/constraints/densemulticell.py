@@ -1,10 +1,15 @@
 import numpy as np
 import time
-from functools import lru_cache
+from collections import OrderedDict
 from itertools import product
 from typing import Sequence
 from src.utils.type_definitions import *
 from . import Constraint
+from .cache import prepare_table
+from .constraint import masks_to_candboard
+
+# scoped_candidates 的缓存默认最多存多少项
+DEFAULT_CANDIDATE_CACHE_CAPACITY = 4096
 
 class DenseMultiCellConstraint(Constraint):
     '''
@@ -12,23 +17,49 @@ class DenseMultiCellConstraint(Constraint):
 
     Subclasses must implement `is_valid`.
     The method `available_candidates` will be implemented automatically.
+
+    The masks of `scoped_candidates` are cached in `candidate_cache` by the values on the cells,
+    the capacity is `candidate_cache_capacity` (`0` to disable).
     '''
 
-    def __init__(self, ls: Sequence[Position], prep_at_init: bool = True) -> None:
+    def __init__(self, ls: Sequence[Position], prep_at_init: bool = True, candidate_cache_capacity: int = DEFAULT_CANDIDATE_CACHE_CAPACITY) -> None:
         self.cell_positions = np.array(ls).astype(np.intp)
         self.cell_nums = len(ls)
         self.rows = self.cell_positions[:, 0]
         self.cols = self.cell_positions[:, 1]
+        self.flat_cells = self.rows * 9 + self.cols
+        # 每格 4 位拼成一个整数做缓存的键，超过 15 格就放不进 int64 了
+        self._key_weights = (np.int64(16) ** np.arange(self.cell_nums, dtype=np.int64)) if self.cell_nums <= 15 else None
 
         self.valid_combinations = np.zeros((9,) * self.cell_nums, dtype=np.bool_)
+        self.candidate_cache = CandidateCache(candidate_cache_capacity)
 
         self.preprocessed_flag = False
 
         if prep_at_init == True:
-            self.preprocess()
-            self.preprocessed_flag = True
+            self.prepare()
         
     
+    def scope(self) -> np.ndarray:
+        return self.cell_positions
+
+    def lower(self) -> tuple[np.ndarray, np.ndarray]:
+        '''The `True` entries of `valid_combinations` as the rows of the table.'''
+        if not self.preprocessed_flag:
+            self.prepare()
+        return self.flat_cells.astype(np.int64), (np.argwhere(self.valid_combinations) + 1).astype(np.int8)
+
+    def cache_params(self) -> dict | None:
+        '''
+        The parameters which decide `valid_combinations` besides the type and the cells (e.g. `{"killer_sum": 26}`),
+        for the on-disk cache (see `src.constraints.cache`). The default `None` means not cached.
+        '''
+        return None
+
+    def prepare(self) -> None:
+        '''Load `valid_combinations` from the on-disk cache, or `preprocess` (and store it) if missing. Do nothing if already done.'''
+        prepare_table(self, "valid_combinations")
+
     def preprocess(self) -> None:
         '''这个方法有可能被子类重写，不要在这里改 `self.precrocessed_flag` '''
         print("Preprocessing...")
@@ -48,29 +79,108 @@ class DenseMultiCellConstraint(Constraint):
         return
     
     def available_candidates(self, assigned_board: NumBoard) -> CandBoard:
+        _, masks = self.scoped_candidates(assigned_board, None)
+        return masks_to_candboard(self.rows, self.cols, masks)
+
+    def scoped_candidates(self, assigned_board: NumBoard, candidates_board: CandBoard | None) -> tuple[np.ndarray, np.ndarray]:
+        '''The masks of all the cells of the constraint (`0x1FF` on the assigned ones), no full board is built.'''
         if not self.preprocessed_flag:
-            self.preprocess()
-            self.preprocessed_flag = True
-        values = assigned_board[self.rows, self.cols]
-        return self.valuetuple_to_candboard(tuple(values))
+            self.prepare()
+        # take 比用 rows, cols 两个数组索引快
+        values = assigned_board.take(self.flat_cells)
+        key = int(values @ self._key_weights) if self._key_weights is not None else values.tobytes()
+        masks = self.candidate_cache.get(key)
+        if masks is None:
+            masks = self.values_to_masks(values)
+            self.candidate_cache.put(key, masks)
+        return self.cell_positions, masks
 
-    @lru_cache(maxsize=4096)
-    def valuetuple_to_candboard(self, values: tuple) -> CandBoard:
-        cand_board = np.ones((9, 9, 9), dtype=np.bool_)
-        slices = []
-        unassigneds = []
-
-        for num, x, y in zip(values, self.rows, self.cols):
-            if num > 0:
-                slices.append(num-1)
-            else:
-                slices.append(slice(None))
-                unassigneds.append((num, x, y))
-            
-        subarray = self.valid_combinations[tuple(slices)]
-        
-        for idx, (num, x, y) in enumerate(unassigneds):
+    def values_to_masks(self, values: np.ndarray) -> np.ndarray:
+        '''
+        The candidates of each cell allowed by `valid_combinations`, given the `values` on the cells (`0` means not assigned).
+
+        Return a `(cell_nums,)` uint16 array of 9-bit masks, the assigned cells are `0x1FF`.
+        '''
+        slices = tuple(num - 1 if num > 0 else slice(None) for num in values)
+        subarray = self.valid_combinations[slices]
+
+        masks = np.full(self.cell_nums, 0x1FF, dtype=np.uint16)
+        unassigneds = np.flatnonzero(values == 0)
+        for idx, k in enumerate(unassigneds):
             possible_cands = np.moveaxis(subarray, idx, 0).reshape(9, -1).any(axis=1)
-            cand_board[x, y] &= possible_cands
-        
-        return cand_board
+            masks[k] = possible_cands @ (1 << np.arange(9))
+        return masks
+
+    def valuetuple_to_candboard(self, values: tuple) -> CandBoard:
+        return masks_to_candboard(self.rows, self.cols, self.values_to_masks(np.array(values)))
+
+class CandidateCache:
+    '''
+    A small LRU cache of the candidate masks of one constraint, keyed by the packed values on its cells.
+
+    Only `capacity` is saved (pickle, or json_tricks in the UI), the entries and the counts start empty again after loading.
+
+    Attributes:
+        capacity: the max number of entries, `0` means disabled.
+        hits, misses: the counts of `get`.
+    '''
+
+    def __init__(self, capacity: int = DEFAULT_CANDIDATE_CACHE_CAPACITY) -> None:
+        self.capacity = capacity
+        self.entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key) -> np.ndarray | None:
+        masks = self.entries.get(key)
+        if masks is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        try:
+            self.entries.move_to_end(key)
+        except KeyError:
+            # 多线程时可能刚被别的线程挤掉，不影响结果
+            pass
+        return masks
+
+    def put(self, key, masks: np.ndarray) -> None:
+        if self.capacity <= 0:
+            return
+        self.entries[key] = masks
+        while len(self.entries) > self.capacity:
+            try:
+                self.entries.popitem(last=False)
+            except KeyError:
+                break
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __getstate__(self) -> dict:
+        return {"capacity": self.capacity}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(state["capacity"])
+
+    # json_tricks 用这两个方法（否则会存下 entries，而且读回来的键变成了字符串）
+    def __json_encode__(self) -> dict:
+        return self.__getstate__()
+
+    def __json_decode__(self, **attrs) -> None:
+        self.__setstate__(attrs)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @property
+    def nbytes(self) -> int:
+        '''The bytes of the cached masks (without the dict overhead).'''
+        return sum(masks.nbytes for masks in self.entries.values())
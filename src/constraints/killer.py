@@ -1,14 +1,18 @@
 import numpy as np
 import time
-from numba import njit, prange
+from itertools import combinations
+from numba import njit
 from typing import Sequence
-from . import DenseMultiCellConstraint
+from . import DenseMultiCellConstraint, SparseMultiCellConstraint
+from .constraint import unit_conflicts
+from .densemulticell import DEFAULT_CANDIDATE_CACHE_CAPACITY
 from src.utils.type_definitions import *
 
 class KillerConstraint(DenseMultiCellConstraint):
-    def __init__(self, ls: Sequence[Position], killer_sum: int, prep_at_init: bool = True) -> None:
+    def __init__(self, ls: Sequence[Position], killer_sum: int, prep_at_init: bool = True,
+                 candidate_cache_capacity: int = DEFAULT_CANDIDATE_CACHE_CAPACITY) -> None:
         self.killer_sum = killer_sum
-        super().__init__(ls, prep_at_init=prep_at_init)
+        super().__init__(ls, prep_at_init=prep_at_init, candidate_cache_capacity=candidate_cache_capacity)
     
     @property
     def info(self) -> str:
@@ -17,22 +21,141 @@ class KillerConstraint(DenseMultiCellConstraint):
     
     def is_valid(self, assigned_board: NumBoard) -> bool:
         return _numba_is_valid(assigned_board, self.rows, self.cols, self.killer_sum)
+
+    def cache_params(self) -> dict:
+        return {"killer_sum": int(self.killer_sum)}
     
     def preprocess(self) -> None:
+        '''Only the combinations from `killer_combinations` are marked, the repeated digits in a unit are left `False`.'''
         print("Preprocessing...")
         time_counter = time.perf_counter()
 
-        combo_count = _numba_preprocess(
-            self.valid_combinations,
-            self.cell_nums,
-            self.rows, self.cols,
-            self.killer_sum
-        )
-        
+        combos = killer_combinations(unit_conflicts(self.rows, self.cols), self.killer_sum)
+        self.valid_combinations[tuple(combos.T - 1)] = True
+        combo_count = len(combos)
+
         print(f"Preprocessed. combo_count={combo_count}. time={time.perf_counter() - time_counter:.6f}")
         return
 
-@njit(nogil=True)
+class SparseKillerConstraint(SparseMultiCellConstraint):
+    '''
+    `KillerConstraint` with the sparse table, for the large cages: only the combinations with the sum are generated and stored.
+    The digits of the cells sharing a row, column or box are distinct.
+    '''
+
+    def __init__(self, ls: Sequence[Position], killer_sum: int, prep_at_init: bool = True) -> None:
+        self.killer_sum = killer_sum
+        super().__init__(ls, prep_at_init=prep_at_init)
+
+    @property
+    def info(self) -> str:
+        sl = [f"({x},{y})" for x,y in self.cell_positions.tolist()]
+        return f"SparseKillerConstraint\n{' + '.join(sl)} = {self.killer_sum}\n"
+
+    def is_valid(self, assigned_board: NumBoard) -> bool:
+        return _numba_is_valid(assigned_board, self.rows, self.cols, self.killer_sum)
+
+    def cache_params(self) -> dict:
+        return {"killer_sum": int(self.killer_sum)}
+
+    def generate_combinations(self) -> np.ndarray:
+        return killer_combinations(self.conflicts, self.killer_sum)
+
+def killer_combinations(conflicts: np.ndarray, killer_sum: int) -> np.ndarray:
+    '''
+    All the combinations of digits with the sum `killer_sum`, with distinct digits on the conflicting cells
+    (`conflicts[a, b]` is whether cell `a` and `b` share a row, column or box).
+
+    If all the cells conflict with each other (e.g. a cage in a box), the digit sets with the sum are chosen first,
+    and each of them is expanded by all the permutations. Otherwise a pruned depth-first search is used.
+
+    Return an `(M, cell_nums)` int8 array.
+    '''
+    cell_nums = len(conflicts)
+    if np.all(conflicts | np.eye(cell_nums, dtype=np.bool_)):
+        digit_sets = [digits for digits in combinations(range(1, 10), cell_nums) if sum(digits) == killer_sum]
+        if not digit_sets:
+            return np.zeros((0, cell_nums), dtype=np.int8)
+        perms = _numba_permutations(cell_nums)
+        return np.concatenate([np.array(digits, dtype=np.int8)[perms] for digits in digit_sets])
+
+    # 先数一遍，再分配数组填一遍
+    count = _numba_sum_combinations(cell_nums, killer_sum, conflicts, None)
+    combos = np.empty((count, cell_nums), dtype=np.int8)
+    _numba_sum_combinations(cell_nums, killer_sum, conflicts, combos)
+    return combos
+
+@njit(nogil=True, cache=True)
+def _numba_permutations(n):
+    '''All the permutations of `range(n)` in lexicographic order, as an `(n!, n)` int8 array.'''
+    total = 1
+    for k in range(2, n + 1):
+        total *= k
+    perms = np.empty((total, n), dtype=np.int8)
+    p = np.arange(n).astype(np.int8)
+    for t in range(total):
+        perms[t] = p
+        # 下一个排列
+        i = n - 2
+        while i >= 0 and p[i] >= p[i + 1]:
+            i -= 1
+        if i < 0:
+            break
+        j = n - 1
+        while p[j] <= p[i]:
+            j -= 1
+        p[i], p[j] = p[j], p[i]
+        p[i + 1:] = p[i + 1:][::-1].copy()
+    return perms
+
+@njit(nogil=True, cache=True)
+def _numba_sum_combinations(cell_nums, killer_sum, conflicts, out):
+    '''
+    Depth-first search over the combinations with the sum `killer_sum`, with distinct digits on the conflicting cells.
+    The partial sums which can't reach `killer_sum` are cut off. Write the combinations into `out` if not `None`.
+
+    Return the count.
+    '''
+    values = np.zeros(cell_nums, dtype=np.int64)
+    count = 0
+    partial = 0 # values[:k] 的和
+    k = 0
+    while k >= 0:
+        rest = cell_nums - k - 1
+        num = values[k] + 1
+        while num <= 9:
+            if partial + num + rest > killer_sum:
+                # 更大的数只会更大
+                num = 10
+                break
+            if partial + num + 9 * rest >= killer_sum:
+                repeated = False
+                for m in range(k):
+                    if conflicts[k, m] and values[m] == num:
+                        repeated = True
+                        break
+                if not repeated:
+                    break
+            num += 1
+        if num > 9:
+            # 这一层试完了，回到上一层
+            values[k] = 0
+            k -= 1
+            if k >= 0:
+                partial -= values[k]
+            continue
+        values[k] = num
+        if rest == 0:
+            if out is not None:
+                for m in range(cell_nums):
+                    out[count, m] = values[m]
+            count += 1
+            continue
+        partial += num
+        k += 1
+    return count
+
+@njit(nogil=True, cache=True)
 def _numba_is_valid(board: np.ndarray, rows: np.ndarray, cols: np.ndarray, killer_sum: int) -> bool:
     sum = 0
     for i in range(len(rows)):
@@ -42,25 +165,3 @@ def _numba_is_valid(board: np.ndarray, rows: np.ndarray, cols: np.ndarray, kille
             return True  
         sum += val
     return sum == killer_sum
-
-@njit(nogil=True, parallel=True)
-def _numba_preprocess(valid_combinations: np.ndarray, cell_nums, rows, cols, killer_sum):
-    combo_count = 0
-    total = 9 ** cell_nums
-    powers = 9 ** np.arange(cell_nums-1, -1, -1)
-
-    for index in prange(total):
-        # 为了线程安全，只好单开
-        temp_board = np.zeros((9, 9), dtype=np.int8)
-
-        # 将线性索引转换为多维索引
-        combo = (index // powers) % 9
-
-        for i in range(cell_nums):
-            temp_board[rows[i], cols[i]] = combo[i] + 1
-
-        if _numba_is_valid(temp_board, rows, cols, killer_sum):
-            valid_combinations.flat[index] = True
-            combo_count += 1
-    
-    return combo_count
\ No newline at end of file
@@ -3,11 +3,13 @@ import time
 from numba import njit, prange
 from src.utils.ordinal import Ordinal, digit2ord
 from . import DenseMultiCellConstraint
+from .densemulticell import DEFAULT_CANDIDATE_CACHE_CAPACITY
 
 class OrdArrowConstraint(DenseMultiCellConstraint):
-    def __init__(self, sum_pos_list: list, prod_pos_list: list, prep_at_init: bool = True):
+    def __init__(self, sum_pos_list: list, prod_pos_list: list, prep_at_init: bool = True,
+                 candidate_cache_capacity: int = DEFAULT_CANDIDATE_CACHE_CAPACITY):
         self.sum_len = len(sum_pos_list)
-        super().__init__(sum_pos_list + prod_pos_list, prep_at_init=prep_at_init)
+        super().__init__(sum_pos_list + prod_pos_list, prep_at_init=prep_at_init, candidate_cache_capacity=candidate_cache_capacity)
 
     @property
     def sum_pos_list(self):
@@ -25,21 +27,27 @@ class OrdArrowConstraint(DenseMultiCellConstraint):
     
     def is_valid(self, assigned_board):
         return _numba_is_valid(assigned_board, self.sum_pos_list, self.prod_pos_list)
+
+    def cache_params(self) -> dict:
+        return {"sum_len": self.sum_len}
     
     def preprocess(self) -> None:
         print("Preprocessing...")
         time_counter = time.perf_counter()
 
-        combo_count = _numba_preprocess(
+        _numba_preprocess(
             self.valid_combinations,
             self.cell_nums,
             self.rows, self.cols,
             self.sum_pos_list, self.prod_pos_list
         )
+        # 在 prange 里累加计数会有竞争，结束后再数
+        combo_count = int(np.count_nonzero(self.valid_combinations))
         
         print(f"Preprocessed. combo_count={combo_count}. time={time.perf_counter() - time_counter:.6f}")
         return
 
+# 用到了 jitclass 的 Ordinal，numba 不能把这两个缓存到磁盘上
 @njit(nogil=True)
 def _numba_is_valid(assigned_board, sum_pos_list, prod_pos_list):
     board_sum = Ordinal([0])
@@ -63,7 +71,6 @@ def _numba_is_valid(assigned_board, sum_pos_list, prod_pos_list):
 
 @njit(nogil=True, parallel=True)
 def _numba_preprocess(valid_combinations: np.ndarray, cell_nums, rows, cols, sum_pos_list, prod_pos_list):
-    combo_count = 0
     total = 9 ** cell_nums
     powers = 9 ** np.arange(cell_nums-1, -1, -1)
 
@@ -79,6 +86,3 @@ def _numba_preprocess(valid_combinations: np.ndarray, cell_nums, rows, cols, sum
 
         if _numba_is_valid(temp_board, sum_pos_list, prod_pos_list):
             valid_combinations.flat[index] = True
-            combo_count += 1
-    
-    return combo_count
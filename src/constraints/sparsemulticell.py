@@ -0,0 +1,162 @@
+import numpy as np
+import time
+from numba import njit
+from typing import Sequence
+from src.utils.type_definitions import *
+from . import Constraint
+from .cache import prepare_table
+from .constraint import unit_conflicts, masks_to_candboard
+
+class SparseMultiCellConstraint(Constraint):
+    '''
+    The sparse version of `DenseMultiCellConstraint`: only the valid combinations are stored,
+    as rows of `valid_tuples` (an `(M, cell_nums)` int8 array of digits `1-9`), instead of a `9 ** cell_nums` table.
+
+    `scoped_candidates` keeps the candidates of the cells supported by some row (generalized arc consistency):
+    a row supports the candidates only if each of its digits is still a candidate of (or assigned on) its cell.
+
+    Subclasses must implement `is_valid`.
+    They should implement `is_prefix_valid` to prune the default `generate_combinations` (a `9 ** cell_nums` search without it),
+    or override `generate_combinations` to build the rows directly, e.g. `SparseKillerConstraint`.
+    '''
+
+    uses_candidates = True
+
+    def __init__(self, ls: Sequence[Position], prep_at_init: bool = True) -> None:
+        self.cell_positions = np.array(ls).astype(np.intp)
+        self.cell_nums = len(ls)
+        self.rows = self.cell_positions[:, 0]
+        self.cols = self.cell_positions[:, 1]
+        # 两个格子在同一行、列或宫里，就不能填同一个数
+        self.conflicts = unit_conflicts(self.rows, self.cols)
+
+        self.valid_tuples = np.zeros((0, self.cell_nums), dtype=np.int8)
+
+        self.preprocessed_flag = False
+
+        if prep_at_init == True:
+            self.prepare()
+
+    def scope(self) -> np.ndarray:
+        return self.cell_positions
+
+    def lower(self) -> tuple[np.ndarray, np.ndarray]:
+        self.prepare()
+        return (self.rows * 9 + self.cols).astype(np.int64), self.valid_tuples
+
+    def cache_params(self) -> dict | None:
+        '''
+        The parameters which decide `valid_tuples` besides the type and the cells (e.g. `{"killer_sum": 26}`),
+        for the on-disk cache (see `src.constraints.cache`). The default `None` means not cached.
+        '''
+        return None
+
+    def prepare(self) -> None:
+        '''Load `valid_tuples` from the on-disk cache, or `preprocess` (and store it) if missing. Do nothing if already done.'''
+        prepare_table(self, "valid_tuples")
+
+    def preprocess(self) -> None:
+        '''这个方法有可能被子类重写，不要在这里改 `self.precrocessed_flag` '''
+        print("Preprocessing...")
+        time_counter = time.perf_counter()
+
+        self.valid_tuples = np.ascontiguousarray(self.generate_combinations(), dtype=np.int8).reshape(-1, self.cell_nums)
+
+        print(f"Preprocessed. combo_count={len(self.valid_tuples)}. time={time.perf_counter() - time_counter:.6f}")
+        return
+
+    def generate_combinations(self) -> np.ndarray:
+        '''
+        Return the valid combinations as an `(M, cell_nums)` array.
+
+        The default is a depth-first search over the cells, which skips the digits repeated in a row, column or box
+        (they can never be placed) and the prefixes rejected by `is_prefix_valid`, and calls `is_valid` on each complete combination.
+        '''
+        temp_board = np.zeros((9, 9), dtype=np.int8)
+        values = np.zeros(self.cell_nums, dtype=np.int8)
+        combos = []
+
+        def dfs(k: int) -> None:
+            if k == self.cell_nums:
+                temp_board[self.rows, self.cols] = values
+                if self.is_valid(temp_board):
+                    combos.append(values.copy())
+                return
+            for num in range(1, 10):
+                if np.any(values[:k][self.conflicts[k, :k]] == num):
+                    continue
+                values[k] = num
+                if self.is_prefix_valid(values[:k + 1]):
+                    dfs(k + 1)
+            values[k] = 0
+
+        dfs(0)
+        return np.array(combos, dtype=np.int8).reshape(-1, self.cell_nums)
+
+    def is_prefix_valid(self, values: np.ndarray) -> bool:
+        '''
+        Whether the digits `values` of the first `len(values)` cells can still be completed into a valid combination.
+        Return `False` to skip all the combinations starting with them in `generate_combinations`, e.g. when a partial sum is too large.
+
+        The default `True` never prunes.
+        '''
+        return True
+
+    def available_candidates(self, assigned_board: NumBoard) -> CandBoard:
+        self.prepare()
+        return masks_to_candboard(self.rows, self.cols, _numba_table_masks(self.valid_tuples, self.rows, self.cols, assigned_board, None))
+
+    def available_candidates_in(self, assigned_board: NumBoard, candidates_board: CandBoard) -> CandBoard:
+        self.prepare()
+        return masks_to_candboard(self.rows, self.cols, _numba_table_masks(self.valid_tuples, self.rows, self.cols, assigned_board, candidates_board))
+
+    def scoped_candidates(self, assigned_board: NumBoard, candidates_board: CandBoard | None) -> tuple[np.ndarray, np.ndarray]:
+        self.prepare()
+        return self.cell_positions, _numba_table_masks(self.valid_tuples, self.rows, self.cols, assigned_board, candidates_board)
+
+@njit(nogil=True, cache=True)
+def _numba_table_masks(valid_tuples, rows, cols, assigned_board, candidates_board):
+    '''
+    The masks of the candidates supported by the rows of `valid_tuples`, `0x1FF` on the assigned cells.
+
+    `candidates_board` is `None` means all the digits are candidates of the unassigned cells.
+    '''
+    cell_nums = len(rows)
+    # 每个格子的可选数字（bitmask），已填的格子只有那个数
+    domains = np.zeros(cell_nums, dtype=np.int64)
+    for k in range(cell_nums):
+        num = assigned_board[rows[k], cols[k]]
+        if num > 0:
+            domains[k] = 1 << (num - 1)
+        elif candidates_board is None:
+            domains[k] = 0x1FF
+        else:
+            for n in range(9):
+                if candidates_board[rows[k], cols[k], n]:
+                    domains[k] |= 1 << n
+
+    supports = np.zeros(cell_nums, dtype=np.int64)
+    for t in range(valid_tuples.shape[0]):
+        supported = True
+        for k in range(cell_nums):
+            if not (domains[k] >> (valid_tuples[t, k] - 1)) & 1:
+                supported = False
+                break
+        if not supported:
+            continue
+        complete = True
+        for k in range(cell_nums):
+            supports[k] |= 1 << (valid_tuples[t, k] - 1)
+            if supports[k] != domains[k]:
+                complete = False
+        if complete:
+            # 每个候选数都有支持了，后面的行不会再删掉什么
+            break
+
+    masks = np.empty(cell_nums, dtype=np.uint16)
+    for k in range(cell_nums):
+        if assigned_board[rows[k], cols[k]] > 0:
+            masks[k] = 0x1FF
+        else:
+            masks[k] = supports[k]
+    return masks
@@ -0,0 +1,214 @@
+'''
+A packed binary puzzle format, loaded with `np.memmap`.
+
+Layout: a 16-byte header, then one fixed-size record per puzzle.
+    header: `b"SDKP"`, version (uint8), layout (uint8), reserved (uint16), count (uint64), little endian;
+    `BYTES` layout: 81 bytes per puzzle, one cell per byte (`0` means not assigned);
+    `NIBBLES` layout: 41 bytes per puzzle, cell `2k` in the low nibble of byte `k`, cell `2k+1` in the high nibble.
+
+The `BYTES` records are read as an `(N, 81)` int8 memmap and handed to `solve_many` as they are;
+`solve_packed` writes the solutions straight into the memmap of the output file.
+
+Run in the root directory of this project:
+
+```bash
+python -m src.packed pack tests/test_data/hard.csv hard.sdk [--nibbles]
+python -m src.packed solve hard.sdk hard_solutions.sdk [--parallel]
+python -m src.packed unpack hard_solutions.sdk hard_solutions.csv
+```
+'''
+
+import argparse
+import struct
+import sys
+import numpy as np
+from numba import njit
+from numpy.typing import NDArray
+
+from src.solver import solve_many
+from src.solver.batch import STATUS_NAMES
+
+MAGIC = b"SDKP"
+VERSION = 1
+HEADER_FORMAT = "<4sBBHQ"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT) # 16
+
+# layout
+BYTES = 0
+NIBBLES = 1
+RECORD_SIZES = {BYTES: 81, NIBBLES: 41}
+
+def read_header(path: str) -> tuple[int, int]:
+    '''Return `(layout, count)`.'''
+    with open(path, "rb") as file:
+        data = file.read(HEADER_SIZE)
+    if len(data) < HEADER_SIZE:
+        raise ValueError(f"{path} is not a packed puzzle file.")
+    magic, version, layout, _, count = struct.unpack(HEADER_FORMAT, data)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a packed puzzle file.")
+    if version != VERSION or layout not in RECORD_SIZES:
+        raise ValueError(f"Unsupported packed puzzle file {path}: version {version}, layout {layout}.")
+    return layout, count
+
+def _write_header(file, layout: int, count: int) -> None:
+    file.seek(0)
+    file.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, layout, 0, count))
+
+def open_packed(path: str, mode: str = "r") -> tuple[np.memmap, int]:
+    '''
+    Memory-map the records of a packed file. `mode` is the same as `np.memmap` (`"r"`, `"r+"` or `"c"`).
+
+    Return `(records, layout)`, `records` is an `(N, 81)` int8 memmap for `BYTES`, or an `(N, 41)` uint8 memmap for `NIBBLES`.
+    '''
+    layout, count = read_header(path)
+    if count == 0:
+        # 长度为 0 的文件不能 mmap
+        return np.zeros((0, RECORD_SIZES[layout]), dtype=np.int8 if layout == BYTES else np.uint8), layout
+    dtype = np.int8 if layout == BYTES else np.uint8
+    return np.memmap(path, dtype=dtype, mode=mode, offset=HEADER_SIZE, shape=(count, RECORD_SIZES[layout])), layout
+
+def create_packed(path: str, count: int, layout: int = BYTES) -> np.memmap | np.ndarray:
+    '''Create a packed file of `count` zero records, and return its records opened with `"r+"`.'''
+    with open(path, "wb") as file:
+        _write_header(file, layout, count)
+        file.truncate(HEADER_SIZE + count * RECORD_SIZES[layout])
+    return open_packed(path, "r+")[0]
+
+def load_packed(path: str) -> NDArray[np.int8]:
+    '''Return all the puzzles as an `(N, 81)` int8 array. No copy for `BYTES` (a read-only memmap).'''
+    records, layout = open_packed(path)
+    if layout == BYTES:
+        return records
+    return unpack_nibbles(records)
+
+def write_packed(path: str, puzzles: NDArray, layout: int = BYTES) -> None:
+    '''Write puzzles of shape `(N, 81)` (or `(N, 9, 9)`) into a new packed file.'''
+    puzzles = np.ascontiguousarray(puzzles, dtype=np.int8).reshape(-1, 81)
+    records = create_packed(path, len(puzzles), layout)
+    if len(puzzles):
+        records[:] = puzzles if layout == BYTES else pack_nibbles(puzzles)
+        records.flush()
+
+def pack_nibbles(puzzles: NDArray[np.int8]) -> NDArray[np.uint8]:
+    '''`(N, 81)` cells to `(N, 41)` nibble records.'''
+    return _numba_pack_nibbles(np.ascontiguousarray(puzzles, dtype=np.int8).reshape(-1, 81))
+
+def unpack_nibbles(records: NDArray[np.uint8]) -> NDArray[np.int8]:
+    '''`(N, 41)` nibble records to `(N, 81)` cells.'''
+    out = np.empty((len(records), 81), dtype=np.int8)
+    _numba_unpack_nibbles(np.asarray(records), out)
+    return out
+
+@njit(nogil=True, cache=True)
+def _numba_pack_nibbles(puzzles):
+    n = puzzles.shape[0]
+    records = np.zeros((n, 41), dtype=np.uint8)
+    for k in range(n):
+        for c in range(81):
+            records[k, c >> 1] |= np.uint8((puzzles[k, c] & 0xF) << ((c & 1) * 4))
+    return records
+
+@njit(nogil=True, cache=True)
+def _numba_unpack_nibbles(records, out):
+    for k in range(records.shape[0]):
+        for c in range(81):
+            out[k, c] = (records[k, c >> 1] >> ((c & 1) * 4)) & 0xF
+
+def csv_to_packed(csv_path: str, packed_path: str, layout: int = BYTES, column: str = "puzzle", chunk_size: int = 100000) -> int:
+    '''Convert a column of a CSV data set (e.g. `tests/test_data/*.csv`) chunk by chunk. Return the count.'''
+    import pandas as pd
+
+    count = 0
+    with open(packed_path, "wb") as file:
+        _write_header(file, layout, 0)
+        for df in pd.read_csv(csv_path, usecols=[column], dtype=str, chunksize=chunk_size):
+            strs = df[column].str.replace(".", "0", regex=False)
+            if not strs.str.fullmatch("[0-9]{81}").all():
+                raise ValueError(f"{csv_path}: every {column} must be 81 digits.")
+            puzzles = (np.frombuffer("".join(strs).encode("ascii"), dtype=np.uint8).reshape(-1, 81) - ord("0")).astype(np.int8)
+            file.write((puzzles if layout == BYTES else pack_nibbles(puzzles)).tobytes())
+            count += len(puzzles)
+        # 写完才知道数量，回头补上
+        _write_header(file, layout, count)
+    return count
+
+def packed_to_csv(packed_path: str, csv_path: str, column: str = "puzzle", chunk_size: int = 100000) -> int:
+    '''Write the puzzles of a packed file as a one-column CSV. Return the count.'''
+    records, layout = open_packed(packed_path)
+    with open(csv_path, "w", newline="") as file:
+        file.write(f"{column}\n")
+        for start in range(0, len(records), chunk_size):
+            chunk = records[start:start+chunk_size]
+            cells = chunk if layout == BYTES else unpack_nibbles(chunk)
+            text = (np.asarray(cells, dtype=np.uint8) + ord("0")).astype(np.uint8)
+            file.write("\n".join(row.tobytes().decode("ascii") for row in text) + "\n")
+    return len(records)
+
+def solve_packed(input_path: str,
+                 output_path: str,
+                 chunk_size: int = 65536,
+                 max_nodes: int = 0,
+                 parallel: bool = False,
+                 num_threads: int | None = None
+                 ) -> NDArray[np.int8]:
+    '''
+    Solve every puzzle of a packed file, and write the solutions into a new packed file of the same layout.
+    Rows of unsolved puzzles are all `0`.
+
+    With the `BYTES` layout, the slices of the input memmap go to `solve_many` without copying,
+    and the solutions are written straight into the output memmap.
+
+    Return the status array (see `solve_many`).
+    '''
+    records, layout = open_packed(input_path)
+    solutions = create_packed(output_path, len(records), layout)
+    status = np.empty(len(records), dtype=np.int8)
+    buffer = np.empty((min(chunk_size, len(records)), 81), dtype=np.int8) # NIBBLES 的解先写在这里
+    for start in range(0, len(records), chunk_size):
+        stop = min(start + chunk_size, len(records))
+        if layout == BYTES:
+            _, status[start:stop], _ = solve_many(records[start:stop], max_nodes, parallel, num_threads, out=solutions[start:stop])
+        else:
+            out = buffer[:stop-start]
+            _, status[start:stop], _ = solve_many(unpack_nibbles(records[start:stop]), max_nodes, parallel, num_threads, out=out)
+            solutions[start:stop] = pack_nibbles(out)
+    if isinstance(solutions, np.memmap):
+        solutions.flush()
+    return status
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m src.packed", description="Convert and solve packed binary puzzle files.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    pack_parser = subparsers.add_parser("pack", help="CSV to packed")
+    pack_parser.add_argument("csv")
+    pack_parser.add_argument("packed")
+    pack_parser.add_argument("--column", default="puzzle")
+    pack_parser.add_argument("--nibbles", action="store_true", help="41 bytes per puzzle instead of 81")
+    unpack_parser = subparsers.add_parser("unpack", help="packed to CSV")
+    unpack_parser.add_argument("packed")
+    unpack_parser.add_argument("csv")
+    unpack_parser.add_argument("--column", default="puzzle")
+    solve_parser = subparsers.add_parser("solve", help="solve a packed file into a packed file of solutions")
+    solve_parser.add_argument("packed")
+    solve_parser.add_argument("output")
+    solve_parser.add_argument("--chunk-size", type=int, default=65536)
+    solve_parser.add_argument("--max-nodes", type=int, default=0)
+    solve_parser.add_argument("--parallel", action="store_true")
+    solve_parser.add_argument("--threads", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == "pack":
+        count = csv_to_packed(args.csv, args.packed, NIBBLES if args.nibbles else BYTES, args.column)
+        print(f"{count} puzzles packed into {args.packed}")
+    elif args.command == "unpack":
+        count = packed_to_csv(args.packed, args.csv, args.column)
+        print(f"{count} puzzles written to {args.csv}")
+    else:
+        status = solve_packed(args.packed, args.output, args.chunk_size, args.max_nodes, args.parallel, args.threads)
+        codes, counts = np.unique(status, return_counts=True)
+        print(f"{len(status)} puzzles solved into {args.output}: " + " ".join(f"{STATUS_NAMES[int(code)]}={count}" for code, count in zip(codes, counts)))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+'''
+Solve a large puzzle file as a stream, with bounded memory.
+
+Run in the root directory of this project:
+
+```bash
+python -m src.pipeline puzzles.csv -o solutions.csv --chunk-size 20000 --parallel
+cat puzzles.csv | python -m src.pipeline - > solutions.csv
+```
+
+The input has one puzzle per line, in the same format as `tests/test_data/*.csv`: the first field is 81 characters of `0-9`
+(`.` is also read as `0`), the other fields (e.g. the solution) are ignored, and a header line is skipped.
+The output is `puzzle,solution,status` in the input order; `solution` is empty if the puzzle isn't solved.
+
+The lines are read and parsed `chunk_size` at a time by a reader thread, while the previous chunk is solved by `solve_many`,
+so at most three chunks are in memory (being read, waiting, being solved).
+'''
+
+import argparse
+import queue
+import sys
+import threading
+import time
+from itertools import islice
+from typing import Iterable, TextIO
+import numpy as np
+
+from src.solver import solve_many, SOLVED
+from src.solver.batch import STATUS_NAMES
+
+HEADER = "puzzle,solution,status\n"
+
+# 长度不对的行换成这个，转换后超出 0-9，solve_many 会返回 INVALID
+_BAD_PUZZLE = "x" * 81
+_DOT_TO_ZERO = str.maketrans(".", "0")
+
+def parse_lines(lines: list[str]) -> tuple[list[str], np.ndarray]:
+    '''Return `(puzzle_strs, puzzles)`, `puzzle_strs` are the first fields, `puzzles` is an `(N, 81)` int8 array.'''
+    puzzle_strs = [line.split(",", 1)[0].strip() for line in lines]
+    data = "".join(s if len(s) == 81 else _BAD_PUZZLE for s in puzzle_strs).translate(_DOT_TO_ZERO)
+    # 非数字字符减去 '0' 后都超出 0-9（uint8 会回绕）
+    puzzles = (np.frombuffer(data.encode("ascii", errors="replace"), dtype=np.uint8).reshape(-1, 81) - ord("0")).astype(np.int8)
+    return puzzle_strs, puzzles
+
+def format_chunk(puzzle_strs: list[str], solutions: np.ndarray, status: np.ndarray) -> str:
+    digits = (solutions + ord("0")).astype(np.uint8)
+    out = []
+    for k, puzzle_str in enumerate(puzzle_strs):
+        solution = digits[k].tobytes().decode("ascii") if status[k] == SOLVED else ""
+        out.append(f"{puzzle_str},{solution},{STATUS_NAMES[int(status[k])]}\n")
+    return "".join(out)
+
+def iter_chunks(lines: Iterable[str], chunk_size: int):
+    '''
+    Yield the non-empty lines of every `chunk_size` lines (blank lines are dropped, so a chunk may be shorter).
+    The header line, i.e. the first non-empty line if it's not a puzzle, is skipped.
+    '''
+    lines = iter(lines)
+    header_checked = False
+    while True:
+        raw = list(islice(lines, chunk_size))
+        # 只有读不到行才结束，连续的空行不算
+        if not raw:
+            return
+        chunk = [line for line in raw if line.strip()]
+        if chunk and not header_checked:
+            header_checked = True
+            if not chunk[0][:1].isdigit() and chunk[0][:1] != ".":
+                chunk = chunk[1:]
+        if chunk:
+            yield chunk
+
+def solve_stream(lines: Iterable[str],
+                 out: TextIO,
+                 chunk_size: int = 10000,
+                 max_nodes: int = 0,
+                 parallel: bool = False,
+                 num_threads: int | None = None,
+                 report_interval: float = 5.0,
+                 log: TextIO | None = sys.stderr
+                 ) -> dict[str, int]:
+    '''
+    Solve the puzzles in `lines` chunk by chunk, and write the results to `out` in order.
+
+    The throughput is written to `log` every `report_interval` seconds (`log=None` to disable).
+
+    Return the count of each status (and `"total"`).
+    '''
+    counts = {name: 0 for name in STATUS_NAMES.values()}
+    counts["total"] = 0
+    start = time.perf_counter()
+    last_report = start
+
+    def report(final: bool = False) -> None:
+        elapsed = time.perf_counter() - start
+        rate = counts["total"] / elapsed if elapsed > 0 else 0.0
+        summary = " ".join(f"{name}={counts[name]}" for name in STATUS_NAMES.values())
+        log.write(f"{'done' if final else 'progress'}: {counts['total']} puzzles in {elapsed:.1f}s, {rate:.1f}/s ({summary})\n")
+        log.flush()
+
+    # solve_many 不持有 GIL，读下一块和解这一块可以同时进行。
+    # 解题留在调用线程里：parallel 的线程池（TBB）在子线程里启动的话，退出时会卡住
+    chunk_q = queue.Queue(maxsize=1)
+    reader = threading.Thread(target=_read_chunks, args=(lines, chunk_size, chunk_q), daemon=True)
+    reader.start()
+
+    out.write(HEADER)
+    while True:
+        item = chunk_q.get()
+        if item is None:
+            break
+        if isinstance(item, BaseException):
+            raise item
+        puzzle_strs, puzzles = item
+        solutions, status, _ = solve_many(puzzles, max_nodes, parallel, num_threads)
+        out.write(format_chunk(puzzle_strs, solutions, status))
+
+        codes, code_counts = np.unique(status, return_counts=True)
+        for code, count in zip(codes, code_counts):
+            counts[STATUS_NAMES[int(code)]] += int(count)
+        counts["total"] += len(puzzle_strs)
+        if log is not None and time.perf_counter() - last_report > report_interval:
+            report()
+            last_report = time.perf_counter()
+    out.flush()
+    if log is not None:
+        report(final=True)
+    return counts
+
+def _read_chunks(lines: Iterable[str], chunk_size: int, chunk_q: queue.Queue) -> None:
+    '''The reader thread. Put the parsed chunks into `chunk_q`, then `None` (or the exception).'''
+    try:
+        for chunk in iter_chunks(lines, chunk_size):
+            chunk_q.put(parse_lines(chunk))
+    except BaseException as e:
+        chunk_q.put(e)
+        return
+    chunk_q.put(None)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m src.pipeline", description="Solve a large puzzle file as a stream.")
+    parser.add_argument("input", nargs="?", default="-", help="the puzzle file, '-' (default) for stdin")
+    parser.add_argument("-o", "--output", default="-", help="the output file, '-' (default) for stdout")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="the puzzles solved in one batch")
+    parser.add_argument("--max-nodes", type=int, default=0, help="the search node limit of each puzzle, 0 means unlimited")
+    parser.add_argument("--parallel", action="store_true", help="solve each chunk on multiple cores")
+    parser.add_argument("--threads", type=int, default=None, help="the number of threads with --parallel, default all cores")
+    parser.add_argument("--report-interval", type=float, default=5.0, help="seconds between the throughput reports on stderr")
+    parser.add_argument("--quiet", action="store_true", help="no throughput report")
+    args = parser.parse_args(argv)
+    if args.chunk_size <= 0:
+        parser.error("--chunk-size must be positive")
+
+    fin = sys.stdin if args.input == "-" else open(args.input)
+    fout = sys.stdout if args.output == "-" else open(args.output, "w", newline="")
+    try:
+        solve_stream(fin, fout, args.chunk_size, args.max_nodes, args.parallel, args.threads,
+                     args.report_interval, None if args.quiet else sys.stderr)
+    finally:
+        if fin is not sys.stdin:
+            fin.close()
+        if fout is not sys.stdout:
+            fout.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
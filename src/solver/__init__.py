@@ -1 +1,4 @@
-from .sudoku import Sudoku, has_conflict
\ No newline at end of file
+from .sudoku import Sudoku, has_conflict
+from .batch import solve_many, count_many, SOLVED, UNSOLVABLE, ABORTED, INVALID
+from .stats import SolveStats
+from .warmup import warmup
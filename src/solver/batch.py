@@ -0,0 +1,202 @@
+'''
+Solve many puzzles in one call.
+
+The whole batch is solved inside compiled code, so neither `Sudoku` nor `SolvingBoard` is constructed for each puzzle.
+`count_many` counts the solutions instead (e.g. to check the uniqueness).
+With `parallel=True` the puzzles are spread over all cores by `prange`. The kernels hold no global state and release the GIL.
+Constraints are not supported here.
+'''
+
+import numpy as np
+import numba
+from numba import njit, prange
+from numpy.typing import NDArray
+from .bitboard import ALL_CANDS, _numba_init_settle
+from .search import _numba_dfs, _numba_count, SOLVED, UNSOLVABLE, ABORTED, INVALID
+from .stats import SolveStats, COUNTERS_SIZE, MAX_DEPTH
+
+# 命令行和输出文件里用的名字
+STATUS_NAMES = {SOLVED: "solved", UNSOLVABLE: "unsolvable", ABORTED: "aborted", INVALID: "invalid"}
+
+def solve_many(puzzles: NDArray[np.int8],
+               max_nodes: int = 0,
+               parallel: bool = False,
+               num_threads: int | None = None,
+               with_stats: bool = False,
+               out: NDArray[np.int8] | None = None
+               ) -> tuple[NDArray[np.int8], NDArray[np.int8], NDArray[np.int64]] | tuple[NDArray[np.int8], NDArray[np.int8], NDArray[np.int64], SolveStats]:
+    '''
+    Solve a batch of puzzles.
+
+    Args:
+        puzzles: an `(N, 81)` array (`(N, 9, 9)` is also accepted), `0` means not assigned.
+        max_nodes: the search node limit for each puzzle, `0` means unlimited.
+        parallel: solve the puzzles on multiple cores.
+        num_threads: the number of threads when `parallel`, default to all cores.
+        with_stats: also return the `SolveStats` of the whole batch.
+        out: a C-contiguous `(N, 81)` int8 array (e.g. a slice of a `np.memmap`) to write the solutions into, instead of a new array.
+
+    Return a `tuple` of `(solutions, status, node_counts)`, or `(solutions, status, node_counts, stats)` if `with_stats`:
+        solutions: an `(N, 81)` int8 array (`out` if given). Rows of unsolved puzzles are all `0`.
+        status: an `(N,)` int8 array of `SOLVED`, `UNSOLVABLE`, `ABORTED` or `INVALID`.
+        node_counts: an `(N,)` int64 array, the same count as `search_counter` after `Sudoku.solve_compiled`.
+        stats: the sum of the statistics of all the puzzles (`max_depth` is the maximum). The CPU time is of the whole process if `parallel`.
+    '''
+    puzzles = np.ascontiguousarray(puzzles, dtype=np.int8).reshape(-1, 81)
+    if out is None:
+        out = np.zeros(puzzles.shape, dtype=np.int8)
+    elif out.shape != puzzles.shape or out.dtype != np.int8 or not out.flags.c_contiguous:
+        raise ValueError(f"out must be a C-contiguous int8 array of shape {puzzles.shape}.")
+    else:
+        out = np.asarray(out) # np.memmap 等子类换成普通的视图，numba 才认
+    # 每个线程一行，结束后再加起来，避免线程之间抢同一个计数器
+    stat_rows = np.zeros((numba.config.NUMBA_NUM_THREADS if parallel else 1, COUNTERS_SIZE), dtype=np.int64) if with_stats else None
+    stats = SolveStats().start(process=parallel)
+
+    if not parallel:
+        ret = _numba_solve_batch(puzzles, max_nodes, stat_rows, out)
+    elif num_threads is None:
+        ret = _numba_solve_batch_parallel(puzzles, max_nodes, stat_rows, out)
+    else:
+        # set_num_threads 只影响当前线程
+        old_num_threads = numba.get_num_threads()
+        numba.set_num_threads(min(num_threads, numba.config.NUMBA_NUM_THREADS))
+        try:
+            ret = _numba_solve_batch_parallel(puzzles, max_nodes, stat_rows, out)
+        finally:
+            numba.set_num_threads(old_num_threads)
+
+    if not with_stats:
+        return ret
+    stats.stop()
+    stats.counters[:] = stat_rows.sum(axis=0)
+    stats.counters[MAX_DEPTH] = stat_rows[:, MAX_DEPTH].max()
+    return *ret, stats
+
+def count_many(puzzles: NDArray[np.int8],
+               limit: int = 2,
+               max_nodes: int = 0,
+               parallel: bool = False,
+               num_threads: int | None = None,
+               with_stats: bool = False
+               ) -> tuple[NDArray[np.int64], NDArray[np.int8], NDArray[np.int8], NDArray[np.int64]] | tuple[NDArray[np.int64], NDArray[np.int8], NDArray[np.int8], NDArray[np.int64], SolveStats]:
+    '''
+    Count the solutions of a batch of puzzles, up to `limit` each. `limit=2` checks the uniqueness (`counts == 1`).
+
+    The arguments are the same as `solve_many`.
+
+    Return a `tuple` of `(counts, solutions, status, node_counts)`, or `(counts, solutions, status, node_counts, stats)` if `with_stats`:
+        counts: an `(N,)` int64 array. A lower bound if the puzzle is `ABORTED`.
+        solutions: an `(N, limit, 81)` int8 array, the first `counts[k]` rows of `solutions[k]` are the distinct solutions found, the others are all `0`.
+        status: `SOLVED` if some solution is found (and not aborted), otherwise the same as `solve_many`.
+        node_counts, stats: the same as `solve_many`.
+    '''
+    if limit < 1:
+        raise ValueError("limit must be positive.")
+    puzzles = np.ascontiguousarray(puzzles, dtype=np.int8).reshape(-1, 81)
+    stat_rows = np.zeros((numba.config.NUMBA_NUM_THREADS if parallel else 1, COUNTERS_SIZE), dtype=np.int64) if with_stats else None
+    stats = SolveStats().start(process=parallel)
+
+    if not parallel:
+        ret = _numba_count_batch(puzzles, limit, max_nodes, stat_rows)
+    elif num_threads is None:
+        ret = _numba_count_batch_parallel(puzzles, limit, max_nodes, stat_rows)
+    else:
+        old_num_threads = numba.get_num_threads()
+        numba.set_num_threads(min(num_threads, numba.config.NUMBA_NUM_THREADS))
+        try:
+            ret = _numba_count_batch_parallel(puzzles, limit, max_nodes, stat_rows)
+        finally:
+            numba.set_num_threads(old_num_threads)
+
+    if not with_stats:
+        return ret
+    stats.stop()
+    stats.counters[:] = stat_rows.sum(axis=0)
+    stats.counters[MAX_DEPTH] = stat_rows[:, MAX_DEPTH].max()
+    return *ret, stats
+
+@njit(nogil=True, cache=True)
+def _numba_solve_one(puzzle, solution, max_nodes, stat_counters):
+    '''Solve a puzzle of shape `(81,)`, write the solution into `solution`. Return `(status, node_count)`.'''
+    # out 可能是复用的数组，没解出来也要清零
+    solution[:] = 0
+    for k in range(81):
+        if puzzle[k] < 0 or puzzle[k] > 9:
+            return INVALID, 0
+
+    cand_mask = np.full((9, 9), ALL_CANDS, dtype=np.uint16)
+    assigned_board = np.zeros((9, 9), dtype=np.int8)
+    if not _numba_init_settle(cand_mask, assigned_board, puzzle.reshape(9, 9)):
+        return INVALID, 0
+
+    status, node_count = _numba_dfs(cand_mask, assigned_board, max_nodes, stat_counters, None)
+    if status == SOLVED:
+        solution[:] = assigned_board.reshape(81)
+    return status, node_count
+
+@njit(nogil=True, cache=True)
+def _numba_solve_batch(puzzles, max_nodes, stat_rows, solutions):
+    n = puzzles.shape[0]
+    status = np.empty(n, dtype=np.int8)
+    node_counts = np.zeros(n, dtype=np.int64)
+    for k in range(n):
+        if stat_rows is None:
+            status[k], node_counts[k] = _numba_solve_one(puzzles[k], solutions[k], max_nodes, None)
+        else:
+            status[k], node_counts[k] = _numba_solve_one(puzzles[k], solutions[k], max_nodes, stat_rows[0])
+    return solutions, status, node_counts
+
+@njit(nogil=True, parallel=True, cache=True)
+def _numba_solve_batch_parallel(puzzles, max_nodes, stat_rows, solutions):
+    n = puzzles.shape[0]
+    status = np.empty(n, dtype=np.int8)
+    node_counts = np.zeros(n, dtype=np.int64)
+    # 每个迭代只写自己那一行，不需要加锁；统计写在当前线程那一行
+    for k in prange(n):
+        if stat_rows is None:
+            status[k], node_counts[k] = _numba_solve_one(puzzles[k], solutions[k], max_nodes, None)
+        else:
+            status[k], node_counts[k] = _numba_solve_one(puzzles[k], solutions[k], max_nodes, stat_rows[numba.get_thread_id()])
+    return solutions, status, node_counts
+
+@njit(nogil=True, cache=True)
+def _numba_count_one(puzzle, solutions, limit, max_nodes, stat_counters):
+    '''Count the solutions of a puzzle of shape `(81,)` into `solutions` of shape `(limit, 81)`. Return `(status, count, node_count)`.'''
+    for k in range(81):
+        if puzzle[k] < 0 or puzzle[k] > 9:
+            return INVALID, 0, 0
+
+    cand_mask = np.full((9, 9), ALL_CANDS, dtype=np.uint16)
+    assigned_board = np.zeros((9, 9), dtype=np.int8)
+    if not _numba_init_settle(cand_mask, assigned_board, puzzle.reshape(9, 9)):
+        return INVALID, 0, 0
+    return _numba_count(cand_mask, assigned_board, limit, max_nodes, solutions.reshape(limit, 9, 9), stat_counters, None)
+
+@njit(nogil=True, cache=True)
+def _numba_count_batch(puzzles, limit, max_nodes, stat_rows):
+    n = puzzles.shape[0]
+    counts = np.zeros(n, dtype=np.int64)
+    solutions = np.zeros((n, limit, 81), dtype=np.int8)
+    status = np.empty(n, dtype=np.int8)
+    node_counts = np.zeros(n, dtype=np.int64)
+    for k in range(n):
+        if stat_rows is None:
+            status[k], counts[k], node_counts[k] = _numba_count_one(puzzles[k], solutions[k], limit, max_nodes, None)
+        else:
+            status[k], counts[k], node_counts[k] = _numba_count_one(puzzles[k], solutions[k], limit, max_nodes, stat_rows[0])
+    return counts, solutions, status, node_counts
+
+@njit(nogil=True, parallel=True, cache=True)
+def _numba_count_batch_parallel(puzzles, limit, max_nodes, stat_rows):
+    n = puzzles.shape[0]
+    counts = np.zeros(n, dtype=np.int64)
+    solutions = np.zeros((n, limit, 81), dtype=np.int8)
+    status = np.empty(n, dtype=np.int8)
+    node_counts = np.zeros(n, dtype=np.int64)
+    for k in prange(n):
+        if stat_rows is None:
+            status[k], counts[k], node_counts[k] = _numba_count_one(puzzles[k], solutions[k], limit, max_nodes, None)
+        else:
+            status[k], counts[k], node_counts[k] = _numba_count_one(puzzles[k], solutions[k], limit, max_nodes, stat_rows[numba.get_thread_id()])
+    return counts, solutions, status, node_counts
@@ -0,0 +1,366 @@
+import numpy as np
+from typing import Sequence
+from numba import njit
+from src.constraints import Constraint
+from src.utils.type_definitions import *
+from .transposition import ZOBRIST_KEYS, zobrist_hash
+from .watches import ConstraintWatches, wake_constraints
+from .stats import NAKED_SINGLES, COUNTERS_SIZE
+
+# 每个格子用一个 uint16 的低 9 位表示候选数：第 k 位 -> 数字 k+1
+ALL_CANDS = 0x1FF
+
+# 查表代替逐位统计
+POPCOUNT_TABLE = np.array([bin(m).count("1") for m in range(512)], dtype=np.int8)
+LOWEST_DIGIT_TABLE = np.array([(m & -m).bit_length() - 1 for m in range(512)], dtype=np.int8) # range 0-8, -1 if empty
+# get_cands 直接返回表里的 tuple，搜索时不用每次新建数组
+MASK_DIGITS = tuple(tuple(n + 1 for n in range(9) if m >> n & 1) for m in range(512))
+DIGIT_BITS = 1 << np.arange(9)
+
+class BitSolvingBoard:
+    '''
+    A bitmask version of `SolvingBoard`.
+
+    Attributes:
+        candidates_mask: a 9x9 numpy ndarray of `uint16`, bit `k` indicates whether number `k+1` is available on the position.
+        assigned_board: a 9x9 numpy ndarray, each indicate the number assigned on the posisiton. `0` means not assigned.
+        zobrist: the zobrist hash of `assigned_board`.
+        constraints: the constraints applied in `settle`. They are shared (not copied) between copies of the board.
+        watches: the `ConstraintWatches` of `constraints`, shared the same way.
+        stat_counters: the `counters` array of a `SolveStats`, updated by `quickdrops`. It's shared (not copied) between copies of the board.
+
+    The interface is the same as `SolvingBoard`, so `Sudoku` can use either of them.
+    '''
+
+    __slots__ = ("candidates_mask", "assigned_board", "zobrist", "constraints", "watches", "stat_counters",)
+
+    def __init__(self,
+                 puzzle: NumBoard,
+                 possible_cands: CandBoard,
+                 constraints: Sequence[Constraint] = (),
+                 stat_counters: np.ndarray | None = None
+                 ) -> None:
+        self.assigned_board: NumBoard = np.zeros((9,9), dtype=np.int8)
+        self.candidates_mask: MaskBoard = pack_candidates(possible_cands)
+        self.constraints: Sequence[Constraint] = constraints
+        self.watches = ConstraintWatches(constraints)
+        self.stat_counters = np.zeros(COUNTERS_SIZE, dtype=np.int64) if stat_counters is None else stat_counters
+
+        succ = _numba_init_settle(self.candidates_mask, self.assigned_board, np.asarray(puzzle, dtype=np.int8))
+        self.zobrist = zobrist_hash(self.assigned_board)
+        if succ:
+            succ = self.apply_constraints()
+        if not succ:
+            raise Exception(f"Sudoku puzzle is incompatible.")
+
+    def __str__(self) -> str:
+        return self.assigned_board.__str__()
+
+    @property
+    def candidates_board(self) -> CandBoard:
+        '''The candidates in the same 9x9x9 form as `SolvingBoard.candidates_board`. Note this is a copy.'''
+        return unpack_candidates(self.candidates_mask)
+
+    @candidates_board.setter
+    def candidates_board(self, cand_board: CandBoard) -> None:
+        self.candidates_mask = pack_candidates(cand_board)
+
+    def copy(self) -> "BitSolvingBoard":
+        '''Copy the boards, but share the constraints.'''
+        new = self.__class__.__new__(self.__class__)
+        new.assigned_board = self.assigned_board.copy()
+        new.candidates_mask = self.candidates_mask.copy()
+        new.zobrist = self.zobrist
+        new.constraints = self.constraints
+        new.watches = self.watches
+        new.stat_counters = self.stat_counters
+        return new
+
+    def snapshot(self):
+        return self.assigned_board, self.candidates_mask, self.zobrist
+
+    def restore(self, snapshot) -> None:
+        assigned_board, candidates_mask, self.zobrist = snapshot
+        self.assigned_board = assigned_board.copy()
+        self.candidates_mask = candidates_mask.copy()
+
+    def restrict(self, cand_board: CandBoard) -> None:
+        '''Eliminate the candidates which are `False` in `cand_board`.'''
+        self.candidates_mask &= pack_candidates(cand_board)
+
+    def get_cands(self, pos: Position) -> tuple[int, ...]:
+        '''Return the available numbers (range `1-9`) on the position, in ascending order.'''
+        i, j = pos
+        return MASK_DIGITS[self.candidates_mask[i, j]]
+
+    def restrict_cells(self, positions: np.ndarray, masks: np.ndarray) -> bool:
+        '''
+        Eliminate the candidates missing from the 9-bit `masks` on the cells `positions`, see `Constraint.scoped_candidates`.
+        Return whether anything is eliminated.
+        '''
+        return _numba_restrict_cells(self.candidates_mask, positions, masks)
+
+    def apply_constraints(self, cell: int = -1) -> bool:
+        '''Evaluate the constraints watching `cell` (`i*9+j`, all of them if `-1`), then check the board.'''
+        wake_constraints(self, cell)
+        return _numba_check_after_settle(self.candidates_mask, self.assigned_board)
+
+    def settle(self, pos: Position, num: int | np.int_) -> bool:
+        '''
+        Settle a specific number `num` on a specific position `pos`.
+
+        Same as `SolvingBoard.settle`.
+        '''
+
+        assert num != 0
+        x, y = pos
+
+        newly_assigned = self.assigned_board[x, y] == 0
+        succ = _numba_settle(self.candidates_mask, self.assigned_board, x, y, num)
+        if not succ:
+            return False
+        if newly_assigned:
+            self.zobrist ^= ZOBRIST_KEYS[x, y, num-1]
+
+        if not self.constraints:
+            return _numba_check_after_settle(self.candidates_mask, self.assigned_board)
+        return self.apply_constraints(x * 9 + y)
+
+    def get_least_cand_pos(self) -> tuple[int, Position | None]:
+        '''Same as `SolvingBoard.get_least_cand_pos`.'''
+        cand_count, (i, j) = _numba_get_least_cand_pos(self.candidates_mask, self.assigned_board)
+        if cand_count == 10:
+            return 0, None
+        return cand_count, (i, j)
+
+    def quickdrops(self):
+        '''Same as `SolvingBoard.quickdrops`, with the bitmask scanners.'''
+
+        if not self.constraints:
+            # nopython 里不维护哈希，结束后重新算一次
+            succ = _numba_quickdrops(self.candidates_mask, self.assigned_board, self.stat_counters)
+            self.zobrist = zobrist_hash(self.assigned_board)
+            return succ
+
+        checked = 0
+
+        while True:
+            for k, finder in enumerate(_FINDERS):
+                i, j, num = finder(self.candidates_mask)
+                checked += 1
+                if num >= 0:
+                    checked = 0
+                    succ = self.settle((i, j), num+1)
+                    if not succ:
+                        return False
+                    self.stat_counters[NAKED_SINGLES + k] += 1
+                if checked >= 4:
+                    return True
+
+def pack_candidates(cand_board: CandBoard) -> MaskBoard:
+    '''Convert a 9x9x9 bool candidates board to a 9x9 bitmask board.'''
+    return _numba_pack(np.ascontiguousarray(cand_board, dtype=np.bool_))
+
+def unpack_candidates(cand_mask: MaskBoard) -> CandBoard:
+    '''Convert a 9x9 bitmask board to a 9x9x9 bool candidates board.'''
+    return _numba_unpack(cand_mask)
+
+@njit(nogil=True, cache=True)
+def _numba_pack(cand_board):
+    cand_mask = np.zeros((9, 9), dtype=np.uint16)
+    for i in range(9):
+        for j in range(9):
+            m = 0
+            for n in range(9):
+                if cand_board[i, j, n]:
+                    m |= 1 << n
+            cand_mask[i, j] = m
+    return cand_mask
+
+@njit(nogil=True, cache=True)
+def _numba_unpack(cand_mask):
+    cand_board = np.zeros((9, 9, 9), dtype=np.bool_)
+    for i in range(9):
+        for j in range(9):
+            m = cand_mask[i, j]
+            for n in range(9):
+                cand_board[i, j, n] = (m >> n) & 1
+    return cand_board
+
+@njit(nogil=True, cache=True)
+def _numba_restrict_cells(cand_mask, positions, masks):
+    changed = False
+    for k in range(positions.shape[0]):
+        i = positions[k, 0]
+        j = positions[k, 1]
+        m = cand_mask[i, j] & masks[k]
+        if m != cand_mask[i, j]:
+            cand_mask[i, j] = m
+            changed = True
+    return changed
+
+@njit(nogil=True, cache=True)
+def _numba_init_settle(cand_mask, assigned_board, puzzle):
+    for i in range(9):
+        for j in range(9):
+            num = puzzle[i, j]
+            if num != 0:
+                if not _numba_settle(cand_mask, assigned_board, i, j, num):
+                    return False
+    return _numba_check_after_settle(cand_mask, assigned_board)
+
+@njit(nogil=True, cache=True)
+def _numba_settle(cand_mask, assigned_board, x, y, num):
+
+    bit = 1 << (num - 1)
+    if cand_mask[x, y] & bit == 0:
+        return False
+
+    # if already settled
+    if assigned_board[x, y] == num:
+        return True
+    elif assigned_board[x, y] != 0:
+        return False
+
+    # Settle
+    assigned_board[x, y] = num
+    cand_mask[x, y] = 0
+
+    # Eliminate row & col & block candidates
+    keep = np.uint16(ALL_CANDS ^ bit)
+    for k in range(9):
+        cand_mask[x, k] &= keep
+        cand_mask[k, y] &= keep
+    xb = (x // 3) * 3
+    yb = (y // 3) * 3
+    for i in range(xb, xb+3):
+        for j in range(yb, yb+3):
+            cand_mask[i, j] &= keep
+
+    return True
+
+@njit(nogil=True, cache=True)
+def _numba_check_after_settle(cand_mask, assigned_board):
+    for i in range(9):
+        for j in range(9):
+            if assigned_board[i, j] == 0 and cand_mask[i, j] == 0:
+                return False
+    return True
+
+@njit(nogil=True, cache=True)
+def _numba_settle_and_check(cand_mask, assigned_board, x, y, num):
+    if not _numba_settle(cand_mask, assigned_board, x, y, num):
+        return False
+    return _numba_check_after_settle(cand_mask, assigned_board)
+
+@njit(nogil=True, cache=True)
+def _numba_get_least_cand_pos(cand_mask, assigned_board):
+    minv = 10
+    mini = 0
+    minj = 0
+    for i in range(9):
+        for j in range(9):
+            if assigned_board[i, j] != 0:
+                continue
+            curr_sum = POPCOUNT_TABLE[cand_mask[i, j]]
+            if curr_sum < minv:
+                minv = curr_sum
+                mini = i
+                minj = j
+    return minv, (mini, minj)
+
+@njit(nogil=True, cache=True)
+def _numba_find_unique_position(cand_mask):
+    for i in range(9):
+        for j in range(9):
+            if POPCOUNT_TABLE[cand_mask[i, j]] == 1:
+                return i, j, LOWEST_DIGIT_TABLE[cand_mask[i, j]]
+    return -1, -1, -1
+
+@njit(nogil=True, cache=True)
+def _numba_find_uniqueness_in_row(cand_mask):
+    for i in range(9):
+        # once: 出现过至少一次的候选; twice: 出现过至少两次的候选
+        once = 0
+        twice = 0
+        for j in range(9):
+            twice |= once & cand_mask[i, j]
+            once |= cand_mask[i, j]
+        unique = once & ~twice
+        if unique:
+            cand = LOWEST_DIGIT_TABLE[unique & ALL_CANDS]
+            for j in range(9):
+                if cand_mask[i, j] >> cand & 1:
+                    return i, j, cand
+    return -1, -1, -1
+
+@njit(nogil=True, cache=True)
+def _numba_find_uniqueness_in_col(cand_mask):
+    for j in range(9):
+        once = 0
+        twice = 0
+        for i in range(9):
+            twice |= once & cand_mask[i, j]
+            once |= cand_mask[i, j]
+        unique = once & ~twice
+        if unique:
+            cand = LOWEST_DIGIT_TABLE[unique & ALL_CANDS]
+            for i in range(9):
+                if cand_mask[i, j] >> cand & 1:
+                    return i, j, cand
+    return -1, -1, -1
+
+@njit(nogil=True, cache=True)
+def _numba_find_uniqueness_in_block(cand_mask):
+    for xb in range(0, 7, 3):
+        for yb in range(0, 7, 3):
+            once = 0
+            twice = 0
+            for i in range(xb, xb+3):
+                for j in range(yb, yb+3):
+                    twice |= once & cand_mask[i, j]
+                    once |= cand_mask[i, j]
+            unique = once & ~twice
+            if unique:
+                cand = LOWEST_DIGIT_TABLE[unique & ALL_CANDS]
+                for i in range(xb, xb+3):
+                    for j in range(yb, yb+3):
+                        if cand_mask[i, j] >> cand & 1:
+                            return i, j, cand
+    return -1, -1, -1
+
+# 顺序和 stats 里 NAKED_SINGLES 开始的下标一致
+_FINDERS = (
+    _numba_find_unique_position,
+    _numba_find_uniqueness_in_row,
+    _numba_find_uniqueness_in_col,
+    _numba_find_uniqueness_in_block,
+)
+
+@njit(nogil=True, cache=True)
+def _numba_quickdrops(cand_mask, assigned_board, stat_counters):
+    '''
+    `quickdrops` without constraints, entirely in nopython mode. The scanning order is the same.
+
+    The placements are counted in `stat_counters` by technique, `None` means not counted.
+    '''
+    checked = 0
+    while True:
+        for k in range(4):
+            if k == 0:
+                i, j, num = _numba_find_unique_position(cand_mask)
+            elif k == 1:
+                i, j, num = _numba_find_uniqueness_in_row(cand_mask)
+            elif k == 2:
+                i, j, num = _numba_find_uniqueness_in_col(cand_mask)
+            else:
+                i, j, num = _numba_find_uniqueness_in_block(cand_mask)
+            checked += 1
+            if num >= 0:
+                checked = 0
+                if not _numba_settle_and_check(cand_mask, assigned_board, i, j, num+1):
+                    return False
+                if stat_counters is not None:
+                    stat_counters[NAKED_SINGLES + k] += 1
+            if checked >= 4:
+                return True
@@ -0,0 +1,47 @@
+'''
+Helpers for running the candidate probes of `Sudoku.solve_true_candidates` in a process pool or a thread pool.
+
+Each worker keeps its own `Sudoku` (for the stats and the `DeadStateTable`) and a shared initial board, set by `init_worker`.
+'''
+
+import copy
+import threading
+from src.utils.type_definitions import *
+from .stats import SolveStats
+
+# 线程池里每个线程一份；进程池里每个进程只有一个线程，效果相当于全局变量
+_local = threading.local()
+
+def init_worker(sudoku, init_sol) -> None:
+    '''The `initializer` of the pool. `sudoku` must not hold the `out_q`.'''
+    _local.sudoku = copy.copy(sudoku)
+    _local.sudoku.reset_dead_table()
+    _local.init_sol = init_sol
+
+def probe_in_worker(tu_board: CandBoard, pos: Position, cand: int) -> tuple[NumBoard | None, SolveStats]:
+    return probe(_local.sudoku, _local.init_sol, tu_board, pos, cand)
+
+def probe(sudoku, init_sol, tu_board: CandBoard, pos: Position, cand: int) -> tuple[NumBoard | None, SolveStats]:
+    '''
+    Try to solve the sudoku with candidate `cand` (range `0-8`) settled on `pos`.
+
+    Return a `tuple` of `(assigned_board, stats)`, `assigned_board` is `None` if the candidate is bad.
+    '''
+    sudoku.reset_counter()
+    try_sol = init_sol.copy()
+    # 每次试探单独计数，结束后交给协调者累加
+    try_sol.stat_counters = sudoku.stats.counters
+    if sudoku.profile:
+        try_sol.set_profiler(sudoku.stats.phases)
+    try_sol.restrict(tu_board)
+    ret_sol = None
+    # init_sol 的 quickdrops 可能已经填上了这个格子
+    settled = try_sol.assigned_board[pos] == cand+1 or try_sol.settle(pos, cand+1)
+    if settled and try_sol.quickdrops():
+        ret_sol = sudoku.solve_step(try_sol)
+    # worker 的表在试探之间保留，只记这次试探的部分
+    sudoku.count_dead_table()
+    sudoku.stats.stop()
+    if ret_sol:
+        return ret_sol.assigned_board, sudoku.stats
+    return None, sudoku.stats
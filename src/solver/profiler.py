@@ -0,0 +1,153 @@
+'''
+Boards which time each phase of the search into a `PhaseProfiler`, used by `Sudoku(profile=True)`.
+
+The phases are the board methods called by `Sudoku.solve_step` (`settle`, `restrict`, `quickdrops`, `get_least_cand_pos`, `restore`)
+and the `scoped_candidates` of each constraint (`restrict_cells` is counted as `restrict`). The self time of `settle` is the settle kernel.
+`BitSolvingBoard` checks the whole board after each settle, timed as `check_after_settle` inside `settle`.
+
+`quickdrops` always runs the Python loop (the one used with constraints) when profiling, so each scanner is timed on its own:
+`quickdrops.next_single` (the queue of `SolvingBoard`), or `quickdrops.naked_single`, `quickdrops.hidden_single_row`, ... (the full scans of `BitSolvingBoard`).
+The settles inside are counted as `settle`, so the self time of `quickdrops` is only the loop.
+
+Without profiling, `Sudoku` uses the plain `SolvingBoard` and `BitSolvingBoard`, so nothing here is on the path.
+'''
+
+import numpy as np
+from typing import Sequence
+from src.constraints import Constraint
+from src.utils.type_definitions import *
+from .solvingboard import SolvingBoard, _numba_next_single, _numba_reset_queue, FIXPOINT, CONFLICT
+from .bitboard import BitSolvingBoard, _numba_settle, _numba_check_after_settle, _FINDERS
+from .transposition import ZOBRIST_KEYS
+from .watches import wake_constraints
+from .stats import PhaseProfiler, NAKED_SINGLES, PLACEMENT_NAMES
+
+# quickdrops 里每种扫描的阶段名，和 SolveStats.placements 的名字一致
+SCANNER_PHASES = tuple(f"quickdrops.{name}" for name in PLACEMENT_NAMES)
+
+class _ProfiledConstraint:
+    '''Time `scoped_candidates` of the wrapped constraint. The other attributes are forwarded.'''
+
+    __slots__ = ("constraint", "profiler", "phase",)
+
+    def __init__(self, constraint: Constraint, profiler: PhaseProfiler, phase: str) -> None:
+        self.constraint = constraint
+        self.profiler = profiler
+        self.phase = phase
+
+    def scoped_candidates(self, assigned_board: NumBoard, candidates_board: CandBoard | None) -> tuple[np.ndarray, np.ndarray]:
+        return self.profiler.call(self.phase, self.constraint.scoped_candidates, assigned_board, candidates_board)
+
+    def __getattr__(self, name):
+        return getattr(self.constraint, name)
+
+def _wrap_constraints(constraints: Sequence[Constraint], profiler: PhaseProfiler) -> list[_ProfiledConstraint]:
+    wrapped = []
+    for k, constraint in enumerate(constraints):
+        if isinstance(constraint, _ProfiledConstraint):
+            constraint = constraint.constraint
+        wrapped.append(_ProfiledConstraint(constraint, profiler, f"{type(constraint).__name__}[{k}].scoped_candidates"))
+    return wrapped
+
+class _ProfiledBoardMixin:
+    '''The timed methods, shared by the two boards. `profiler` is a slot of the concrete classes.'''
+
+    __slots__ = ()
+
+    def set_profiler(self, profiler: PhaseProfiler) -> None:
+        '''Time into `profiler` from now on, e.g. for a copy handed to another `Sudoku`.'''
+        self.profiler = profiler
+        self.constraints = _wrap_constraints(self.constraints, profiler)
+
+    def copy(self):
+        new = super().copy()
+        new.profiler = self.profiler
+        return new
+
+    def restore(self, snapshot) -> None:
+        self.profiler.call("restore", super().restore, snapshot)
+
+    def restrict(self, cand_board: CandBoard) -> None:
+        self.profiler.call("restrict", super().restrict, cand_board)
+
+    def restrict_cells(self, positions: np.ndarray, masks: np.ndarray) -> bool:
+        return self.profiler.call("restrict", super().restrict_cells, positions, masks)
+
+    def settle(self, pos: Position, num: int) -> bool:
+        return self.profiler.call("settle", super().settle, pos, num)
+
+    def get_least_cand_pos(self) -> tuple[int, Position | None]:
+        return self.profiler.call("get_least_cand_pos", super().get_least_cand_pos)
+
+    def quickdrops(self) -> bool:
+        return self.profiler.call("quickdrops", self._quickdrops)
+
+class ProfiledSolvingBoard(_ProfiledBoardMixin, SolvingBoard):
+    '''`SolvingBoard` timing its phases into `profiler`.'''
+
+    __slots__ = ("profiler",)
+
+    def __init__(self, profiler: PhaseProfiler, puzzle: NumBoard, possible_cands: CandBoard, constraints: Sequence[Constraint] = (), **kwargs) -> None:
+        # 初始化时 settle 已知数也计时
+        self.profiler = profiler
+        super().__init__(puzzle, possible_cands, _wrap_constraints(constraints, profiler), **kwargs)
+
+    def _quickdrops(self) -> bool:
+        '''The loop of `SolvingBoard.quickdrops` with constraints, timing the queue scans.'''
+        while True:
+            status, i, j, num, technique = self.profiler.call("quickdrops.next_single", _numba_next_single,
+                self.candidates_board, self.assigned_board, self.counts, self.queue, self.stat_counters)
+            if status == FIXPOINT:
+                return True
+            if status == CONFLICT:
+                _numba_reset_queue(self.queue, False)
+                return False
+            succ = self.settle((i, j), num+1)
+            # 没有约束时 _numba_propagate 在放下后才冲突的这一步也计数，和它保持一致
+            if succ or not self.constraints and self.assigned_board[i, j] == num+1:
+                self.stat_counters[technique] += 1
+            if not succ:
+                _numba_reset_queue(self.queue, False)
+                return False
+
+class ProfiledBitSolvingBoard(_ProfiledBoardMixin, BitSolvingBoard):
+    '''`BitSolvingBoard` timing its phases into `profiler`.'''
+
+    __slots__ = ("profiler",)
+
+    def __init__(self, profiler: PhaseProfiler, puzzle: NumBoard, possible_cands: CandBoard, constraints: Sequence[Constraint] = (), **kwargs) -> None:
+        self.profiler = profiler
+        super().__init__(puzzle, possible_cands, _wrap_constraints(constraints, profiler), **kwargs)
+
+    def settle(self, pos: Position, num: int | np.int_) -> bool:
+        return self.profiler.call("settle", self._settle, pos, num)
+
+    def _settle(self, pos: Position, num: int | np.int_) -> bool:
+        '''`BitSolvingBoard.settle`, with the check timed on its own.'''
+        x, y = pos
+        newly_assigned = self.assigned_board[x, y] == 0
+        if not _numba_settle(self.candidates_mask, self.assigned_board, x, y, num):
+            return False
+        if newly_assigned:
+            self.zobrist ^= ZOBRIST_KEYS[x, y, num-1]
+        return self.apply_constraints(x * 9 + y)
+
+    def apply_constraints(self, cell: int = -1) -> bool:
+        if self.constraints:
+            wake_constraints(self, cell)
+        return self.profiler.call("check_after_settle", _numba_check_after_settle, self.candidates_mask, self.assigned_board)
+
+    def _quickdrops(self) -> bool:
+        '''The loop of `BitSolvingBoard.quickdrops` with constraints, timing each scanner.'''
+        checked = 0
+        while True:
+            for k, finder in enumerate(_FINDERS):
+                i, j, num = self.profiler.call(SCANNER_PHASES[k], finder, self.candidates_mask)
+                checked += 1
+                if num >= 0:
+                    checked = 0
+                    if not self.settle((i, j), num+1):
+                        return False
+                    self.stat_counters[NAKED_SINGLES + k] += 1
+                if checked >= 4:
+                    return True
@@ -0,0 +1,127 @@
+'''
+The constraints lowered into packed arrays, so the search with constraints can stay in nopython mode.
+
+`compile_constraints` concatenates the tables from `Constraint.lower()` into a "program", a `tuple` of four arrays:
+    `cell_start`: `(C+1,)` int64, the cells of constraint `c` are `cells[cell_start[c]:cell_start[c+1]]`;
+    `cells`: the flat indices (`i*9+j`) of the cells;
+    `tuple_start`: `(C+1,)` int64, the table of constraint `c` is `tuples[tuple_start[c]:tuple_start[c+1]]`, row by row;
+    `tuples`: the flattened int8 tables.
+
+`_numba_apply_program` keeps the candidates supported by some row of each table (generalized arc consistency),
+the same as `SparseMultiCellConstraint`, on a `BitSolvingBoard` state.
+'''
+
+import numpy as np
+from numba import njit
+from typing import Sequence
+from src.constraints import Constraint
+from .bitboard import _numba_quickdrops
+from .stats import CONSTRAINT_EVALS
+
+def compile_constraints(constraints: Sequence[Constraint]) -> tuple | None:
+    '''Return the program of `constraints`, or `None` if any of them can't be lowered.'''
+    cell_start = np.zeros(len(constraints) + 1, dtype=np.int64)
+    tuple_start = np.zeros(len(constraints) + 1, dtype=np.int64)
+    cells_list = []
+    tuples_list = []
+    for k, constraint in enumerate(constraints):
+        lowered = constraint.lower()
+        if lowered is None:
+            return None
+        cells, tuples = lowered
+        cells = np.asarray(cells, dtype=np.int64).ravel()
+        tuples = np.asarray(tuples, dtype=np.int8).reshape(-1, cells.size)
+        cells_list.append(cells)
+        tuples_list.append(tuples.ravel())
+        cell_start[k + 1] = cell_start[k] + cells.size
+        tuple_start[k + 1] = tuple_start[k] + tuples.size
+    cells = np.concatenate(cells_list) if cells_list else np.zeros(0, dtype=np.int64)
+    tuples = np.concatenate(tuples_list) if tuples_list else np.zeros(0, dtype=np.int8)
+    return cell_start, cells, tuple_start, tuples
+
+@njit(nogil=True, cache=True)
+def _numba_program_scratch(program):
+    '''The scratch buffer of `_numba_propagate`, allocated once per search: two rows as long as the largest table of `program`.'''
+    if program is None:
+        return np.empty((2, 0), dtype=np.int64)
+    cell_start = program[0]
+    n = 0
+    for c in range(cell_start.size - 1):
+        n = max(n, cell_start[c + 1] - cell_start[c])
+    return np.empty((2, n), dtype=np.int64)
+
+@njit(nogil=True, cache=True)
+def _numba_apply_program(cand_mask, assigned_board, program, stat_counters, scratch):
+    '''
+    Apply each table of `program` once. `scratch` is from `_numba_program_scratch`.
+
+    Return `-1` if a cell of some table is left without support (including a wrong assigned number), `1` if anything is eliminated, else `0`.
+    '''
+    cell_start, cells, tuple_start, tuples = program
+    # 搜索里每个节点都要调用，不在这里分配
+    domains = scratch[0]
+    supports = scratch[1]
+    changed = 0
+    for c in range(cell_start.size - 1):
+        first = cell_start[c]
+        n = cell_start[c + 1] - first
+        if n == 0:
+            continue
+        if stat_counters is not None:
+            stat_counters[CONSTRAINT_EVALS] += 1
+
+        # 每个格子的可选数字（bitmask），已填的格子只有那个数
+        for k in range(n):
+            cell = cells[first + k]
+            num = assigned_board[cell // 9, cell % 9]
+            domains[k] = (1 << (num - 1)) if num > 0 else cand_mask[cell // 9, cell % 9]
+            supports[k] = 0
+
+        base = tuple_start[c]
+        for t in range((tuple_start[c + 1] - base) // n):
+            row = base + t * n
+            supported = True
+            for k in range(n):
+                if not (domains[k] >> (tuples[row + k] - 1)) & 1:
+                    supported = False
+                    break
+            if not supported:
+                continue
+            complete = True
+            for k in range(n):
+                supports[k] |= 1 << (tuples[row + k] - 1)
+                if supports[k] != domains[k]:
+                    complete = False
+            if complete:
+                break
+
+        for k in range(n):
+            if supports[k] == 0:
+                return -1
+            if supports[k] != domains[k]:
+                # 已填的格子只有一个数，有支持就不会走到这里
+                cell = cells[first + k]
+                cand_mask[cell // 9, cell % 9] = supports[k]
+                changed = 1
+    return changed
+
+@njit(nogil=True, cache=True)
+def _numba_propagate(cand_mask, assigned_board, stat_counters, program, scratch):
+    '''
+    `_numba_quickdrops`, then the tables of `program` (if not `None`), again and again until neither changes anything.
+    `scratch` is from `_numba_program_scratch(program)`.
+
+    Return `False` on a conflict.
+    '''
+    if not _numba_quickdrops(cand_mask, assigned_board, stat_counters):
+        return False
+    if program is None:
+        return True
+    while True:
+        status = _numba_apply_program(cand_mask, assigned_board, program, stat_counters, scratch)
+        if status < 0:
+            return False
+        if status == 0:
+            return True
+        if not _numba_quickdrops(cand_mask, assigned_board, stat_counters):
+            return False
@@ -0,0 +1,154 @@
+'''
+Depth-first search which runs entirely in nopython mode.
+
+The search is the same as `Sudoku.solve_step` (MRV branching + `quickdrops` after each settle),
+but the recursion is replaced by an explicit depth-indexed stack of `BitSolvingBoard` states.
+`_numba_count` goes on searching after a solution, until `limit` solutions are found or the search is exhausted.
+
+The constraints are supported only in the lowered form (a "program" of tables, see `src.solver.propagator`).
+'''
+
+import numpy as np
+from numba import njit
+from .bitboard import (
+    LOWEST_DIGIT_TABLE,
+    _numba_get_least_cand_pos,
+    _numba_settle_and_check,
+)
+from .propagator import _numba_propagate, _numba_program_scratch
+from .stats import NODES, SETTLES, BACKTRACKS, MAX_DEPTH as STAT_MAX_DEPTH, DEPTH_HIST_START
+
+# Search status
+SOLVED = 1
+UNSOLVABLE = 0
+ABORTED = -1
+INVALID = -2 # the given numbers are incompatible
+
+# 每层至少确定一个格子，所以最多 81 层
+MAX_DEPTH = 82
+
+@njit(nogil=True, cache=True)
+def _numba_dfs(cand_mask, assigned_board, max_nodes, stat_counters, program):
+    '''
+    Search from the state (`cand_mask`, `assigned_board`).
+    The first solution found is written back into `assigned_board` (and `cand_mask`).
+
+    `max_nodes <= 0` means unlimited.
+
+    The statistics are added into `stat_counters` (see `src.solver.stats`), counted the same way as `Sudoku.solve_step`.
+    `None` means not counted.
+
+    `program` is the lowered constraints from `compile_constraints`, applied after each `quickdrops`. `None` means no constraints.
+
+    Return a `tuple` of `(status, node_count)`.
+    '''
+    status, _, node_count = _numba_search(cand_mask, assigned_board, max_nodes, stat_counters, 1, None, program)
+    return status, node_count
+
+@njit(nogil=True, cache=True)
+def _numba_count(cand_mask, assigned_board, limit, max_nodes, solutions, stat_counters, program):
+    '''
+    Search from the state (`cand_mask`, `assigned_board`) for at most `limit` solutions.
+    The solutions found are written into `solutions[:count]` (shape `(limit, 9, 9)`), they are distinct since the branches are disjoint.
+    `cand_mask` and `assigned_board` are not modified.
+
+    After a solution the search backtracks and goes on, so the statistics count the exhausted branches above it as backtracks.
+
+    Return a `tuple` of `(status, count, node_count)`:
+    `ABORTED` if `max_nodes` is reached first (then `count` is only a lower bound), else `SOLVED` if `count > 0`, else `UNSOLVABLE`.
+    '''
+    return _numba_search(cand_mask, assigned_board, max_nodes, stat_counters, limit, solutions, program)
+
+@njit(nogil=True, cache=True)
+def _numba_search(cand_mask, assigned_board, max_nodes, stat_counters, limit, solutions, program):
+    '''
+    The search of `_numba_dfs` (`solutions is None`, stop at the first solution) and `_numba_count`.
+    With `program`, the root is propagated first, since the constraints haven't been applied on it.
+
+    Return a `tuple` of `(status, count, node_count)`.
+    '''
+    mask_stack = np.empty((MAX_DEPTH, 9, 9), dtype=np.uint16)
+    assigned_stack = np.empty((MAX_DEPTH, 9, 9), dtype=np.int8)
+    pos_stack = np.empty((MAX_DEPTH, 2), dtype=np.int64)
+    rest_stack = np.zeros(MAX_DEPTH, dtype=np.int64) # 本层还没尝试过的候选（bitmask）
+    scratch = _numba_program_scratch(program)
+
+    mask_stack[0] = cand_mask
+    assigned_stack[0] = assigned_board
+
+    node_count = 1
+    count = 0
+    if stat_counters is not None:
+        stat_counters[NODES] += 1
+        stat_counters[DEPTH_HIST_START] += 1
+    if program is not None and not _numba_propagate(mask_stack[0], assigned_stack[0], stat_counters, program, scratch):
+        return UNSOLVABLE, 0, node_count
+    cand_count, (i, j) = _numba_get_least_cand_pos(mask_stack[0], assigned_stack[0])
+    if cand_count == 10:
+        if solutions is None:
+            cand_mask[:, :] = mask_stack[0]
+            assigned_board[:, :] = assigned_stack[0]
+        else:
+            solutions[0] = assigned_stack[0]
+        return SOLVED, 1, node_count
+    pos_stack[0, 0] = i
+    pos_stack[0, 1] = j
+    rest_stack[0] = mask_stack[0, i, j]
+
+    depth = 0
+    while depth >= 0:
+        rest = rest_stack[depth]
+        if rest == 0:
+            # backtrack
+            depth -= 1
+            if stat_counters is not None and depth >= 0:
+                # 上一层的这次尝试失败
+                stat_counters[BACKTRACKS] += 1
+            continue
+
+        num = LOWEST_DIGIT_TABLE[rest] + 1
+        rest_stack[depth] = rest & (rest - 1)
+        if stat_counters is not None:
+            stat_counters[SETTLES] += 1
+
+        next_mask = mask_stack[depth + 1]
+        next_assigned = assigned_stack[depth + 1]
+        next_mask[:, :] = mask_stack[depth]
+        next_assigned[:, :] = assigned_stack[depth]
+
+        i = pos_stack[depth, 0]
+        j = pos_stack[depth, 1]
+        if not _numba_settle_and_check(next_mask, next_assigned, i, j, num) \
+                or not _numba_propagate(next_mask, next_assigned, stat_counters, program, scratch):
+            if stat_counters is not None:
+                stat_counters[BACKTRACKS] += 1
+            continue
+
+        if max_nodes > 0 and node_count >= max_nodes:
+            return ABORTED, count, node_count
+        node_count += 1
+        if stat_counters is not None:
+            stat_counters[NODES] += 1
+            stat_counters[DEPTH_HIST_START + depth + 1] += 1
+            if depth + 1 > stat_counters[STAT_MAX_DEPTH]:
+                stat_counters[STAT_MAX_DEPTH] = depth + 1
+
+        cand_count, (i, j) = _numba_get_least_cand_pos(next_mask, next_assigned)
+        if cand_count == 10:
+            if solutions is None:
+                cand_mask[:, :] = next_mask
+                assigned_board[:, :] = next_assigned
+                return SOLVED, 1, node_count
+            solutions[count] = next_assigned
+            count += 1
+            if count >= limit:
+                return SOLVED, count, node_count
+            # 留在这一层，继续试下一个候选
+            continue
+
+        depth += 1
+        pos_stack[depth, 0] = i
+        pos_stack[depth, 1] = j
+        rest_stack[depth] = next_mask[i, j]
+
+    return (SOLVED if count > 0 else UNSOLVABLE), count, node_count
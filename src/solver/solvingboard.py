@@ -3,6 +3,56 @@ from typing import Sequence
 from numba import njit
 from src.constraints import Constraint
 from src.utils.type_definitions import *
+from .transposition import ZOBRIST_KEYS
+from .bitboard import LOWEST_DIGIT_TABLE, MASK_DIGITS, DIGIT_BITS
+from .watches import ConstraintWatches, wake_constraints
+from .stats import SCANS, SCANS_AVOIDED, NAKED_SINGLES, HIDDEN_SINGLES_ROW, COUNTERS_SIZE
+
+# 同一条路径上每个候选最多被删一次，每个格子最多被填一次
+CAND_TRAIL_START = 2
+ASSIGNED_TRAIL_START = CAND_TRAIL_START + 9 * 9 * 9
+TRAIL_SIZE = ASSIGNED_TRAIL_START + 9 * 9
+
+# 传播队列的项：0-80 是格子（查唯一候选），81 起是 (单元, 数字)（查唯一位置）
+# 单元编号：0-8 行，9-17 列，18-26 宫
+UNIT_ITEM_START = 9 * 9
+QUEUE_ITEM_NUM = UNIT_ITEM_START + 27 * 9
+QUEUE_FLAGS_START = 2
+QUEUE_RING_START = QUEUE_FLAGS_START + QUEUE_ITEM_NUM
+QUEUE_SIZE = QUEUE_RING_START + QUEUE_ITEM_NUM
+
+# UNIT_CELLS[u, k] 是第 u 个单元的第 k 个格子
+UNIT_CELLS = np.array(
+    [[(i, j) for j in range(9)] for i in range(9)]
+    + [[(i, j) for i in range(9)] for j in range(9)]
+    + [[(xb + k // 3, yb + k % 3) for k in range(9)] for xb in range(0, 9, 3) for yb in range(0, 9, 3)],
+    dtype=np.int64
+)
+# CELL_UNITS[i*9+j] 是格子所在的行、列、宫
+CELL_UNITS = np.array([(i, 9 + j, 18 + (i // 3) * 3 + j // 3) for i in range(9) for j in range(9)], dtype=np.int64)
+
+def _settle_targets(x: int, y: int, n: int) -> list[int]:
+    '''The candidates eliminated by settling `n+1` on (x, y): the other numbers on the cell, and `n` on the peers.'''
+    peers = [(x, k) for k in range(9)] + [(k, y) for k in range(9)]
+    peers += [((x // 3) * 3 + k // 3, (y // 3) * 3 + k % 3) for k in range(9)]
+    peers = sorted(set(peers) - {(x, y)})
+    return [(x * 9 + y) * 9 + m for m in range(9) if m != n] + [(i * 9 + j) * 9 + n for i, j in peers]
+
+# SETTLE_TARGETS[x*9+y, n] 是在 (x, y) 填 n+1 要删掉的 28 个候选（candidates_board 的 flat index）
+SETTLE_TARGETS = np.array([[_settle_targets(x, y, n) for n in range(9)] for x in range(9) for y in range(9)], dtype=np.int16)
+
+# 计数数组 counts 的布局
+CONFLICTS = 0 # 没有候选的未填格子数 + 没有位置的 (单元, 数字) 数
+CELL_COUNT_START = 1 # 每个格子的候选数，已填的格子是 0
+UNIT_COUNT_START = CELL_COUNT_START + 9 * 9 # 每个 (单元, 数字) 还能放的位置数，已经放下的也算
+BUCKET_START = UNIT_COUNT_START + 27 * 9 # MRV 桶：BUCKET_START + c*9 + i 是第 i 行里候选数为 c 的未填格子（按列的 bitmask）
+BUCKET_ROWS_START = BUCKET_START + 10 * 9 # 每个桶里非空的行（bitmask）
+COUNTS_SIZE = BUCKET_ROWS_START + 10
+
+# _numba_next_single 的返回状态
+FIXPOINT = 0
+SINGLE = 1
+CONFLICT = -1
 
 class SolvingBoard:
     '''
@@ -11,39 +61,131 @@ class SolvingBoard:
     Attributes:
         candidates_board: a 9x9x9 numpy ndarray, each indicate whether on a specific posisiton a specific number is available (`True` -> available; `False` -> unavailable). Note the index is `0-8`.
         assigned_board: a 9x9 numpy ndarray, each indicate the number assigned on the posisiton. `0` means not assigned.
-    
-    constraints 需要手工指定
+        zobrist: the zobrist hash of `assigned_board`, maintained incrementally in `settle`.
+        constraints: the constraints applied in `settle`. They are shared (not copied) between copies of the board.
+        watches: the `ConstraintWatches` of `constraints`, shared the same way.
+        trail: the undo trail, `None` if not `use_trail`. It's one int16 array (fewer arguments for numba) with the layout:
+            `trail[0]`, `trail[1]`: the lengths of the candidate trail and the assigned trail;
+            `trail[CAND_TRAIL_START:]`: the flat indices (of `candidates_board`) turned to `False`, except the numbers settled;
+            `trail[ASSIGNED_TRAIL_START:]`: the flat indices (of `assigned_board`) assigned.
+        counts: the counts maintained with every change of the boards. It's one int16 array with the layout:
+            `counts[CONFLICTS]`: the number of unassigned cells without candidates plus the number of (unit, digit) pairs without places;
+            `counts[CELL_COUNT_START:]`: the candidates count of each cell, `0` if assigned;
+            `counts[UNIT_COUNT_START:]`: the places count of each (unit, digit) pair, the placed one included;
+            `counts[BUCKET_START:]`, `counts[BUCKET_ROWS_START:]`: the unassigned cells bucketed by the candidates count, for MRV.
+        queue: the propagation queue of `quickdrops`. It's one int16 array with the layout:
+            `queue[0]`, `queue[1]`: the head and the length of the ring;
+            `queue[QUEUE_FLAGS_START:]`: whether each item is in the ring;
+            `queue[QUEUE_RING_START:]`: the ring of dirty items. An item is a cell (`i*9+j`) or a (unit, digit) pair (`UNIT_ITEM_START+u*9+n`).
+        stat_counters: the `counters` array of a `SolveStats`, updated by `quickdrops` (placements and scans). It's shared (not copied) between copies of the board.
+        scratch: the buffer of the candidates to eliminate in `restrict` and `restrict_cells`, so they don't allocate. Each copy has its own.
+
+    Without the trail, `snapshot` and `restore` copy the boards and the counts;
+    with the trail, `snapshot` is only the trail lengths, and `restore` rewinds the trail, so nothing is allocated when backtracking.
     '''
 
-    __slots__ = ("candidates_board", "assigned_board",)
-    constraints: Sequence[Constraint] = []
+    __slots__ = ("candidates_board", "assigned_board", "zobrist", "constraints", "watches", "trail", "counts", "queue", "stat_counters", "scratch",)
 
     def __init__(self,
                  puzzle: NumBoard,
-                 possible_cands: CandBoard
+                 possible_cands: CandBoard,
+                 constraints: Sequence[Constraint] = (),
+                 use_trail: bool = False,
+                 stat_counters: np.ndarray | None = None
                  ) -> None:
         '''注意__init__很慢，没有优化过，尽量少用'''
         self.assigned_board: NumBoard = np.zeros((9,9), dtype=np.int8)
-        self.candidates_board: CandBoard = possible_cands
-        
+        self.candidates_board: CandBoard = np.array(possible_cands, dtype=np.bool_)
+        self.zobrist = np.uint64(0)
+        self.constraints: Sequence[Constraint] = constraints
+        self.watches = ConstraintWatches(constraints)
+        self.trail = np.zeros(TRAIL_SIZE, dtype=np.int16) if use_trail else None
+        self.counts = np.zeros(COUNTS_SIZE, dtype=np.int16)
+        _numba_init_counts(self.candidates_board, self.counts)
+        self.queue = np.zeros(QUEUE_SIZE, dtype=np.int16)
+        _numba_reset_queue(self.queue, True) # possible_cands 可能已经删掉了一些候选
+        self.stat_counters = np.zeros(COUNTERS_SIZE, dtype=np.int64) if stat_counters is None else stat_counters
+        self.scratch = np.empty(9 * 9 * 9, dtype=np.int16)
+
         rows, cols = np.nonzero(puzzle)
         nums = puzzle[rows, cols]
         for (i, j), num in zip(zip(rows, cols), nums):
             succ = self.settle((i, j), num)
-            if not succ:
+            # 和以前一样，只有给定的数字互相冲突或者有格子没有候选才算不相容；某个单元放不下某个数字留给搜索去发现
+            if not succ and (self.assigned_board[i, j] != num or self.counts[BUCKET_ROWS_START] != 0):
                 raise Exception(f"Sudoku puzzle is incompatible.")
-    
+        # settle 只算了看着已知数的约束，这里每个约束都算一遍
+        if self.constraints:
+            wake_constraints(self, -1)
+            if self.counts[BUCKET_ROWS_START] != 0:
+                raise Exception(f"Sudoku puzzle is incompatible.")
+
     def __str__(self) -> str:
         return self.assigned_board.__str__()
-    
+
+    def copy(self) -> "SolvingBoard":
+        '''Copy the boards (and the trail), but share the constraints.'''
+        new = self.__class__.__new__(self.__class__)
+        new.assigned_board = self.assigned_board.copy()
+        new.candidates_board = self.candidates_board.copy()
+        new.zobrist = self.zobrist
+        new.constraints = self.constraints
+        new.watches = self.watches
+        new.trail = None if self.trail is None else self.trail.copy()
+        new.counts = self.counts.copy()
+        new.queue = self.queue.copy()
+        new.stat_counters = self.stat_counters
+        # 不共用，线程里的副本会同时写
+        new.scratch = np.empty_like(self.scratch)
+        return new
+
+    def snapshot(self):
+        '''Return the current state, which can be restored by `restore` later. Note this is not a copy.'''
+        # 队列只在还没有 quickdrops 过的局面（比如刚初始化）不空，这时恢复成全部待查
+        pending = self.queue[1] > 0
+        if self.trail is None:
+            return self.assigned_board, self.candidates_board, self.counts, self.zobrist, pending
+        return self.trail[0], self.trail[1], self.zobrist, pending
+
+    def restore(self, snapshot) -> None:
+        '''Restore the state returned by `snapshot` (by copying, or by rewinding the trail).'''
+        if self.trail is None:
+            assigned_board, candidates_board, counts, self.zobrist, pending = snapshot
+            self.assigned_board = assigned_board.copy()
+            self.candidates_board = candidates_board.copy()
+            self.counts = counts.copy()
+        else:
+            cand_mark, assigned_mark, self.zobrist, pending = snapshot
+            _numba_undo(self.candidates_board, self.assigned_board, self.counts, self.trail, cand_mark, assigned_mark)
+        _numba_reset_queue(self.queue, pending)
+
+    def restrict(self, cand_board: CandBoard) -> None:
+        '''Eliminate the candidates which are `False` in `cand_board`.'''
+        _numba_restrict(self.candidates_board, self.counts, cand_board, self.queue, self.trail, self.scratch)
+
+    def restrict_cells(self, positions: np.ndarray, masks: np.ndarray) -> bool:
+        '''
+        Eliminate the candidates missing from the 9-bit `masks` on the cells `positions`, see `Constraint.scoped_candidates`.
+        Return whether anything is eliminated.
+        '''
+        return _numba_restrict_cells(self.candidates_board, self.counts, positions, masks, self.queue, self.trail, self.scratch)
+
+    def get_cands(self, pos: Position) -> tuple[int, ...]:
+        '''Return the available numbers (range `1-9`) on the position, in ascending order.'''
+        i, j = pos
+        return MASK_DIGITS[self.candidates_board[i, j] @ DIGIT_BITS]
+
     def settle(self, pos: Position, num: int | np.int_) -> bool:
         '''
         Settle a specific number `num` on a specific position `pos`.
 
         This method will automatically eliminate the candidates in the row, column, and block where the num is settled. It will also eliminate some other candidates in accordance with the constraints.
+        Every eliminated candidate updates `counts`, and marks its cell (or units) dirty for `quickdrops` when one candidate (or one place) is left.
 
         The `candidates_board` on the setteled position will be set as all zero.
 
+        Return `False` if a cell is left without any candidate, or a number is left without any place in a unit.
+
         Args:
             pos: `tuple` of two `int`, with range `0-8`
             num: `int`, range `1-9`.
@@ -52,104 +194,162 @@ class SolvingBoard:
         assert num != 0
         x, y = pos
 
-        succ = _numba_settle(self.candidates_board, self.assigned_board, x, y, num)
+        newly_assigned = self.assigned_board[x, y] == 0
+        succ = _numba_settle(self.candidates_board, self.assigned_board, self.counts, x, y, num, self.queue, self.trail)
         if not succ:
             return False
+        if newly_assigned:
+            self.zobrist ^= ZOBRIST_KEYS[x, y, num-1]
 
-        # Eliminate candidates in accordance with constraints
-        for constraint in SolvingBoard.constraints:
-            self.candidates_board &= constraint.available_candidates(self.assigned_board)
+        # Eliminate candidates in accordance with the constraints watching this cell
+        if self.constraints:
+            wake_constraints(self, x * 9 + y)
 
         # Check if there's enough candidates
-        return _numba_check_after_settle(self.candidates_board, self.assigned_board)
-    
+        return self.counts[CONFLICTS] == 0
+
     def get_least_cand_pos(self) -> tuple[int, Position | None]:
         '''
-        Scan the whole candidates board,
-        find the unassigned cell with the least candidates number.
+        Find the unassigned cell with the least candidates number (the first one in row-major order) from the MRV buckets.
 
         Return a `tuple` of `(the_least_candidates_count, the_cell_position)`
 
         Return `(0, None)` if there's no unassigned cell.
         '''
-        cand_count, (i, j) = _numba_get_least_cand_pos(self.candidates_board, self.assigned_board)
+        cand_count, (i, j) = _numba_get_least_cand_pos(self.counts)
         if cand_count == 10:
             return 0, None
         return cand_count, (i, j)
-        
+
     def quickdrops(self):
+        '''
+        Settle the naked singles and hidden singles until there's none.
+
+        Only the dirty cells and (unit, digit) pairs on the queue are checked, instead of scanning the whole board.
+        Return `False` if a cell or a (unit, digit) pair is left without any candidate.
+        '''
 
-        checked = 0
+        if not self.constraints:
+            # 没有 constraints 时整个循环都在 nopython 里
+            succ, zobrist_delta = _numba_propagate(self.candidates_board, self.assigned_board, self.counts, self.queue, self.trail, self.stat_counters)
+            self.zobrist ^= zobrist_delta
+            if not succ:
+                _numba_reset_queue(self.queue, False)
+            return succ
 
         while True:
-            # unique cand cells
-            i, j, num =_numba_find_unique_position(self.candidates_board)
-            checked += 1
-            if num >= 0:
-                checked = 0
-                succ = self.settle((i, j), num+1)
-                if not succ:
-                    return False
-            if checked >= 4:
-                break
-                
-            # uniqueness in row
-            i, j, num =_numba_find_uniqueness_in_row(self.candidates_board)
-            checked += 1
-            if num >= 0:
-                checked = 0
-                succ = self.settle((i, j), num+1)
-                if not succ:
-                    return False
-            if checked >= 4:
-                break
-            
-            # uniqueness in col
-            i, j, num =_numba_find_uniqueness_in_col(self.candidates_board)
-            checked += 1
-            if num >= 0:
-                checked = 0
-                succ = self.settle((i, j), num+1)
-                if not succ:
-                    return False
-            if checked >= 4:
-                break
-
-            # uniqueness in blocks
-            i, j, num =_numba_find_uniqueness_in_block(self.candidates_board)
-            checked += 1
-            if num >= 0:
-                checked = 0
-                succ = self.settle((i, j), num+1)
-                if not succ:
-                    return False
-            if checked >= 4:
-                break
-        return True
+            status, i, j, num, technique = _numba_next_single(self.candidates_board, self.assigned_board, self.counts, self.queue, self.stat_counters)
+            if status == FIXPOINT:
+                return True
+            if status == CONFLICT or not self.settle((i, j), num+1):
+                _numba_reset_queue(self.queue, False)
+                return False
+            self.stat_counters[technique] += 1
+
+@njit(nogil=True, cache=True)
+def _numba_get_least_cand_pos(counts):
+    for c in range(10):
+        rows = counts[BUCKET_ROWS_START + c]
+        if rows != 0:
+            i = np.int64(LOWEST_DIGIT_TABLE[rows])
+            j = np.int64(LOWEST_DIGIT_TABLE[counts[BUCKET_START + c * 9 + i]])
+            return c, (i, j)
+    return 10, (np.int64(0), np.int64(0))
 
-@njit
-def _numba_get_least_cand_pos(candidates_board, assigned_board):
-    minv = 10
-    mini = 0
-    minj = 0
+@njit(nogil=True, cache=True)
+def _numba_init_counts(candidates_board, counts):
+    '''Count from scratch, all cells are unassigned.'''
+    counts[:] = 0
     for i in range(9):
         for j in range(9):
-            if assigned_board[i, j] != 0:
-                continue
-            curr_sum = 0
-            for cand in range(9):
-                curr_sum += candidates_board[i, j, cand]
-                if curr_sum >= minv:
-                    break
-            if curr_sum < minv:
-                minv = curr_sum
-                mini = i
-                minj = j
-    return minv, (mini, minj)
-
-@njit
-def _numba_settle(candidates_board, assigned_board, x, y, num):
-    
+            c = 0
+            for n in range(9):
+                if candidates_board[i, j, n]:
+                    c += 1
+                    for t in range(3):
+                        counts[UNIT_COUNT_START + CELL_UNITS[i * 9 + j, t] * 9 + n] += 1
+            counts[CELL_COUNT_START + i * 9 + j] = c
+            counts[BUCKET_START + c * 9 + i] |= 1 << j
+            counts[BUCKET_ROWS_START + c] |= 1 << i
+            if c == 0:
+                counts[CONFLICTS] += 1
+    for k in range(27 * 9):
+        if counts[UNIT_COUNT_START + k] == 0:
+            counts[CONFLICTS] += 1
+
+@njit(nogil=True, cache=True)
+def _numba_push(queue, item):
+    if queue[QUEUE_FLAGS_START + item]:
+        return
+    queue[QUEUE_FLAGS_START + item] = 1
+    queue[QUEUE_RING_START + (queue[0] + queue[1]) % QUEUE_ITEM_NUM] = item
+    queue[1] += 1
+
+# 注意：numba 调用带数组参数的函数时，每个数组都要原子地增减一次引用计数，在有分支的热循环里剪不掉，
+# 所以下面的热循环都把操作直接写在循环体里，不再拆成小函数
+
+@njit(nogil=True, cache=True)
+def _numba_drop(candidates_board, counts, queue, trail, targets):
+    '''
+    Eliminate the candidates (flat indices of `candidates_board`) in `targets` which are available, all on unassigned cells, and update `counts`.
+    A cell (or a (unit, digit) pair) is marked dirty when one candidate (or one place) is left.
+
+    The changes are recorded on `trail` unless `trail` is `None` (numba compiles the branches away).
+    '''
+    # 栈顶先放在局部变量里，最后再写回，快很多
+    top = 0
+    if trail is not None:
+        top = CAND_TRAIL_START + trail[0]
+
+    for t in range(targets.size):
+        idx = targets[t]
+        cell = idx // 9
+        n = idx % 9
+        i = cell // 9
+        j = cell % 9
+        if not candidates_board[i, j, n]:
+            continue
+        candidates_board[i, j, n] = False
+        if trail is not None:
+            trail[top] = idx
+            top += 1
+
+        # 格子的候选数减一，换桶
+        c = counts[CELL_COUNT_START + cell] - 1
+        counts[CELL_COUNT_START + cell] = c
+        k = BUCKET_START + (c + 1) * 9 + i
+        counts[k] &= ~(1 << j)
+        if counts[k] == 0:
+            counts[BUCKET_ROWS_START + c + 1] &= ~(1 << i)
+        counts[BUCKET_START + c * 9 + i] |= 1 << j
+        counts[BUCKET_ROWS_START + c] |= 1 << i
+        if c == 0:
+            counts[CONFLICTS] += 1
+        elif c == 1 and not queue[QUEUE_FLAGS_START + cell]:
+            queue[QUEUE_FLAGS_START + cell] = 1
+            queue[QUEUE_RING_START + (queue[0] + queue[1]) % QUEUE_ITEM_NUM] = cell
+            queue[1] += 1
+
+        # 三个单元里 n 的位置数减一
+        for s in range(3):
+            u = CELL_UNITS[cell, s] * 9 + n
+            v = counts[UNIT_COUNT_START + u] - 1
+            counts[UNIT_COUNT_START + u] = v
+            item = UNIT_ITEM_START + u
+            if v == 0:
+                counts[CONFLICTS] += 1
+            elif v == 1 and not queue[QUEUE_FLAGS_START + item]:
+                queue[QUEUE_FLAGS_START + item] = 1
+                queue[QUEUE_RING_START + (queue[0] + queue[1]) % QUEUE_ITEM_NUM] = item
+                queue[1] += 1
+
+    if trail is not None:
+        trail[0] = top - CAND_TRAIL_START
+
+@njit(nogil=True, cache=True)
+def _numba_settle(candidates_board, assigned_board, counts, x, y, num, queue, trail):
+    '''`trail` is `None` without the trail.'''
+
     if candidates_board[x,y,num-1] != True:
         return False
 
@@ -159,117 +359,185 @@ def _numba_settle(candidates_board, assigned_board, x, y, num):
     elif assigned_board[x, y] != 0:
         return False
 
-    # Settle
-    assigned_board[x, y] = num
-    candidates_board[x, y, :] = False
+    # 删掉这个格子的其他候选，以及同行、列、宫的 num
+    _numba_drop(candidates_board, counts, queue, trail, SETTLE_TARGETS[x * 9 + y, num - 1])
 
-    # Eliminate row & col candidates
-    candidates_board[x, :, num-1] = False
-    candidates_board[:, y, num-1] = False
-    # Eliminate block candidates
-    xb = (x // 3) * 3
-    yb = (y // 3) * 3
-    candidates_board[xb:xb+3, yb:yb+3, num-1] = False
+    # Settle. 这时格子只剩 num：候选变成已放下，单元的计数不变；撤销时由 assigned trail 恢复，不记在候选的 trail 上
+    candidates_board[x, y, num-1] = False
+    counts[CELL_COUNT_START + x * 9 + y] = 0
+    k = BUCKET_START + 9 + x
+    counts[k] &= ~(1 << y)
+    if counts[k] == 0:
+        counts[BUCKET_ROWS_START + 1] &= ~(1 << x)
+    assigned_board[x, y] = num
+    if trail is not None:
+        trail[ASSIGNED_TRAIL_START + trail[1]] = x * 9 + y
+        trail[1] += 1
 
     return True
 
-@njit
-def _numba_check_after_settle(candidates_board, assigned_board):
+@njit(nogil=True, cache=True)
+def _numba_restrict(candidates_board, counts, cand_board, queue, trail, targets):
+    '''`targets` is the scratch buffer of 729 items, every candidate fits in.'''
+    target_num = 0
     for i in range(9):
         for j in range(9):
-            if assigned_board[i, j] != 0:
+            for n in range(9):
+                if candidates_board[i, j, n] and not cand_board[i, j, n]:
+                    targets[target_num] = (i * 9 + j) * 9 + n
+                    target_num += 1
+    _numba_drop(candidates_board, counts, queue, trail, targets[:target_num])
+
+@njit(nogil=True, cache=True)
+def _numba_restrict_cells(candidates_board, counts, positions, masks, queue, trail, targets):
+    '''`targets` is the scratch buffer. Return whether anything is eliminated.'''
+    # 重复的格子会收集到重复的 target，`_numba_drop` 会跳过已经删掉的；缓冲区满了就先删一批
+    target_num = 0
+    changed = False
+    for k in range(positions.shape[0]):
+        i = positions[k, 0]
+        j = positions[k, 1]
+        m = masks[k]
+        if m == 0x1FF:
+            continue
+        for n in range(9):
+            if candidates_board[i, j, n] and not (m >> n) & 1:
+                if target_num == targets.size:
+                    _numba_drop(candidates_board, counts, queue, trail, targets)
+                    target_num = 0
+                targets[target_num] = (i * 9 + j) * 9 + n
+                target_num += 1
+                changed = True
+    _numba_drop(candidates_board, counts, queue, trail, targets[:target_num])
+    return changed
+
+@njit(nogil=True, cache=True)
+def _numba_undo(candidates_board, assigned_board, counts, trail, cand_mark, assigned_mark):
+    # 先把填过的格子恢复成只剩所填数字的未填格子
+    for k in range(ASSIGNED_TRAIL_START + trail[1] - 1, ASSIGNED_TRAIL_START + assigned_mark - 1, -1):
+        cell = trail[k]
+        i = cell // 9
+        j = cell % 9
+        candidates_board[i, j, assigned_board[i, j] - 1] = True
+        assigned_board[i, j] = 0
+        counts[CELL_COUNT_START + cell] = 1
+        counts[BUCKET_START + 9 + i] |= 1 << j
+        counts[BUCKET_ROWS_START + 1] |= 1 << i
+
+    # 再逐个恢复删掉的候选，和 _numba_drop 相反
+    for k in range(CAND_TRAIL_START + trail[0] - 1, CAND_TRAIL_START + cand_mark - 1, -1):
+        idx = trail[k]
+        cell = idx // 9
+        n = idx % 9
+        i = cell // 9
+        j = cell % 9
+        candidates_board[i, j, n] = True
+
+        c = counts[CELL_COUNT_START + cell]
+        counts[CELL_COUNT_START + cell] = c + 1
+        b = BUCKET_START + c * 9 + i
+        counts[b] &= ~(1 << j)
+        if counts[b] == 0:
+            counts[BUCKET_ROWS_START + c] &= ~(1 << i)
+        counts[BUCKET_START + (c + 1) * 9 + i] |= 1 << j
+        counts[BUCKET_ROWS_START + c + 1] |= 1 << i
+        if c == 0:
+            counts[CONFLICTS] -= 1
+
+        for s in range(3):
+            u = UNIT_COUNT_START + CELL_UNITS[cell, s] * 9 + n
+            if counts[u] == 0:
+                counts[CONFLICTS] -= 1
+            counts[u] += 1
+
+    trail[0] = cand_mark
+    trail[1] = assigned_mark
+
+@njit(nogil=True, cache=True)
+def _numba_reset_queue(queue, fill):
+    '''Empty the queue, then mark every item dirty if `fill`.'''
+    while queue[1] > 0:
+        queue[QUEUE_FLAGS_START + queue[QUEUE_RING_START + queue[0]]] = 0
+        queue[0] = (queue[0] + 1) % QUEUE_ITEM_NUM
+        queue[1] -= 1
+    queue[0] = 0
+    if fill:
+        for item in range(QUEUE_ITEM_NUM):
+            _numba_push(queue, item)
+
+@njit(nogil=True, cache=True)
+def _numba_next_single(candidates_board, assigned_board, counts, queue, stat_counters):
+    '''
+    Pop the dirty items until a naked single or a hidden single is found.
+
+    Return a `tuple` of `(status, i, j, n, technique)`, `n` is range `0-8`:
+        `(SINGLE, i, j, n, technique)`: `n` is the only candidate of (i, j), or (i, j) is the only place of `n` in a unit.
+            `technique` is the index in `stat_counters` (`NAKED_SINGLES` or `HIDDEN_SINGLES_ROW/COL/BOX`);
+        `(CONFLICT, -1, -1, -1, -1)`: a cell has no candidate, or a unit has no place for a number;
+        `(FIXPOINT, -1, -1, -1, -1)`: the queue is empty.
+
+    Every popped item counts as one scan; the rest of the `QUEUE_ITEM_NUM` items, which a full sweep would check, count as avoided.
+    '''
+    if counts[CONFLICTS] > 0:
+        return CONFLICT, -1, -1, -1, -1
+
+    status = FIXPOINT
+    si = -1
+    sj = -1
+    sn = -1
+    technique = -1
+    checked = 0
+    while queue[1] > 0 and status == FIXPOINT:
+        item = queue[QUEUE_RING_START + queue[0]]
+        queue[0] = (queue[0] + 1) % QUEUE_ITEM_NUM
+        queue[1] -= 1
+        queue[QUEUE_FLAGS_START + item] = 0
+        checked += 1
+
+        if item < UNIT_ITEM_START:
+            # naked single. 已填的格子计数是 0
+            if counts[CELL_COUNT_START + item] != 1:
                 continue
-            no_cand_flag = True
-            for num in range(9):
-                if candidates_board[i, j, num] == True:
-                    no_cand_flag = False
-                    continue
-            if no_cand_flag:
-                return False
-    return True
+            i = item // 9
+            j = item % 9
+            for n in range(9):
+                if candidates_board[i, j, n]:
+                    status = SINGLE
+                    si, sj, sn = i, j, n
+                    technique = NAKED_SINGLES
+                    break
+        else:
+            # hidden single. 唯一的位置可能是已经放下的格子，这时找不到候选
+            u = (item - UNIT_ITEM_START) // 9
+            n = (item - UNIT_ITEM_START) % 9
+            if counts[UNIT_COUNT_START + u * 9 + n] != 1:
+                continue
+            for k in range(9):
+                i = UNIT_CELLS[u, k, 0]
+                j = UNIT_CELLS[u, k, 1]
+                if candidates_board[i, j, n]:
+                    status = SINGLE
+                    si, sj, sn = i, j, n
+                    technique = HIDDEN_SINGLES_ROW + u // 9 # 行、列、宫的顺序和单元编号一致
+                    break
 
-@njit
-def _numba_find_unique_position(candidates_board):
-    unqi = -1
-    unqj = -1
-    unqcand = -1
-    for i in range(9):
-        for j in range(9):
-            curr_sum = 0
-            for cand in range(9):
-                if candidates_board[i, j, cand]:
-                    curr_sum += 1
-                    unqcand = cand
-                    if curr_sum > 1:
-                        break
-            if curr_sum == 1:
-                unqi = i
-                unqj = j
-                return unqi, unqj, unqcand
-    return -1, -1, -1
-
-@njit
-def _numba_find_uniqueness_in_row(candidates_board):
-    unqi = -1
-    unqj = -1
-    unqcand = -1
-    for i in range(9):
-        for cand in range(9):
-            curr_sum = 0
-            for j in range(9):
-                if candidates_board[i, j, cand]:
-                    curr_sum += 1
-                    unqj = j
-                    if curr_sum > 1:
-                        break
-            if curr_sum == 1:
-                unqi = i
-                unqcand = cand
-                return unqi, unqj, unqcand
-    return -1, -1, -1
-
-@njit
-def _numba_find_uniqueness_in_col(candidates_board):
-    unqi = -1
-    unqj = -1
-    unqcand = -1
-    for j in range(9):
-        for cand in range(9):
-            curr_sum = 0
-            for i in range(9):
-                if candidates_board[i, j, cand]:
-                    curr_sum += 1
-                    unqi = i
-                    if curr_sum > 1:
-                        break
-            if curr_sum == 1:
-                unqj = j
-                unqcand = cand
-                return unqi, unqj, unqcand
-    return -1, -1, -1
-
-@njit
-def _numba_find_uniqueness_in_block(candidates_board):
-    unqi = -1
-    unqj = -1
-    unqcand = -1
-    for xb in range(0, 7, 3):
-        for yb in range(0, 7, 3):
-            for cand in range(9):
-                curr_sum = 0
-                jump_flag = False
-                for i in range(xb, xb+3):
-                    if jump_flag:
-                        break
-                    for j in range(yb, yb+3):
-                        if candidates_board[i, j, cand]:
-                            curr_sum += 1
-                            unqi = i
-                            unqj = j
-                            if curr_sum > 1:
-                                jump_flag = True
-                                break
-                if curr_sum == 1:
-                    unqcand = cand
-                    return unqi, unqj, unqcand
-    return -1, -1, -1
+    stat_counters[SCANS] += checked
+    stat_counters[SCANS_AVOIDED] += QUEUE_ITEM_NUM - checked
+    return status, si, sj, sn, technique
+
+@njit(nogil=True, cache=True)
+def _numba_propagate(candidates_board, assigned_board, counts, queue, trail, stat_counters):
+    '''
+    `quickdrops` without constraints.
+
+    Return a `tuple` of `(succ, zobrist_delta)`.
+    '''
+    zobrist_delta = np.uint64(0)
+    while True:
+        status, i, j, n, technique = _numba_next_single(candidates_board, assigned_board, counts, queue, stat_counters)
+        if status == FIXPOINT:
+            return True, zobrist_delta
+        if status == CONFLICT or not _numba_settle(candidates_board, assigned_board, counts, i, j, n+1, queue, trail):
+            return False, zobrist_delta
+        stat_counters[technique] += 1
+        zobrist_delta ^= ZOBRIST_KEYS[i, j, n]
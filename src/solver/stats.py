@@ -0,0 +1,304 @@
+'''
+Statistics of a solve, one `SolveStats` object per solve.
+
+The counters are kept in one int64 array, so the nopython kernels (`_numba_dfs`, `_numba_quickdrops`, ...) can update them directly.
+'''
+
+import json
+import time
+import numpy as np
+
+# counters 下标
+NODES = 0
+SETTLES = 1 # 搜索时尝试的候选数（不含 quickdrops 填的）
+BACKTRACKS = 2 # 失败的尝试：settle 失败、quickdrops 失败、或者下面的子树无解
+MAX_DEPTH = 3
+NAKED_SINGLES = 4 # quickdrops 填的数，按方法分
+HIDDEN_SINGLES_ROW = 5
+HIDDEN_SINGLES_COL = 6
+HIDDEN_SINGLES_BOX = 7
+SCANS = 8 # SolvingBoard 传播队列检查的项数
+SCANS_AVOIDED = 9 # 相比每次全盘扫描省下的项数
+CONSTRAINT_EVALS = 10 # 约束的 scoped_candidates 调用次数
+CONSTRAINT_SKIPS = 11 # 因为没有在看的格子变化而跳过的约束数
+DEPTH_HIST_START = 12 # 每层的节点数
+DEPTH_HIST_SIZE = 82 # 同 search.MAX_DEPTH
+# DeadStateTable 的计数，放在直方图后面，不改变上面的下标（numba 的缓存不会因为别的文件的常量变化而失效）
+DEAD_HITS = DEPTH_HIST_START + DEPTH_HIST_SIZE
+DEAD_MISSES = DEAD_HITS + 1
+DEAD_EVICTIONS = DEAD_HITS + 2
+COUNTERS_SIZE = DEAD_EVICTIONS + 1
+
+PLACEMENT_NAMES = ("naked_single", "hidden_single_row", "hidden_single_col", "hidden_single_box")
+
+class PhaseProfiler:
+    '''
+    The time and the call count of each phase of a solve (`settle`, `quickdrops`, each constraint, ...), see `src.solver.profiler`.
+
+    Attributes:
+        records: `{phase: [calls, total_time, self_time]}`. `self_time` excludes the phases called inside, e.g. the constraints inside `settle`.
+    '''
+
+    __slots__ = ("records", "_child_time",)
+
+    def __init__(self) -> None:
+        self.records: dict[str, list] = {}
+        self._child_time = 0.0 # 当前这一层里，内层阶段已经用掉的时间
+
+    def call(self, phase: str, func, *args):
+        '''Call `func(*args)` and count it as one call of `phase`.'''
+        outer_child_time = self._child_time
+        self._child_time = 0.0
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            record = self.records.get(phase)
+            if record is None:
+                record = self.records[phase] = [0, 0.0, 0.0]
+            record[0] += 1
+            record[1] += elapsed
+            record[2] += elapsed - self._child_time
+            self._child_time = outer_child_time + elapsed
+
+    def merge(self, other: "PhaseProfiler") -> "PhaseProfiler":
+        for phase, (calls, total_time, self_time) in other.records.items():
+            record = self.records.setdefault(phase, [0, 0.0, 0.0])
+            record[0] += calls
+            record[1] += total_time
+            record[2] += self_time
+        return self
+
+    def copy(self) -> "PhaseProfiler":
+        return PhaseProfiler().merge(self)
+
+    def to_dict(self) -> dict:
+        return {phase: {"calls": calls, "total_time": total_time, "self_time": self_time}
+                for phase, (calls, total_time, self_time) in self.records.items()}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "PhaseProfiler":
+        profiler = cls()
+        for phase, record in d.items():
+            profiler.records[phase] = [record["calls"], record["total_time"], record["self_time"]]
+        return profiler
+
+    def report(self) -> str:
+        '''A text table sorted by the self time.'''
+        lines = [f"{'phase':<48}{'calls':>10}{'total(s)':>12}{'self(s)':>12}{'self/call(us)':>15}"]
+        for phase, (calls, total_time, self_time) in sorted(self.records.items(), key=lambda item: -item[1][2]):
+            lines.append(f"{phase:<48}{calls:>10}{total_time:>12.4f}{self_time:>12.4f}{self_time / calls * 1e6:>15.2f}")
+        return "\n".join(lines)
+
+class SolveStats:
+    '''
+    The statistics of a solve (or of a batch of solves, aggregated with `merge` or `+`).
+
+    Attributes:
+        counters: the int64 array of the counters above. The search kernels and the boards update it in place.
+
+        phases: the `PhaseProfiler` if profiling, else `None`.
+
+    `wall_time` is measured by `time.perf_counter`; `cpu_time` by `time.thread_time` (the solving thread only),
+    or `time.process_time` if started with `process=True` (for the multi-threaded batches).
+    '''
+
+    __slots__ = ("counters", "phases", "_wall_time", "_cpu_time", "_wall_start", "_cpu_start", "_cpu_clock",)
+
+    def __init__(self, profile: bool = False) -> None:
+        self.counters = np.zeros(COUNTERS_SIZE, dtype=np.int64)
+        self.phases: PhaseProfiler | None = PhaseProfiler() if profile else None
+        self._wall_time = 0.0
+        self._cpu_time = 0.0
+        self._wall_start = None
+        self._cpu_start = None
+        self._cpu_clock = time.thread_time
+
+    def start(self, process: bool = False) -> "SolveStats":
+        self._cpu_clock = time.process_time if process else time.thread_time
+        self._wall_start = time.perf_counter()
+        self._cpu_start = self._cpu_clock()
+        return self
+
+    def stop(self) -> "SolveStats":
+        if self._wall_start is not None:
+            self._wall_time += time.perf_counter() - self._wall_start
+            self._cpu_time += self._cpu_clock() - self._cpu_start
+            self._wall_start = None
+            self._cpu_start = None
+        return self
+
+    @property
+    def running(self) -> bool:
+        return self._wall_start is not None
+
+    @property
+    def wall_time(self) -> float:
+        '''Seconds, including the running part if not stopped.'''
+        if self._wall_start is None:
+            return self._wall_time
+        return self._wall_time + time.perf_counter() - self._wall_start
+
+    @property
+    def cpu_time(self) -> float:
+        '''Seconds, including the running part if not stopped.'''
+        if self._cpu_start is None:
+            return self._cpu_time
+        return self._cpu_time + self._cpu_clock() - self._cpu_start
+
+    @property
+    def nodes(self) -> int:
+        return int(self.counters[NODES])
+
+    @property
+    def settles(self) -> int:
+        return int(self.counters[SETTLES])
+
+    @property
+    def backtracks(self) -> int:
+        return int(self.counters[BACKTRACKS])
+
+    @property
+    def max_depth(self) -> int:
+        return int(self.counters[MAX_DEPTH])
+
+    @property
+    def placements(self) -> dict[str, int]:
+        '''The numbers settled by `quickdrops`, by technique.'''
+        return {name: int(self.counters[NAKED_SINGLES + k]) for k, name in enumerate(PLACEMENT_NAMES)}
+
+    @property
+    def scans(self) -> int:
+        return int(self.counters[SCANS])
+
+    @property
+    def scans_avoided(self) -> int:
+        return int(self.counters[SCANS_AVOIDED])
+
+    @property
+    def constraint_evals(self) -> int:
+        return int(self.counters[CONSTRAINT_EVALS])
+
+    @property
+    def constraint_skips(self) -> int:
+        '''The constraint evaluations skipped by the watch lists (see `src.solver.watches`).'''
+        return int(self.counters[CONSTRAINT_SKIPS])
+
+    @property
+    def dead_hits(self) -> int:
+        '''The positions found in the `DeadStateTable` (see `src.solver.transposition`).'''
+        return int(self.counters[DEAD_HITS])
+
+    @property
+    def dead_misses(self) -> int:
+        return int(self.counters[DEAD_MISSES])
+
+    @property
+    def dead_evictions(self) -> int:
+        return int(self.counters[DEAD_EVICTIONS])
+
+    @property
+    def depth_histogram(self) -> list[int]:
+        '''The number of nodes at each depth, up to the deepest one.'''
+        hist = self.counters[DEPTH_HIST_START:DEPTH_HIST_START + DEPTH_HIST_SIZE]
+        nonzero = np.flatnonzero(hist)
+        if nonzero.size == 0:
+            return []
+        return hist[:nonzero[-1] + 1].tolist()
+
+    def record_node(self, depth: int) -> None:
+        '''Count a search node at `depth` (the root is `0`).'''
+        self.counters[NODES] += 1
+        self.counters[DEPTH_HIST_START + depth] += 1
+        if depth > self.counters[MAX_DEPTH]:
+            self.counters[MAX_DEPTH] = depth
+
+    def merge(self, other: "SolveStats", times: bool = True) -> "SolveStats":
+        '''
+        Add `other` into this one. `max_depth` takes the maximum, the others are summed.
+
+        `times=False` only merges the counters, e.g. when `other` ran inside the time of this one.
+        '''
+        max_depth = max(self.counters[MAX_DEPTH], other.counters[MAX_DEPTH])
+        self.counters += other.counters
+        self.counters[MAX_DEPTH] = max_depth
+        if times:
+            self._wall_time += other.wall_time
+            self._cpu_time += other.cpu_time
+        if other.phases is not None:
+            if self.phases is None:
+                self.phases = PhaseProfiler()
+            self.phases.merge(other.phases)
+        return self
+
+    def __add__(self, other: "SolveStats") -> "SolveStats":
+        return self.copy().merge(other)
+
+    def __radd__(self, other) -> "SolveStats":
+        # 支持 sum(stats_list)
+        if other == 0:
+            return self.copy()
+        return NotImplemented
+
+    def copy(self) -> "SolveStats":
+        '''A stopped copy.'''
+        new = SolveStats()
+        new.counters[:] = self.counters
+        new._wall_time = self.wall_time
+        new._cpu_time = self.cpu_time
+        new.phases = None if self.phases is None else self.phases.copy()
+        return new
+
+    def to_dict(self) -> dict:
+        '''`"phases"` is only included if profiling.'''
+        d = {
+            "nodes": self.nodes,
+            "settles": self.settles,
+            "backtracks": self.backtracks,
+            "max_depth": self.max_depth,
+            "placements": self.placements,
+            "scans": self.scans,
+            "scans_avoided": self.scans_avoided,
+            "constraint_evals": self.constraint_evals,
+            "constraint_skips": self.constraint_skips,
+            "dead_hits": self.dead_hits,
+            "dead_misses": self.dead_misses,
+            "dead_evictions": self.dead_evictions,
+            "depth_histogram": self.depth_histogram,
+            "wall_time": self.wall_time,
+            "cpu_time": self.cpu_time,
+        }
+        if self.phases is not None:
+            d["phases"] = self.phases.to_dict()
+        return d
+
+    def to_json(self, **kwargs) -> str:
+        return json.dumps(self.to_dict(), **kwargs)
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "SolveStats":
+        stats = cls()
+        stats.counters[NODES] = d["nodes"]
+        stats.counters[SETTLES] = d["settles"]
+        stats.counters[BACKTRACKS] = d["backtracks"]
+        stats.counters[MAX_DEPTH] = d["max_depth"]
+        for k, name in enumerate(PLACEMENT_NAMES):
+            stats.counters[NAKED_SINGLES + k] = d["placements"][name]
+        stats.counters[SCANS] = d["scans"]
+        stats.counters[SCANS_AVOIDED] = d["scans_avoided"]
+        stats.counters[CONSTRAINT_EVALS] = d.get("constraint_evals", 0)
+        stats.counters[CONSTRAINT_SKIPS] = d.get("constraint_skips", 0)
+        stats.counters[DEAD_HITS] = d.get("dead_hits", 0)
+        stats.counters[DEAD_MISSES] = d.get("dead_misses", 0)
+        stats.counters[DEAD_EVICTIONS] = d.get("dead_evictions", 0)
+        hist = d["depth_histogram"]
+        stats.counters[DEPTH_HIST_START:DEPTH_HIST_START + len(hist)] = hist
+        stats._wall_time = d["wall_time"]
+        stats._cpu_time = d["cpu_time"]
+        if "phases" in d:
+            stats.phases = PhaseProfiler.from_dict(d["phases"])
+        return stats
+
+    def __repr__(self) -> str:
+        return f"SolveStats(nodes={self.nodes}, backtracks={self.backtracks}, max_depth={self.max_depth}, wall_time={self.wall_time:.6f})"
@@ -1,49 +1,79 @@
 import numpy as np
 import time
-import copy
 import sys
 import threading
 import queue
-from typing import Optional, Sequence
+from itertools import islice
+from typing import Iterator, Optional, Sequence
 
 from src.utils.type_definitions import *
 from src.constraints import Constraint
 from .solvingboard import SolvingBoard
+from .bitboard import BitSolvingBoard
+from .profiler import ProfiledSolvingBoard, ProfiledBitSolvingBoard
+from .search import _numba_dfs, _numba_count, SOLVED, ABORTED
+from .propagator import compile_constraints
+from . import parallel
+from .transposition import DeadStateTable, HITS, MISSES, EVICTIONS
+from .stats import SolveStats, SETTLES, BACKTRACKS, DEAD_HITS, DEAD_MISSES, DEAD_EVICTIONS
 
 OUTPUT_TIME_INTERVAL = 0.1
 
 class Sudoku:
     '''The class of a particular sudoku game.'''
 
-    search_counter = 0
-    time_counter = 0
-
     x_indices, y_indices = np.indices((9,9))
 
-    @classmethod
-    def reset_counter(cls) -> None:
-        cls.search_counter = 0
-        cls.time_counter = time.perf_counter()
+    def reset_counter(self) -> None:
+        '''Start a new `self.stats`. The boards created before keep counting into the old one.'''
+        self.stats = SolveStats(profile=self.profile).start()
     
-    @classmethod
-    def get_counter_stat(cls):
+    def get_counter_stat(self):
         '''Return a `tuple` of `(search_count, cost_time)`.'''
-        cost_time = time.perf_counter() - cls.time_counter
-        return cls.search_counter, cost_time
+        return self.stats.nodes, self.stats.wall_time
+
+    @property
+    def search_counter(self) -> int:
+        return self.stats.nodes
 
     def __init__(self,
                  puzzle: NumBoard,
                  constraints: Sequence[Constraint] = [],
                  out_q: Optional[queue.Queue] = None,
-                 stop_event: Optional[threading.Event] = None
+                 stop_event: Optional[threading.Event] = None,
+                 bitmask: bool = False,
+                 dead_table_capacity: int = 0,
+                 use_trail: bool = False,
+                 profile: bool = False
                  ) -> None:
+        '''
+        Args:
+            bitmask: use `BitSolvingBoard` (one uint16 per cell) instead of `SolvingBoard` (9x9x9 bool) in searching.
+            use_trail: backtrack by rewinding an undo trail instead of copying the boards. Only for `SolvingBoard`, `BitSolvingBoard` is cheap enough to copy.
+            dead_table_capacity: the capacity of the `DeadStateTable` which remembers unsolvable positions during a `solve` or a whole `solve_true_candidates`. `0` means disabled.
+            profile: time each phase of the search (see `src.solver.profiler`) into `self.stats.phases`. Not supported by `solve_compiled`.
+        '''
         self.puzzle_board: NumBoard = puzzle
         self.constraints:Sequence[Constraint] = constraints
+        if bitmask and use_trail:
+            raise ValueError("use_trail is only supported by SolvingBoard.")
+        self.bitmask = bitmask
+        self.use_trail = use_trail
+        self.profile = profile
         self.tuf_board: TufBoard = np.zeros((9, 9, 9), dtype=np.int8) # 0->Unknown; 1->true; -1->false
+        self.dead_table_capacity = dead_table_capacity
+        self.dead_table: DeadStateTable | None = None
+        self._dead_counted = np.zeros(3, dtype=np.int64) # 已经记进 self.stats 的命中、未命中、淘汰次数
+        # compile_constraints 的结果，约束没换就不再重新生成
+        self._program_constraints: tuple | None = None
+        self._program: tuple | None = None
         # 多线程使用的属性
         self.out_q = out_q
         self.stop_event = stop_event
         self.output_timer = time.perf_counter()
+        # 统计，每个对象独立
+        self.stats: SolveStats
+        self.reset_counter()
 
     def init_settle(self):
         rows, cols = np.nonzero(self.puzzle_board)
@@ -61,31 +91,68 @@ class Sudoku:
             self.tuf_board[i, j, num-1] = 1
         return
 
+    def new_solving_board(self) -> SolvingBoard | BitSolvingBoard:
+        '''Construct the initial board of the search from `self.puzzle_board` and `self.tu_board`.'''
+        if self.profile:
+            if self.bitmask:
+                return ProfiledBitSolvingBoard(self.stats.phases, self.puzzle_board, possible_cands=self.tu_board, constraints=self.constraints, stat_counters=self.stats.counters)
+            return ProfiledSolvingBoard(self.stats.phases, self.puzzle_board, possible_cands=self.tu_board, constraints=self.constraints, use_trail=self.use_trail, stat_counters=self.stats.counters)
+        if self.bitmask:
+            return BitSolvingBoard(self.puzzle_board, possible_cands=self.tu_board, constraints=self.constraints, stat_counters=self.stats.counters)
+        return SolvingBoard(self.puzzle_board, possible_cands=self.tu_board, constraints=self.constraints, use_trail=self.use_trail, stat_counters=self.stats.counters)
+
+    def reset_dead_table(self) -> None:
+        self.dead_table = DeadStateTable(self.dead_table_capacity) if self.dead_table_capacity > 0 else None
+        # 新数组：parallel.init_worker 浅复制出来的 Sudoku 不能和原来的共用
+        self._dead_counted = np.zeros(3, dtype=np.int64)
+
+    def count_dead_table(self) -> None:
+        '''Add the hits, misses and evictions of `self.dead_table` since the last call into `self.stats`.'''
+        if self.dead_table is None:
+            return
+        counts = self.dead_table.stats[[HITS, MISSES, EVICTIONS]]
+        self.stats.counters[[DEAD_HITS, DEAD_MISSES, DEAD_EVICTIONS]] += counts - self._dead_counted
+        self._dead_counted = counts
+
     @property
     def tu_board(self):
         return self.tuf_board >= 0
     
-    def solve_step(self, curr_sol: SolvingBoard) -> SolvingBoard | None:
+    def poll(self) -> None:
+        '''
+        The multi-threading control in searching: output `tuf_board` into `out_q` every `OUTPUT_TIME_INTERVAL`,
+        and raise `InterruptedError` if `stop_event` is set.
+        '''
+        if time.perf_counter() - self.output_timer > OUTPUT_TIME_INTERVAL:
+            if self.out_q is not None:
+                # 到轮次了，输出
+                self.out_q.put(self.tuf_board.copy())
+                time.sleep(OUTPUT_TIME_INTERVAL / 10)
+            self.output_timer = time.perf_counter()
+            # 被中止了
+            if self.stop_event is not None and self.stop_event.is_set():
+                raise InterruptedError
+
+    def solve_step(self, curr_sol: SolvingBoard | BitSolvingBoard, depth: int = 0) -> SolvingBoard | BitSolvingBoard | None:
         '''
         A recursive function. Solve the sudoku for one step and then call itself for the following steps.
 
+        `depth` is only for `self.stats`.
+
         Return a `SolvingBoard` object if finally solved;
         
         Return `None` if it's unsolvable.
         '''
 
-        # 多线程控制
-        if time.perf_counter() - self.output_timer > OUTPUT_TIME_INTERVAL:
-            if self.out_q is not None and self.stop_event is not None:
-                # 到轮次了，输出
-                self.out_q.put(self.tuf_board.copy())
-                time.sleep(OUTPUT_TIME_INTERVAL / 10)
-                self.output_timer = time.perf_counter()
-                # 被中止了
-                if self.stop_event.is_set():
-                    raise InterruptedError
+        self.poll()
+
+        # 已知无解的局面
+        curr_hash = curr_sol.zobrist
+        if self.dead_table is not None and curr_hash in self.dead_table:
+            return None
 
-        Sudoku.search_counter += 1
+        stats = self.stats
+        stats.record_node(depth)
 
         # If all cells are assigned
         curr_solving_pos = curr_sol.get_least_cand_pos()[1]
@@ -93,51 +160,227 @@ class Sudoku:
             # Check constraints
             for constraint in self.constraints:
                 if not constraint.is_valid(curr_sol.assigned_board):
+                    if self.dead_table is not None:
+                        self.dead_table.add(curr_hash)
                     return None
             return curr_sol
         
         # If not all cells are assigned, try settling
-        i,j = curr_solving_pos
-        curr_cand_list = np.flatnonzero(curr_sol.candidates_board[i,j]) + 1
+        curr_cand_list = curr_sol.get_cands(curr_solving_pos)
 
-        restore_assigned_board = curr_sol.assigned_board
-        restore_cand_board = curr_sol.candidates_board
+        restore_snapshot = curr_sol.snapshot()
 
         for candidate in curr_cand_list:
 
-            curr_sol.assigned_board = restore_assigned_board.copy()
-            curr_sol.candidates_board = restore_cand_board.copy()
+            curr_sol.restore(restore_snapshot)
             next_sol = curr_sol
+            stats.counters[SETTLES] += 1
 
             if not next_sol.settle(curr_solving_pos, candidate):
+                stats.counters[BACKTRACKS] += 1
                 continue
             
             if not next_sol.quickdrops():
+                stats.counters[BACKTRACKS] += 1
                 continue
 
             # Jump into deeper recursion
-            ret_sol = self.solve_step(next_sol)
+            ret_sol = self.solve_step(next_sol, depth + 1)
             if ret_sol:
                 return ret_sol
+            stats.counters[BACKTRACKS] += 1
         
+        if self.dead_table is not None:
+            self.dead_table.add(curr_hash)
         return None
     
-    def solve(self, reset_counter = True):
+    def iter_step(self, curr_sol: SolvingBoard | BitSolvingBoard, depth: int = 0) -> Iterator[NumBoard]:
+        '''
+        The generator version of `solve_step`: yield the `assigned_board` of every solution below `curr_sol` (a copy each).
+
+        The suspended search keeps one generator frame and one snapshot per level, so the memory is O(depth).
+        A position is added into the dead table only if no solution is found below it.
+        '''
+        self.poll()
+
+        curr_hash = curr_sol.zobrist
+        if self.dead_table is not None and curr_hash in self.dead_table:
+            return
+
+        stats = self.stats
+        stats.record_node(depth)
+
+        curr_solving_pos = curr_sol.get_least_cand_pos()[1]
+        if not curr_solving_pos:
+            for constraint in self.constraints:
+                if not constraint.is_valid(curr_sol.assigned_board):
+                    if self.dead_table is not None:
+                        self.dead_table.add(curr_hash)
+                    return
+            yield curr_sol.assigned_board.copy()
+            return
+
+        curr_cand_list = curr_sol.get_cands(curr_solving_pos)
+        restore_snapshot = curr_sol.snapshot()
+        found = False
+
+        for candidate in curr_cand_list:
+
+            curr_sol.restore(restore_snapshot)
+            next_sol = curr_sol
+            stats.counters[SETTLES] += 1
+
+            if not next_sol.settle(curr_solving_pos, candidate):
+                stats.counters[BACKTRACKS] += 1
+                continue
+
+            if not next_sol.quickdrops():
+                stats.counters[BACKTRACKS] += 1
+                continue
+
+            sub_found = False
+            for solution in self.iter_step(next_sol, depth + 1):
+                sub_found = True
+                yield solution
+            if sub_found:
+                found = True
+            else:
+                stats.counters[BACKTRACKS] += 1
+
+        if not found and self.dead_table is not None:
+            self.dead_table.add(curr_hash)
+
+    def iter_solutions(self) -> Iterator[NumBoard]:
+        '''
+        Yield every solution (a `(9, 9)` int8 array) one at a time, in the same order as the search of `solve`.
+        Constraints are supported.
+
+        The search is suspended between two solutions and can be stopped at any time (e.g. `itertools.islice`, or `close()`).
+        The memory is O(depth), no matter how many solutions there are.
+
+        `self.stats` is reset when the iteration starts, and stopped when it ends or is closed.
+        '''
+        self.reset_counter()
+        init_sol = self.new_solving_board()
+        self.reset_dead_table()
+        try:
+            yield from self.iter_step(init_sol)
+        finally:
+            self.count_dead_table()
+            self.stats.stop()
+
+    def solve(self, reset_counter = True, with_stats: bool = False):
         '''
         Solve the sudoku.
         
         `self.puzzle_board` will remain untouched.
 
-        Return a `SolvingBoard` object if the puzzle is solved.
+        Return a `SolvingBoard` (or `BitSolvingBoard`) object if the puzzle is solved.
 
         Return `None` is the puzzle is not solvable.
+
+        With `with_stats`, return a `tuple` of `(result, stats)` instead. The stats are also kept in `self.stats`.
         '''
-        SolvingBoard.constraints = self.constraints
-        init_sol = SolvingBoard(puzzle=self.puzzle_board, possible_cands=self.tu_board)
         if reset_counter:
             self.reset_counter()
-        return self.solve_step(init_sol)
+        elif not self.stats.running:
+            self.stats.start()
+        init_sol = self.new_solving_board()
+        self.reset_dead_table()
+        ret = self.solve_step(init_sol)
+        self.count_dead_table()
+        self.stats.stop()
+        if with_stats:
+            return ret, self.stats
+        return ret
     
+    def solve_compiled(self, reset_counter = True, max_nodes: int = 0, with_stats: bool = False):
+        '''
+        Solve the sudoku with the whole search loop in nopython mode (see `src.solver.search`).
+
+        Much faster than `solve`, but it can't be interrupted by `stop_event`. Use `max_nodes` to limit the search instead (`0` means unlimited).
+
+        The constraints are lowered into tables by `Constraint.lower()` (see `src.solver.propagator`),
+        `NotImplementedError` is raised if any of them can't be lowered.
+
+        Return a `BitSolvingBoard` object if the puzzle is solved. The constraints are not attached to it.
+
+        Return `None` if the puzzle is not solvable (or aborted).
+
+        With `with_stats`, return a `tuple` of `(result, stats)` instead, the same as `solve`.
+        '''
+        program = self.compile_constraints()
+        if reset_counter:
+            self.reset_counter()
+        elif not self.stats.running:
+            self.stats.start()
+        init_sol = BitSolvingBoard(puzzle=self.puzzle_board, possible_cands=self.tu_board, stat_counters=self.stats.counters)
+        status, _ = _numba_dfs(init_sol.candidates_mask, init_sol.assigned_board, max_nodes, self.stats.counters, program)
+        self.stats.stop()
+        ret = init_sol if status == SOLVED else None
+        if with_stats:
+            return ret, self.stats
+        return ret
+
+    def compile_constraints(self) -> tuple | None:
+        '''
+        The program of `self.constraints` for the nopython search, `None` if there's no constraint.
+        Raise `NotImplementedError` if any constraint can't be lowered.
+        '''
+        if not self.constraints:
+            return None
+        program = self._lowered_program()
+        if program is None:
+            raise NotImplementedError("Some constraints can't be lowered for the nopython mode (see `Constraint.lower`).")
+        return program
+
+    def _lowered_program(self) -> tuple | None:
+        '''`compile_constraints(self.constraints)`, cached until `self.constraints` holds other objects.'''
+        constraints = tuple(self.constraints)
+        cached = self._program_constraints
+        if cached is None or len(cached) != len(constraints) or any(a is not b for a, b in zip(cached, constraints)):
+            self._program = compile_constraints(constraints)
+            self._program_constraints = constraints
+        return self._program
+
+    def count_solutions(self, limit: int = 2, max_nodes: int = 0, with_stats: bool = False):
+        '''
+        Count the solutions, stopping as soon as `limit` solutions are found. `limit=2` is enough to check the uniqueness.
+
+        The search is the same as `solve_compiled`, but goes on after a solution.
+        If some constraint can't be lowered, the solutions are counted by `iter_solutions` instead (much slower), and `max_nodes` is not supported.
+
+        Return a `tuple` of `(count, solutions)`, `solutions` is a `(count, 9, 9)` int8 array of the distinct solutions found.
+        `count` is `None` if aborted by `max_nodes` (`solutions` still has the ones found before).
+
+        With `with_stats`, return a `tuple` of `((count, solutions), stats)` instead, the same as `solve`.
+        '''
+        if limit < 1:
+            raise ValueError("limit must be positive.")
+        program = self._lowered_program() if self.constraints else None
+        if self.constraints and program is None:
+            if max_nodes > 0:
+                raise NotImplementedError("max_nodes is not supported with the constraints which can't be lowered.")
+            solutions = np.array(list(islice(self.iter_solutions(), limit)), dtype=np.int8).reshape(-1, 9, 9)
+            ret = len(solutions), solutions
+            if with_stats:
+                return ret, self.stats
+            return ret
+        self.reset_counter()
+        init_sol = BitSolvingBoard(puzzle=self.puzzle_board, possible_cands=self.tu_board, stat_counters=self.stats.counters)
+        solutions = np.zeros((limit, 9, 9), dtype=np.int8)
+        status, count, _ = _numba_count(init_sol.candidates_mask, init_sol.assigned_board, limit, max_nodes, solutions, self.stats.counters, program)
+        self.stats.stop()
+        ret = (None if status == ABORTED else count), solutions[:count]
+        if with_stats:
+            return ret, self.stats
+        return ret
+
+    def is_unique(self, max_nodes: int = 0) -> bool | None:
+        '''Whether the puzzle has exactly one solution. `None` if aborted by `max_nodes`.'''
+        count, _ = self.count_solutions(2, max_nodes)
+        return None if count is None else count == 1
+
     def get_least_unknown_cand_pos(self) -> tuple[int, Position | None]:
         '''
         Scan the whole `tuf_board`,
@@ -158,16 +401,34 @@ class Sudoku:
         u_count = ucount_board[i, j]
         return u_count, (i, j)
 
-    def solve_true_candidates(self):
+    def solve_true_candidates(self, max_workers: int = 1, use_threads: bool = False):
+        '''
+        Find out whether each candidate appears in some solution. The result is in `self.tuf_board`.
+
+        Args:
+            max_workers: the number of workers probing candidates in parallel. `1` means serial.
+            use_threads: use a thread pool instead of a process pool. Note that the constraints are mostly not nopython code, so threads only help a little.
+
+        Return `self.stats`, which is not stopped (call `reset_counter` before this to time only this call).
+        '''
 
         self.output_timer = time.perf_counter()
 
         self.init_settle()
-        SolvingBoard.constraints = self.constraints
-        init_sol = SolvingBoard(self.puzzle_board, possible_cands=self.tu_board)
+        init_sol = self.new_solving_board()
         qsucc = init_sol.quickdrops()
         if not qsucc:
             raise Exception(f"Sudoku puzzle is incompatible.")
+        # quickdrops 填上的格子，其他数字都不在任何解里；这个数字本身留给试探（已填的格子不能再 settle）
+        fixed = (init_sol.assigned_board != 0) & (self.puzzle_board == 0)
+        self.tuf_board[fixed[:, :, None] & (np.arange(9) != init_sol.assigned_board[:, :, None] - 1)] = -1
+
+        # 所有试探共用一张表
+        self.reset_dead_table()
+
+        if max_workers > 1:
+            self.solve_true_candidates_parallel(init_sol, max_workers, use_threads)
+            return self.stats
 
         u_count, pos = self.get_least_unknown_cand_pos()
         while u_count and pos:
@@ -175,9 +436,9 @@ class Sudoku:
             u_cand_ls = np.flatnonzero(self.tuf_board[i,j] == 0) # range 0-8
             for u_cand in u_cand_ls:
                 self.flush_tuf_count()
-                try_sol = copy.deepcopy(init_sol)
-                try_sol.candidates_board &= self.tu_board
-                succ = try_sol.settle(pos, u_cand+1)
+                try_sol = init_sol.copy()
+                try_sol.restrict(self.tu_board)
+                succ = try_sol.assigned_board[i, j] == u_cand+1 or try_sol.settle(pos, u_cand+1)
                 if succ:
                     qsucc = try_sol.quickdrops()
                     if qsucc:
@@ -190,8 +451,81 @@ class Sudoku:
                 self.tuf_board[i,j,u_cand] = -1
             self.flush_tuf_count()
             u_count, pos = self.get_least_unknown_cand_pos()
-        return
+        self.count_dead_table()
+        return self.stats
     
+    def solve_true_candidates_parallel(self, init_sol: SolvingBoard | BitSolvingBoard, max_workers: int, use_threads: bool) -> None:
+        '''
+        The coordinator of parallel `solve_true_candidates`.
+
+        Probes are handed out a few at a time. Every solution found by a worker marks its 81 candidates as true here,
+        so the probes of those candidates are skipped before being handed out.
+        '''
+        # 只有并行时才用到，不在 import src.solver 时加载
+        import multiprocessing
+        from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+        # 按未知候选数从少到多排列，和串行版本的顺序接近
+        ucount_board = np.sum(self.tuf_board == 0, axis=2)
+        probes = sorted(
+            ((i, j, n) for i, j, n in zip(*np.nonzero(self.tuf_board == 0)) if self.puzzle_board[i, j] == 0),
+            key=lambda p: (ucount_board[p[0], p[1]], p)
+        )
+        probes.reverse() # 从尾部 pop
+
+        # worker 里的 Sudoku 不输出中间结果；线程可以共享 stop_event，进程不行
+        worker_sudoku = Sudoku(self.puzzle_board, self.constraints,
+                               stop_event=self.stop_event if use_threads else None,
+                               bitmask=self.bitmask,
+                               dead_table_capacity=self.dead_table_capacity,
+                               use_trail=self.use_trail,
+                               profile=self.profile)
+        executor: Executor
+        if use_threads:
+            executor = ThreadPoolExecutor(max_workers, initializer=parallel.init_worker, initargs=(worker_sudoku, init_sol))
+        else:
+            executor = ProcessPoolExecutor(max_workers, mp_context=multiprocessing.get_context("spawn"),
+                                           initializer=parallel.init_worker, initargs=(worker_sudoku, init_sol))
+
+        in_flight = {}
+        try:
+            while probes or in_flight:
+                # 补充任务，跳过已经确定的候选
+                while probes and len(in_flight) < 2 * max_workers:
+                    i, j, n = probes.pop()
+                    if self.tuf_board[i, j, n] != 0:
+                        continue
+                    future = executor.submit(parallel.probe_in_worker, self.tu_board, (i, j), n)
+                    in_flight[future] = (i, j, n)
+                if not in_flight:
+                    break
+
+                done, _ = wait(in_flight, timeout=OUTPUT_TIME_INTERVAL, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i, j, n = in_flight.pop(future)
+                    assigned_board, probe_stats = future.result()
+                    # worker 的耗时和这里的重叠，只加计数
+                    self.stats.merge(probe_stats, times=False)
+                    if assigned_board is not None:
+                        # candidate is good
+                        self.tuf_board[Sudoku.x_indices, Sudoku.y_indices, assigned_board-1] = 1
+                    else:
+                        # candidate is bad
+                        self.tuf_board[i, j, n] = -1
+                if done:
+                    self.flush_tuf_count()
+
+                # 多线程控制
+                if time.perf_counter() - self.output_timer > OUTPUT_TIME_INTERVAL:
+                    if self.out_q is not None:
+                        self.out_q.put(self.tuf_board.copy())
+                    self.output_timer = time.perf_counter()
+                    if self.stop_event is not None and self.stop_event.is_set():
+                        raise InterruptedError
+        finally:
+            executor.shutdown(wait=use_threads, cancel_futures=True)
+        return
+
     def count_tuf_cands(self):
         t = np.sum(self.tuf_board == 1)
         u = np.sum(self.tuf_board == 0)
@@ -200,7 +534,7 @@ class Sudoku:
     
     def flush_tuf_count(self):
         t,u,f = self.count_tuf_cands()
-        sys.stdout.write(f"\rUnknown={u} True={t} False={f} in {time.perf_counter()-Sudoku.time_counter:.4f}s   ")
+        sys.stdout.write(f"\rUnknown={u} True={t} False={f} in {self.stats.wall_time:.4f}s   ")
         sys.stdout.flush()
         return
 
@@ -0,0 +1,125 @@
+'''
+Zobrist hashing of `assigned_board` and a memory-bounded table of known unsolvable positions.
+
+Whether a position can be solved only depends on the assigned numbers (the candidates are deduced from them),
+so a hash of `assigned_board` is enough as the key.
+'''
+
+import numpy as np
+from numba import njit
+
+# ZOBRIST_KEYS[i, j, num-1] 是在 (i, j) 填 num 的随机键；固定种子，保证每次运行一致
+ZOBRIST_KEYS = np.random.default_rng(20250301).integers(0, 2**64, size=(9, 9, 9), dtype=np.uint64, endpoint=False)
+
+# 每组的路数：满了以后淘汰组内最久没有用到的一项
+WAYS = 2
+
+# stats 下标
+HITS = 0
+MISSES = 1
+INSERTS = 2
+EVICTIONS = 3
+
+def zobrist_hash(assigned_board) -> np.uint64:
+    '''Compute the hash of a board from scratch.'''
+    return _numba_zobrist_hash(assigned_board)
+
+class DeadStateTable:
+    '''
+    A fixed-size, 2-way set-associative table of the hashes of unsolvable positions.
+
+    The memory is `capacity * 16` bytes and never grows. When a set is full, the least recently used entry is evicted.
+    '''
+
+    __slots__ = ("keys", "stamps", "stats", "clock",)
+
+    def __init__(self, capacity: int = 1 << 16) -> None:
+        '''`capacity` is rounded up to a power of 2.'''
+        set_num = 1
+        while set_num * WAYS < capacity:
+            set_num <<= 1
+        self.keys = np.zeros((set_num, WAYS), dtype=np.uint64)
+        self.stamps = np.zeros((set_num, WAYS), dtype=np.int64) # 0 表示空位
+        self.stats = np.zeros(4, dtype=np.int64)
+        self.clock = np.ones(1, dtype=np.int64)
+
+    @property
+    def capacity(self) -> int:
+        return self.keys.size
+
+    @property
+    def hits(self) -> int:
+        return int(self.stats[HITS])
+
+    @property
+    def misses(self) -> int:
+        return int(self.stats[MISSES])
+
+    @property
+    def inserts(self) -> int:
+        return int(self.stats[INSERTS])
+
+    @property
+    def evictions(self) -> int:
+        return int(self.stats[EVICTIONS])
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.stamps))
+
+    def __contains__(self, key: np.uint64) -> bool:
+        return _numba_lookup(self.keys, self.stamps, self.stats, self.clock, np.uint64(key))
+
+    def add(self, key: np.uint64) -> None:
+        _numba_insert(self.keys, self.stamps, self.stats, self.clock, np.uint64(key))
+
+    def get_stat(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "size": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "inserts": self.inserts,
+            "evictions": self.evictions,
+        }
+
+@njit(nogil=True, cache=True)
+def _numba_zobrist_hash(assigned_board):
+    h = np.uint64(0)
+    for i in range(9):
+        for j in range(9):
+            if assigned_board[i, j] != 0:
+                h ^= ZOBRIST_KEYS[i, j, assigned_board[i, j] - 1]
+    return h
+
+@njit(nogil=True, cache=True)
+def _numba_lookup(keys, stamps, stats, clock, key):
+    s = np.int64(key & np.uint64(keys.shape[0] - 1))
+    for w in range(WAYS):
+        if stamps[s, w] != 0 and keys[s, w] == key:
+            stamps[s, w] = clock[0]
+            clock[0] += 1
+            stats[HITS] += 1
+            return True
+    stats[MISSES] += 1
+    return False
+
+@njit(nogil=True, cache=True)
+def _numba_insert(keys, stamps, stats, clock, key):
+    s = np.int64(key & np.uint64(keys.shape[0] - 1))
+    found = -1
+    victim = 0
+    for w in range(WAYS):
+        if stamps[s, w] != 0 and keys[s, w] == key:
+            found = w
+            break
+        if stamps[s, w] < stamps[s, victim]:
+            victim = w
+    if found >= 0:
+        victim = found
+    else:
+        if stamps[s, victim] != 0:
+            stats[EVICTIONS] += 1
+        stats[INSERTS] += 1
+    keys[s, victim] = key
+    stamps[s, victim] = clock[0]
+    clock[0] += 1
@@ -0,0 +1,78 @@
+'''
+Compile the kernels before the first solve, e.g. right after starting a worker process.
+
+The kernels are compiled with `cache=True`, so in a new process a warm-up mostly loads the machine code from the numba cache
+(`__pycache__` next to the sources, or `$NUMBA_CACHE_DIR`), which is much faster than compiling.
+The kernels on the `Ordinal` (`OrdArrowConstraint`) can't be cached, they are compiled on the first use unless warmed up here.
+
+Each path solves a small puzzle through the public API, so the same specializations are compiled as the real calls.
+'''
+
+import contextlib
+import io
+import time
+import numpy as np
+from typing import Iterable
+from src.constraints import KillerConstraint, SparseKillerConstraint
+from src.constraints.cache import set_cache
+from .sudoku import Sudoku
+from .batch import solve_many, count_many
+
+WARMUP_PATHS = ("boards", "compiled", "batch", "parallel", "constraints", "ordinal")
+DEFAULT_PATHS = ("boards", "compiled", "batch")
+
+# tests/test_data/hard.csv 的第一题
+WARMUP_PUZZLE = np.array(list("902003600004000802000200000000030058305820000800670000070001000090000040410902307"), dtype=np.int8).reshape(9, 9)
+
+def warmup(paths: Iterable[str] = DEFAULT_PATHS) -> dict[str, float]:
+    '''
+    Compile (or load from the cache) the kernels used by `paths`:
+        `"boards"`: `Sudoku.solve` with `SolvingBoard` (with and without the trail) and `BitSolvingBoard`;
+        `"compiled"`: `Sudoku.solve_compiled` and `Sudoku.count_solutions`;
+        `"batch"`: `solve_many` and `count_many`;
+        `"parallel"`: `solve_many(parallel=True)`. Call it from the main thread, numba's threading layer may hang at exit otherwise;
+        `"constraints"`: the killer constraints in the Python search and in the nopython search;
+        `"ordinal"`: the `Ordinal` machinery of `OrdArrowConstraint`.
+
+    Return the seconds spent on each path.
+    '''
+    times = {}
+    for path in paths:
+        if path not in WARMUP_PATHS:
+            raise ValueError(f"unknown warm-up path {path!r}, choose from {', '.join(WARMUP_PATHS)}")
+        start = time.perf_counter()
+        if path == "boards":
+            for kwargs in ({}, {"use_trail": True}, {"bitmask": True}):
+                Sudoku(WARMUP_PUZZLE, **kwargs).solve()
+        elif path == "compiled":
+            Sudoku(WARMUP_PUZZLE).solve_compiled()
+            Sudoku(WARMUP_PUZZLE).count_solutions()
+        elif path == "batch":
+            for with_stats in (False, True):
+                solve_many(WARMUP_PUZZLE[None], with_stats=with_stats)
+                count_many(WARMUP_PUZZLE[None], with_stats=with_stats)
+        elif path == "parallel":
+            solve_many(WARMUP_PUZZLE[None], parallel=True)
+        elif path == "constraints":
+            _warmup_constraints()
+        else:
+            # 只有这里才需要编译 Ordinal
+            from src.utils.ordinal import warmup_ordinal
+            warmup_ordinal()
+        times[path] = time.perf_counter() - start
+    return times
+
+def _warmup_constraints() -> None:
+    puzzle = WARMUP_PUZZLE.copy()
+    puzzle[0, 1:3] = 0
+    # 不往预处理缓存里写东西，也不打印预处理的信息
+    old_cache = set_cache(None)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            constraints = [KillerConstraint([(0, 1), (0, 2)], 10), SparseKillerConstraint([(0, 1), (1, 1)], 13)]
+    finally:
+        set_cache(old_cache)
+    for bitmask in (False, True):
+        Sudoku(puzzle, constraints, bitmask=bitmask).solve()
+    Sudoku(puzzle, constraints).solve_compiled()
+    Sudoku(puzzle, constraints).count_solutions()
@@ -0,0 +1,91 @@
+'''
+Watch lists of the constraints: after a number is settled on a cell, only the constraints watching the cell are evaluated.
+
+A constraint tells its cells by `Constraint.scope()`. The ones without a scope (`None`) watch every cell.
+'''
+
+import numpy as np
+from heapq import heappush, heappop
+from typing import Sequence
+from src.constraints import Constraint
+from .stats import CONSTRAINT_EVALS, CONSTRAINT_SKIPS
+
+def _peers_matrix() -> np.ndarray:
+    '''`PEERS[a, b]`: whether cell `a` and `b` share a row, column or box (`True` on the diagonal).'''
+    rows, cols = np.divmod(np.arange(81), 9)
+    boxes = rows // 3 * 3 + cols // 3
+    return (rows[:, None] == rows) | (cols[:, None] == cols) | (boxes[:, None] == boxes)
+
+PEERS = _peers_matrix()
+
+class ConstraintWatches:
+    '''
+    The cell-to-constraint index of a list of constraints, built once with the board and shared by its copies.
+
+    Attributes:
+        cell_watchers: `cell_watchers[i*9+j]` is the sorted tuple of the constraints (by index) to evaluate after a number is settled on (i, j):
+            the ones with (i, j) in the scope, the `uses_candidates` ones with a peer of (i, j) in the scope (the peers lose a candidate),
+            and the ones without a scope.
+        overlaps: `overlaps[k]` is the tuple of the `uses_candidates` constraints (except `k`) to evaluate again after constraint `k` eliminates something:
+            the ones sharing a cell with `k` (all of them if `k` has no scope), and the ones without a scope.
+        all_constraints: all the indices, used when no cell is given.
+    '''
+
+    __slots__ = ("cell_watchers", "overlaps", "all_constraints",)
+
+    def __init__(self, constraints: Sequence[Constraint]) -> None:
+        n = len(constraints)
+        # scopes[k]: 约束 k 的格子（81 个 bool），没有 scope 的全是 True
+        scopes = np.ones((n, 81), dtype=np.bool_)
+        unscoped = np.zeros(n, dtype=np.bool_)
+        uses_candidates = np.array([bool(constraint.uses_candidates) for constraint in constraints], dtype=np.bool_)
+        for k, constraint in enumerate(constraints):
+            cells = constraint.scope()
+            if cells is None:
+                unscoped[k] = True
+                continue
+            cells = np.asarray(cells).reshape(-1, 2)
+            scopes[k] = False
+            scopes[k, cells[:, 0] * 9 + cells[:, 1]] = True
+
+        # 填数会删掉同行、列、宫的候选，用到候选数的约束也要看这些格子
+        watched = scopes.copy()
+        if n:
+            watched[uses_candidates] |= (scopes[uses_candidates].astype(np.int64) @ PEERS) > 0
+        self.cell_watchers = tuple(tuple(np.flatnonzero(watched[:, cell]).tolist()) for cell in range(81))
+
+        shared = (scopes.astype(np.int64) @ scopes.T.astype(np.int64)) > 0
+        self.overlaps = tuple(
+            tuple(m for m in np.flatnonzero(uses_candidates & (shared[k] | unscoped)).tolist() if m != k)
+            for k in range(n)
+        )
+        self.all_constraints = tuple(range(n))
+
+def wake_constraints(board, cell: int) -> None:
+    '''
+    Evaluate the constraints of `board` watching `cell` (all of them if `cell < 0`) with `scoped_candidates`, and apply them by `board.restrict_cells`.
+    When a constraint eliminates something, the overlapping `uses_candidates` constraints are queued again, until nothing changes.
+    The constraints are evaluated in the order of the indices.
+
+    The evaluations and the constraints not evaluated at all are counted in `board.stat_counters`.
+    '''
+    watches = board.watches
+    constraints = board.constraints
+    queue = list(watches.all_constraints if cell < 0 else watches.cell_watchers[cell]) # 有序的，已经是堆
+    queued = set(queue)
+    evaluated = set(queue)
+    evals = 0
+    while queue:
+        k = heappop(queue)
+        queued.discard(k)
+        constraint = constraints[k]
+        evals += 1
+        candidates_board = board.candidates_board if constraint.uses_candidates else None
+        if board.restrict_cells(*constraint.scoped_candidates(board.assigned_board, candidates_board)):
+            for m in watches.overlaps[k]:
+                if m not in queued:
+                    heappush(queue, m)
+                    queued.add(m)
+                    evaluated.add(m)
+    board.stat_counters[CONSTRAINT_EVALS] += evals
+    board.stat_counters[CONSTRAINT_SKIPS] += len(constraints) - len(evaluated)
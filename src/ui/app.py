@@ -1,5 +1,6 @@
 import tkinter as tk
 import numpy as np
+import os
 import threading
 import queue
 import json_tricks as json
@@ -11,6 +12,7 @@ from src.constraints import Constraint
 from src.utils.type_definitions import *
 
 REFRESH_TIME_INTERVAL = 100
+DEAD_TABLE_CAPACITY = 1 << 16
 
 DIGIT_TO_ORD_STR = {n: str(digit2ord(n)) for n in range(1, 10)}
 
@@ -28,6 +30,7 @@ class SudokuUI:
         self.selected_cell = None # 当前选中的格子 (i, j)
         self.always_solve_var = tk.BooleanVar(value=False) # 自动求解模式
         self.display_as_ord = tk.BooleanVar(value=False) # 序数显示模式
+        self.parallel_var = tk.BooleanVar(value=False) # 多进程求解模式
 
         # 当前显示的棋盘
         self.curr_puzzle_board = puzzle_board
@@ -69,6 +72,10 @@ class SudokuUI:
         self.always_solve_cb = tk.Checkbutton(self.control_frame, text="Display as Ordinal", variable=self.display_as_ord)
         self.always_solve_cb.grid(row=0, column=1, padx=5)
 
+        # 多进程求解的按钮
+        self.parallel_cb = tk.Checkbutton(self.control_frame, text="Parallel", variable=self.parallel_var)
+        self.parallel_cb.grid(row=0, column=2, padx=5)
+
         # 修改原来 True Candidates 按钮
         self.solve_button = tk.Button(self.control_frame, text="Solve True Candidates", command=self.start_solver)
         self.solve_button.grid(row=1, column=0, padx=5)
@@ -314,35 +321,44 @@ class SudokuUI:
             self.curr_puzzle_board,
             self.constraints,
             self.out_q,
-            self.stop_event
+            self.stop_event,
+            dead_table_capacity=DEAD_TABLE_CAPACITY
             )
         # s.tuf_board = self.curr_tuf_board.copy()
+        max_workers = (os.cpu_count() or 1) if self.parallel_var.get() else 1
         # 启动求解线程
         self.log("[main]: 启动worker...")
-        solver_thread = threading.Thread(target=self.worker, args=(s,), daemon=True)
+        solver_thread = threading.Thread(target=self.worker, args=(s, max_workers), daemon=True)
         solver_thread.start()
 
-    def worker(self, s: Sudoku):
+    def worker(self, s: Sudoku, max_workers: int = 1):
         self.log("[worker]: worker被调用")
         try:
             for i, constraint in enumerate(s.constraints):
                 if not getattr(constraint, "preprocessed_flag", True):
                     self.log(f"[worker]: 正在预处理 {i}:{type(constraint).__name__}")
                     time_counter = time.perf_counter()
-                    getattr(constraint, "preprocess").__call__()
-                    setattr(constraint, "preprocessed_flag", True)
+                    # 有缓存时直接读表
+                    getattr(constraint, "prepare").__call__()
                     self.log(f"[worker]: {i} 预处理完成. {time.perf_counter()-time_counter:.3f}s")
             self.log("[worker]: 开始求解")
-            Sudoku.reset_counter()
-            s.solve_true_candidates()
+            s.reset_counter()
+            s.solve_true_candidates(max_workers=max_workers)
         except InterruptedError:
             self.log("[worker]: 求解已被中止")
         except Exception as e:
             self.log("[worker]: " + str(e))
         else:
             self.out_q.put(s.tuf_board.copy())
-            sc, ct = Sudoku.get_counter_stat()
-            self.log(f"[worker]: 求解完成. {sc}次 {ct:.3f}s")
+            stats = s.stats.stop()
+            self.log(f"[worker]: 求解完成. {stats.nodes}次 {stats.wall_time:.3f}s (CPU {stats.cpu_time:.3f}s)")
+            self.log(f"[worker]: 回溯{stats.backtracks}次 最大深度{stats.max_depth}")
+            # 并行时各个 worker 的表的计数已经加进 stats
+            if s.dead_table_capacity > 0:
+                self.log(f"[worker]: 无解局面表 命中{stats.dead_hits}次 未命中{stats.dead_misses}次")
+            self.log(f"[worker]: 传播队列 检查{stats.scans}次 省去{stats.scans_avoided}次")
+            if s.constraints:
+                self.log(f"[worker]: 约束 计算{stats.constraint_evals}次 跳过{stats.constraint_skips}次")
         finally:
             self.out_q.put(None)
         
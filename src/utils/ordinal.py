@@ -108,5 +108,6 @@ def print_board_in_ord(board):
         print("--+----+----+----+----+----+----+----+----+----+")
     return
 
-# 导入模块时强行预编译
-_ = digit2ord(6) + Ordinal(np.array([0,2])) * Ordinal(np.array([0,1,2]))
+def warmup_ordinal() -> None:
+    '''Compile the `Ordinal` machinery now, instead of at the first use (see `src.solver.warmup`).'''
+    _ = digit2ord(6) + Ordinal(np.array([0,2])) * Ordinal(np.array([0,1,2]))
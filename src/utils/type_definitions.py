@@ -1,5 +1,5 @@
 '''
-This module provide useful type annotations `NumBoard`, `CandBoard`, `TufBoard`, and `Position`
+This module provide useful type annotations `NumBoard`, `CandBoard`, `TufBoard`, `MaskBoard`, and `Position`
 '''
 
 import numpy as np
@@ -9,4 +9,5 @@ from numpy.typing import NDArray
 NumBoard = Annotated[NDArray[np.int8], (9, 9)]
 CandBoard = Annotated[NDArray[np.bool_], (9, 9, 9)]
 TufBoard = Annotated[NDArray[np.int8], (9, 9, 9)]
+MaskBoard = Annotated[NDArray[np.uint16], (9, 9)]
 Position = Tuple[int|np.intp, int|np.intp]
\ No newline at end of file
@@ -0,0 +1,12 @@
+import pytest
+from src.constraints.cache import PreprocessCache, set_cache
+
+@pytest.fixture(autouse=True, scope="session")
+def preprocess_cache(tmp_path_factory):
+    # 预处理缓存放在临时目录里，不写到 ~/.cache；子进程通过环境变量用同一个目录
+    directory = str(tmp_path_factory.mktemp("preprocess-cache"))
+    old = set_cache(PreprocessCache(directory))
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv("SUDOKU_CACHE_DIR", directory)
+        yield
+    set_cache(old)
@@ -0,0 +1,55 @@
+'''Helpers shared by the tests: reading the puzzles of `tests/test_data`, and the killer sudoku used by several tests.'''
+
+import numpy as np
+import pandas as pd
+from src.solver import Sudoku
+from src.constraints import KillerConstraint
+
+DATA_DIR = "./tests/test_data"
+
+# 两个笼子的杀手数独，答案见 test_killer.test_cand_1
+KILLER_PUZZLE = np.array([
+    [9, 4, 0, 0, 0, 0, 0, 0, 8],
+    [0, 0, 0, 0, 0, 0, 5, 0, 0],
+    [0, 0, 0, 0, 0, 0, 0, 0, 0],
+    [0, 2, 0, 0, 1, 0, 0, 0, 3],
+    [0, 1, 0, 0, 0, 0, 0, 6, 0],
+    [0, 0, 0, 4, 0, 0, 0, 7, 0],
+    [7, 0, 8, 6, 0, 0, 0, 0, 0],
+    [2, 0, 0, 0, 3, 0, 0, 0, 1],
+    [4, 0, 0, 0, 0, 0, 2, 0, 0]
+])
+# (cells, killer_sum)
+KILLER_CAGES = (
+    ([(1,1), (1,2), (1,3), (2,3), (2,4), (2,5)], 26),
+    ([(1,8), (2,8)], 10),
+)
+
+def convert_to_matrix(sudoku_str):
+    '''An 81-character string to a 9x9 int8 array.'''
+    return np.array(list(sudoku_str), dtype=np.int8).reshape(9, 9)
+
+def convert_to_array(sudoku_strs):
+    '''Some 81-character strings to an `(N, 81)` int8 array.'''
+    return np.array([list(s) for s in sudoku_strs], dtype=np.int8).reshape(-1, 81)
+
+def data_path(data_set):
+    return f"{DATA_DIR}/{data_set}.csv"
+
+def load_data(data_set, nrows=None, **kwargs):
+    '''The `DataFrame` of `tests/test_data/{data_set}.csv`. `kwargs` are passed to `pd.read_csv`, e.g. `dtype=str`.'''
+    return pd.read_csv(data_path(data_set), nrows=nrows, **kwargs)
+
+def load_puzzle(data_set, row=0):
+    '''The puzzle on `row` of a data set, as a 9x9 array.'''
+    return convert_to_matrix(load_data(data_set, nrows=row + 1)["puzzle"][row])
+
+def killer_cages(killer_class=KillerConstraint, **kwargs):
+    '''The constraints of `KILLER_CAGES`. `kwargs` are passed to `killer_class`.'''
+    return [killer_class(cells, killer_sum, **kwargs) for cells, killer_sum in KILLER_CAGES]
+
+def killer_true_candidates(**kwargs):
+    '''A `Sudoku` of `KILLER_PUZZLE` with `KILLER_CAGES` and the arguments `kwargs`, after `solve_true_candidates`.'''
+    s = Sudoku(KILLER_PUZZLE, killer_cages(), **kwargs)
+    s.solve_true_candidates()
+    return s
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from src.solver import Sudoku, solve_many, SOLVED, UNSOLVABLE, ABORTED, INVALID
+from tests.helpers import convert_to_array, load_data
+
+@pytest.mark.parametrize("data_set, max_num_rows", [
+    ("easy", 1000),
+    ("mid", 1000),
+    ("hard", 262),
+    ("zbrSuperhard", 300),
+    ("hardest", 100)
+])
+def test_solve_many(data_set, max_num_rows):
+    test_df = load_data(data_set, max_num_rows)
+    puzzles = convert_to_array(test_df["puzzle"])
+
+    solutions, status, node_counts = solve_many(puzzles)
+
+    assert solutions.shape == puzzles.shape
+    assert np.all(status == SOLVED)
+    if "solution" in test_df.columns:
+        assert np.array_equal(solutions, convert_to_array(test_df["solution"]))
+
+    # 与逐个求解的结果一致
+    for k in range(0, len(puzzles), max(1, len(puzzles) // 20)):
+        s = Sudoku(puzzles[k].reshape(9, 9))
+        ret = s.solve_compiled()
+        assert ret is not None
+        assert np.array_equal(ret.assigned_board.reshape(81), solutions[k])
+        assert s.search_counter == node_counts[k]
+
+def test_solve_many_status():
+    puzzles = np.zeros((4, 81), dtype=np.int8)
+    puzzles[1, 0:2] = [5, 5]     # 同一行重复
+    puzzles[2, 0] = 10           # 非法数字
+    puzzles[3] = puzzles[0]
+
+    solutions, status, node_counts = solve_many(puzzles, max_nodes=1)
+    assert status.tolist() == [ABORTED, INVALID, INVALID, ABORTED]
+    assert np.all(solutions == 0)
+
+    solutions, status, node_counts = solve_many(puzzles[[0]].reshape(1, 9, 9))
+    assert status.tolist() == [SOLVED]
+    assert np.all(np.sort(solutions.reshape(9, 9), axis=1) == np.arange(1, 10))
+
+@pytest.mark.parametrize("data_set, max_num_rows", [
+    ("easy", 1000),
+    ("mid", 1000),
+    ("zbrSuperhard", 200)
+])
+def test_solve_many_parallel(data_set, max_num_rows):
+    test_df = load_data(data_set, max_num_rows)
+    puzzles = convert_to_array(test_df["puzzle"])
+
+    solutions, status, node_counts = solve_many(puzzles)
+    psolutions, pstatus, pnode_counts = solve_many(puzzles, parallel=True)
+    assert np.array_equal(solutions, psolutions)
+    assert np.array_equal(status, pstatus)
+    assert np.array_equal(node_counts, pnode_counts)
+
+    psolutions, pstatus, pnode_counts = solve_many(puzzles, parallel=True, num_threads=2)
+    assert np.array_equal(solutions, psolutions)
+
+def test_threads_do_not_share_state():
+    test_df = load_data("mid", 40)
+    puzzles = convert_to_array(test_df["puzzle"]).reshape(-1, 9, 9)
+
+    def run(puzzle):
+        s = Sudoku(puzzle)
+        ret = s.solve()
+        assert ret is not None
+        return ret.assigned_board.reshape(81), s.search_counter
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(run, puzzles))
+
+    solutions, _, node_counts = solve_many(puzzles)
+    for k, (solution, search_count) in enumerate(results):
+        assert np.array_equal(solution, solutions[k])
+        assert search_count == node_counts[k]
@@ -0,0 +1,71 @@
+import copy
+import json
+import pytest
+from src.bench import run_benchmark, compare, main, measure_startup, check_startup, STARTUP_METRICS, IMPORT_BUDGET_S
+from src.solver import warmup
+
+def test_run_benchmark():
+    report = run_benchmark(["easy", "hardest"], ["solve", "compiled"], rows=5, repeat=2)
+    assert set(report["results"]) == {"solve/easy", "compiled/easy", "solve/hardest", "compiled/hardest"}
+    for result in report["results"].values():
+        assert result["puzzles"] == 5
+        assert result["unsolved"] == 0
+        latency = result["latency_ms"]
+        assert 0 < latency["p50"] <= latency["p90"] <= latency["p99"] <= latency["max"]
+        assert result["puzzles_per_second"] > 0
+    # 两种搜索的节点数一致
+    assert report["results"]["solve/easy"]["nodes"] == report["results"]["compiled/easy"]["nodes"]
+
+    assert compare(report, report) == []
+    baseline = copy.deepcopy(report)
+    baseline["results"]["solve/hardest"]["latency_ms"]["p90"] /= 2
+    baseline["results"]["compiled/easy"]["nodes"]["mean"] /= 2
+    del baseline["results"]["solve/easy"]
+    regressions = compare(report, baseline, threshold=0.1)
+    assert len(regressions) == 2
+    assert regressions[0].startswith("compiled/easy nodes.mean")
+    assert regressions[1].startswith("solve/hardest latency_ms.p90")
+
+def test_compare_zero_baseline():
+    result = {"unsolved": 0, "latency_ms": {"p50": 1.0, "p90": 1.0, "p99": 1.0}, "nodes": {"mean": 0.0}}
+    baseline = {"results": {"solve/easy": result}}
+    # 只靠传播就解完的数据集 nodes.mean 是 0，不能除以 0
+    assert compare({"results": {"solve/easy": result}}, baseline) == []
+    report = {"results": {"solve/easy": copy.deepcopy(result)}}
+    report["results"]["solve/easy"]["nodes"]["mean"] = 2.5
+    assert compare(report, baseline) == ["solve/easy nodes.mean: 0 -> 2.5 (+2.5)"]
+
+def test_main(tmp_path):
+    output = tmp_path / "bench.json"
+    assert main(["mid", "--rows", "3", "--repeat", "1", "--solvers", "bitmask", "--output", str(output)]) == 0
+    report = json.loads(output.read_text())
+    assert list(report["results"]) == ["bitmask/mid"]
+
+    report["results"]["bitmask/mid"]["unsolved"] = -1
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text(json.dumps(report))
+    assert main(["mid", "--rows", "3", "--repeat", "1", "--solvers", "bitmask", "--baseline", str(baseline), "--threshold", "100"]) == 1
+
+def test_startup():
+    startup = measure_startup(repeat=1)
+    assert all(startup[metric] > 0 for metric in STARTUP_METRICS)
+    # import src.solver 不加载 pandas、tkinter 等，也不超过时间上限
+    assert startup["heavy_modules"] == []
+    assert check_startup(startup) == []
+    violations = check_startup(dict(startup, import_s=IMPORT_BUDGET_S * 2, heavy_modules=["pandas"]))
+    assert len(violations) == 2 and violations[1].endswith("pandas")
+
+    report = {"results": {}, "startup": startup}
+    baseline = {"results": {}, "startup": dict(startup, import_s=startup["import_s"] / 2)}
+    regressions = compare(report, baseline, threshold=0.1)
+    assert len(regressions) == 1 and regressions[0].startswith("startup import_s")
+    # 没有 startup 的基线不比较
+    assert compare(report, {"results": {}}) == []
+
+def test_warmup():
+    times = warmup(("boards", "compiled", "constraints"))
+    assert list(times) == ["boards", "compiled", "constraints"]
+    # 已经编译过了，再来一次很快
+    assert sum(warmup(("boards", "compiled")).values()) < 1
+    with pytest.raises(ValueError):
+        warmup(("unknown",))
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+from src.solver import Sudoku, has_conflict
+from src.solver.bitboard import pack_candidates, unpack_candidates
+from src.utils.type_definitions import *
+from tests.helpers import convert_to_matrix, load_data, killer_true_candidates
+
+def test_pack_unpack():
+    rng = np.random.default_rng(0)
+    cand_board = rng.random((9, 9, 9)) > 0.5
+    cand_mask = pack_candidates(cand_board)
+    assert cand_mask.dtype == np.uint16
+    assert np.array_equal(unpack_candidates(cand_mask), cand_board)
+
+@pytest.mark.parametrize("data_set, max_num_rows", [
+    ("mid", 50),
+    ("hard", 50),
+    ("hardest", 20)
+])
+def test_same_as_bool_board(data_set, max_num_rows):
+    test_df = load_data(data_set, max_num_rows)
+    for puzzle_str in test_df["puzzle"]:
+        puzzle = convert_to_matrix(puzzle_str)
+
+        s = Sudoku(puzzle)
+        ret = s.solve()
+        search_count, _ = s.get_counter_stat()
+
+        bs = Sudoku(puzzle, bitmask=True)
+        bret = bs.solve()
+        bsearch_count, _ = bs.get_counter_stat()
+
+        assert ret is not None and bret is not None
+        assert np.array_equal(ret.assigned_board, bret.assigned_board)
+        # SolvingBoard 的传播队列还会发现某个单元放不下某个数字，剪枝更多
+        assert search_count <= bsearch_count
+
+def test_killer_cand():
+    s = killer_true_candidates()
+    bs = killer_true_candidates(bitmask=True)
+    assert np.array_equal(s.tuf_board, bs.tuf_board)
+
+@pytest.mark.parametrize("data_set, max_num_rows", [
+    ("easy", 100),
+    ("hard", 100),
+    ("zbrSuperhard", 50),
+    ("hardest", 50)
+])
+def test_solve_compiled(data_set, max_num_rows):
+    test_df = load_data(data_set, max_num_rows)
+    has_solution = "solution" in test_df.columns
+    for index in range(len(test_df)):
+        row = test_df.iloc[index]
+        puzzle = convert_to_matrix(row["puzzle"])
+
+        s = Sudoku(puzzle, bitmask=True)
+        ret = s.solve()
+        search_count, _ = s.get_counter_stat()
+
+        cs = Sudoku(puzzle)
+        cret = cs.solve_compiled()
+        csearch_count, _ = cs.get_counter_stat()
+
+        assert ret is not None and cret is not None
+        assert np.array_equal(ret.assigned_board, cret.assigned_board)
+        assert search_count == csearch_count
+        if has_solution:
+            assert np.array_equal(cret.assigned_board, convert_to_matrix(row["solution"]))
+
+def test_solve_compiled_unsolvable():
+    row = load_data("mid", 1).iloc[0]
+    puzzle = convert_to_matrix(row["puzzle"])
+    solution = convert_to_matrix(row["solution"])
+
+    # 填一个与已知数不冲突、但和唯一解不同的数字，这样只能靠搜索发现无解
+    broken = None
+    for i, j in zip(*np.nonzero(puzzle == 0)):
+        for num in range(1, 10):
+            if num != solution[i, j] and not has_conflict(puzzle, (i, j), num):
+                broken = puzzle.copy()
+                broken[i, j] = num
+                break
+        if broken is not None:
+            break
+    assert broken is not None
+
+    assert Sudoku(broken).solve() is None
+    assert Sudoku(broken).solve_compiled() is None
+    assert Sudoku(np.zeros((9, 9), dtype=np.int8)).solve_compiled(max_nodes=1) is None
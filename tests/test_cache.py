@@ -0,0 +1,106 @@
+import os
+import numpy as np
+import pytest
+from src.solver import Sudoku
+from src.constraints import KillerConstraint, SparseKillerConstraint, OrdArrowConstraint, DenseMultiCellConstraint
+from src.constraints.cache import PreprocessCache, set_cache
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = PreprocessCache(str(tmp_path / "cache"))
+    old = set_cache(cache)
+    yield cache
+    set_cache(old)
+
+def forbid_preprocess(constraint_class, monkeypatch):
+    def preprocess(self):
+        raise AssertionError("should be loaded from the cache")
+    monkeypatch.setattr(constraint_class, "preprocess", preprocess)
+
+@pytest.mark.parametrize("constraint_class, attr", [
+    (KillerConstraint, "valid_combinations"),
+    (SparseKillerConstraint, "valid_tuples"),
+])
+def test_killer_cache(cache, monkeypatch, constraint_class, attr):
+    cells = [(1,1), (1,2), (1,3), (2,3), (2,4), (2,5)]
+    first = constraint_class(cells, 26)
+    assert len(cache.entries()) == 1
+    constraint_class(cells, 27)
+    assert len(cache.entries()) == 2
+
+    forbid_preprocess(constraint_class, monkeypatch)
+    second = constraint_class(cells, 26)
+    table = getattr(second, attr)
+    assert np.array_equal(table, getattr(first, attr))
+    assert not table.flags.writeable
+    # 没有预处理也能直接用
+    assert np.array_equal(second.available_candidates(np.zeros((9, 9), dtype=np.int8)),
+                          first.available_candidates(np.zeros((9, 9), dtype=np.int8)))
+
+    lazy = constraint_class(cells, 26, prep_at_init=False)
+    assert not lazy.preprocessed_flag
+    lazy.prepare()
+    assert lazy.preprocessed_flag and np.array_equal(getattr(lazy, attr), getattr(first, attr))
+
+def test_ordarrow_cache(cache, monkeypatch):
+    puzzle = np.zeros((9, 9), dtype=np.int8)
+    puzzle[0, 0] = 9
+    oac = OrdArrowConstraint([(1,1), (1,2)], [(1,3), (2,5)])
+    forbid_preprocess(OrdArrowConstraint, monkeypatch)
+    cached = OrdArrowConstraint([(1,1), (1,2)], [(1,3), (2,5)])
+    assert np.array_equal(cached.valid_combinations, oac.valid_combinations)
+    # 同样的格子，分界不同就是不同的约束
+    with pytest.raises(AssertionError):
+        OrdArrowConstraint([(1,1)], [(1,2), (1,3), (2,5)])
+
+    ret = Sudoku(puzzle, [cached]).solve()
+    assert ret is not None and cached.is_valid(ret.assigned_board)
+
+class Increasing(DenseMultiCellConstraint):
+    def is_valid(self, assigned_board):
+        values = assigned_board[self.rows, self.cols]
+        return bool(np.any(values == 0) or np.all(np.diff(values) > 0))
+
+def test_not_cacheable(cache):
+    Increasing([(0, 0), (1, 1)])
+    assert cache.entries() == []
+
+def test_bad_file(cache):
+    cells = [(0, 0), (0, 1), (0, 2)]
+    kc = KillerConstraint(cells, 10)
+    (_, _, path), = cache.entries()
+    with open(path, "wb") as file:
+        file.write(b"broken")
+    again = KillerConstraint(cells, 10)
+    assert np.array_equal(again.valid_combinations, kc.valid_combinations)
+    # 坏文件被重新写好
+    assert np.array_equal(np.load(path), kc.valid_combinations)
+
+def test_lru_eviction(tmp_path):
+    cache = PreprocessCache(str(tmp_path), max_bytes=3500) # 每个文件 1000 字节加上 .npy 的头
+    tables = {key: np.full(1000, k, dtype=np.int8) for k, key in enumerate("abc")}
+    for t, (key, table) in enumerate(tables.items()):
+        cache.store(key, table)
+        os.utime(cache.path(key), (1000 + t, 1000 + t))
+    assert len(cache.entries()) == 3
+
+    # 用过 a 之后 b 最久没用，写 d 时把 b 删掉
+    assert np.array_equal(cache.load("a"), tables["a"])
+    cache.store("d", np.zeros(1000, dtype=np.int8))
+    assert cache.load("b") is None
+    assert all(cache.load(key) is not None for key in "acd")
+    assert sum(size for _, size, _ in cache.entries()) <= 3500
+
+    # 刚写的文件不删，即使它的修改时间最早
+    cache.max_bytes = 1100
+    os.utime(cache.path("a"), (0, 0))
+    cache.evict(keep=cache.path("a"))
+    assert [path for _, _, path in cache.entries()] == [cache.path("a")]
+    cache.max_bytes = 3500
+
+    # 比 max_bytes 还大的表不写
+    cache.store("big", np.zeros(4000, dtype=np.int8))
+    assert cache.load("big") is None and len(cache.entries()) == 1
+
+    cache.clear()
+    assert cache.entries() == []
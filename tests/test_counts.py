@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+from src.solver import Sudoku
+from src.solver.solvingboard import (
+    COUNTS_SIZE,
+    CONFLICTS,
+    _numba_init_counts,
+)
+from tests.helpers import convert_to_matrix, load_data
+
+def counts_from_scratch(sol):
+    '''Recount `sol.counts` from its boards: assigned cells have no candidates, and count as a place of their number.'''
+    cands = sol.candidates_board.copy()
+    rows, cols = np.nonzero(sol.assigned_board)
+    cands[rows, cols, sol.assigned_board[rows, cols] - 1] = True
+    counts = np.zeros(COUNTS_SIZE, dtype=np.int16)
+    _numba_init_counts(cands, counts)
+    return counts, cands
+
+def assert_counts(sol):
+    expected, cands = counts_from_scratch(sol)
+    # _numba_init_counts 把已填的格子当成只剩一个候选的未填格子，这里只比较未填格子的部分
+    unassigned = sol.assigned_board.reshape(81) == 0
+    assert np.array_equal(sol.counts[1:82][unassigned], expected[1:82][unassigned])
+    assert np.all(sol.counts[1:82][~unassigned] == 0)
+    assert np.array_equal(sol.counts[82:82+243], expected[82:82+243])
+
+    count, pos = sol.get_least_cand_pos()
+    left = np.sum(sol.candidates_board, axis=2)
+    left[sol.assigned_board != 0] = 10
+    if np.all(sol.assigned_board != 0):
+        assert pos is None
+    else:
+        assert pos == np.unravel_index(np.argmin(left), (9, 9))
+        assert count == left.min()
+
+@pytest.mark.parametrize("use_trail", [False, True])
+def test_counts_after_search_steps(use_trail):
+    test_df = load_data("hardest", 10)
+    rng = np.random.default_rng(0)
+    for puzzle_str in test_df["puzzle"]:
+        puzzle = convert_to_matrix(puzzle_str)
+        sol = Sudoku(puzzle, use_trail=use_trail).new_solving_board()
+        assert_counts(sol)
+
+        snapshots = [sol.snapshot()]
+        sol.restore(snapshots[-1])
+        for _ in range(30):
+            _, pos = sol.get_least_cand_pos()
+            if pos is None or sol.counts[CONFLICTS] > 0 or rng.random() < 0.3:
+                # 随机回退几层
+                back = rng.integers(1, len(snapshots) + 1)
+                snapshot = snapshots[-back]
+                del snapshots[len(snapshots) - back + 1:]
+                sol.restore(snapshot)
+            else:
+                sol.settle(pos, rng.choice(sol.get_cands(pos)))
+                sol.quickdrops()
+                snapshots.append(sol.snapshot())
+                # 和 solve_step 一样，快照以后先 restore（不用 trail 时快照不是副本）
+                sol.restore(snapshots[-1])
+            assert_counts(sol)
+
+def test_conflict_count():
+    puzzle = np.zeros((9, 9), dtype=np.int8)
+    sol = Sudoku(puzzle).new_solving_board()
+    assert sol.counts[CONFLICTS] == 0
+
+    # 第 0 行前 8 格填 1-8，再从 (0, 8) 删掉 9
+    for j in range(8):
+        assert sol.settle((0, j), j + 1)
+    cand_board = np.ones((9, 9, 9), dtype=np.bool_)
+    cand_board[0, 8, 8] = False
+    sol.restrict(cand_board)
+    assert sol.counts[CONFLICTS] > 0
+    assert not sol.quickdrops()
@@ -1,22 +1,19 @@
+import pickle
 import numpy as np
 import pytest
-from src.solver import Sudoku
-from src.constraints import KillerConstraint
+from src.solver import Sudoku, parallel
+from src.constraints import Constraint, KillerConstraint, SparseKillerConstraint, DenseMultiCellConstraint, SparseMultiCellConstraint
 from src.utils.type_definitions import *
+from tests.helpers import convert_to_matrix, load_data, KILLER_PUZZLE, KILLER_CAGES, killer_cages
 
-def test_cand_1():
-    puzzle = np.array([
-        [9, 4, 0, 0, 0, 0, 0, 0, 8],
-        [0, 0, 0, 0, 0, 0, 5, 0, 0],
-        [0, 0, 0, 0, 0, 0, 0, 0, 0],
-        [0, 2, 0, 0, 1, 0, 0, 0, 3],
-        [0, 1, 0, 0, 0, 0, 0, 6, 0],
-        [0, 0, 0, 4, 0, 0, 0, 7, 0],
-        [7, 0, 8, 6, 0, 0, 0, 0, 0],
-        [2, 0, 0, 0, 3, 0, 0, 0, 1],
-        [4, 0, 0, 0, 0, 0, 2, 0, 0]
-    ])
-
+@pytest.mark.parametrize("max_workers, use_threads, killer_class", [
+    (1, False, KillerConstraint),
+    (2, False, KillerConstraint),
+    (2, True, KillerConstraint),
+    (1, False, SparseKillerConstraint),
+    (2, True, SparseKillerConstraint)
+])
+def test_cand_1(max_workers, use_threads, killer_class):
     cands = [
         [[9], [4], [2, 5, 6], [1, 2, 3, 5], [5, 6, 7], [2, 3, 5, 6, 7], [3, 7], [1, 2], [8]],
         [[1, 3, 6, 8], [7, 8], [2, 3, 6], [1, 3, 8], [6, 7, 8, 9], [6, 7, 8, 9], [5], [1, 2, 9], [4]],
@@ -29,17 +26,298 @@ def test_cand_1():
         [[4], [6], [1], [5, 8, 9], [5, 8, 9], [5, 8, 9], [2], [3], [7]]
     ]
 
-    pos_list_1 = [(1,1), (1,2), (1,3), (2,3), (2,4), (2,5)]
-    killer_sum_1 = 26
-    kc1 = KillerConstraint(pos_list_1, killer_sum_1)
+    s = Sudoku(KILLER_PUZZLE, killer_cages(killer_class))
+    s.reset_counter()
+    s.solve_true_candidates(max_workers=max_workers, use_threads=use_threads)
+    print(s.get_counter_stat())
+    assert s.print_true_candidates() == cands
+
+@pytest.mark.parametrize("use_threads", [True, False])
+def test_cand_fixed_by_quickdrops(use_threads):
+    # 两个解；(1, 8) 不是已知数，但初始的 quickdrops 已经填上了 5
+    puzzle = np.array([
+        [5, 0, 1, 0, 9, 2, 7, 3, 0],
+        [0, 2, 4, 0, 8, 0, 0, 9, 0],
+        [9, 0, 7, 0, 0, 5, 0, 4, 0],
+        [0, 0, 9, 0, 0, 1, 0, 0, 0],
+        [0, 0, 8, 0, 0, 9, 5, 0, 3],
+        [0, 7, 3, 5, 6, 0, 0, 0, 9],
+        [0, 0, 5, 0, 0, 8, 0, 7, 4],
+        [0, 4, 0, 0, 5, 0, 0, 8, 2],
+        [0, 0, 0, 0, 0, 0, 3, 0, 0]
+    ])
+    cages = [KillerConstraint([(0, 0), (0, 1)], 11), KillerConstraint([(4, 4), (5, 4), (5, 5)], 17)]
+
+    s = Sudoku(puzzle, cages)
+    s.init_settle()
+    init_sol = s.new_solving_board()
+    assert init_sol.quickdrops() and init_sol.assigned_board[1, 8] == 5
+    # 试探已经填上的格子：这个数字是对的
+    assigned_board, _ = parallel.probe(s, init_sol, s.tu_board, (1, 8), 4)
+    assert assigned_board is not None and assigned_board[1, 8] == 5
+
+    serial = Sudoku(puzzle, cages)
+    serial.solve_true_candidates()
+    assert serial.print_true_candidates()[1][8] == [5]
+    s = Sudoku(puzzle, cages)
+    s.solve_true_candidates(max_workers=3, use_threads=use_threads)
+    assert np.array_equal(s.tuf_board, serial.tuf_board)
+
+def test_sparse_combinations():
+    pos_list, killer_sum = KILLER_CAGES[0]
+    dense = KillerConstraint(pos_list, killer_sum)
+    sparse = SparseKillerConstraint(pos_list, killer_sum)
+    # 稀疏表 = 稠密表里同一单元不重复的组合
+    dense_tuples = np.argwhere(dense.valid_combinations) + 1
+    distinct = [all(t[a] != t[b] for a, b in zip(*np.nonzero(sparse.conflicts))) for t in dense_tuples]
+    assert set(map(tuple, dense_tuples[distinct].tolist())) == set(map(tuple, sparse.valid_tuples.tolist()))
+    # 默认的通用生成方法结果一样
+    generic = SparseMultiCellConstraint.generate_combinations(sparse)
+    assert set(map(tuple, generic.tolist())) == set(map(tuple, sparse.valid_tuples.tolist()))
+
+    box = SparseKillerConstraint([(i, j) for i in range(3) for j in range(3)], 45)
+    assert box.valid_tuples.shape == (362880, 9)
+
+def test_sparse_gac():
+    kc = SparseKillerConstraint([(0,0), (0,1), (0,2)], 7) # {1,2,4}
+    board = np.zeros((9, 9), dtype=np.int8)
+    cand_board = kc.available_candidates(board)
+    assert [np.flatnonzero(cand_board[0, j]).tolist() for j in range(3)] == [[0, 1, 3]] * 3
+    assert cand_board[1:].all() and cand_board[0, 3:].all()
+
+    # 只看已填的数时删不掉，结合当前候选数才能删
+    candidates_board = np.ones((9, 9, 9), dtype=np.bool_)
+    candidates_board[0, 0] = False
+    candidates_board[0, 0, [0, 1]] = True # {1,2}
+    candidates_board[0, 1] = False
+    candidates_board[0, 1, [0, 1]] = True # {1,2}
+    cand_board = kc.available_candidates_in(board, candidates_board)
+    assert [np.flatnonzero(cand_board[0, j]).tolist() for j in range(3)] == [[0, 1], [0, 1], [3]]
+
+    board[0, 0] = 4
+    cand_board = kc.available_candidates_in(board, candidates_board)
+    assert cand_board[0, 0].all()
+    assert [np.flatnonzero(cand_board[0, j]).tolist() for j in (1, 2)] == [[0, 1], [0, 1]]
+
+    # 没有组合支持，未填的格子都没有候选数了
+    candidates_board[0, 1] = False
+    candidates_board[0, 1, 3] = True # {4}
+    cand_board = kc.available_candidates_in(board, candidates_board)
+    assert not cand_board[0, 1].any() and not cand_board[0, 2].any()
+
+@pytest.mark.parametrize("bitmask", [False, True])
+def test_sparse_large_cage(bitmask):
+    test_df = load_data("hard", 3)
+    for puzzle_str, solution_str in zip(test_df["puzzle"], test_df["solution"]):
+        puzzle = convert_to_matrix(puzzle_str)
+        solution = convert_to_matrix(solution_str)
+        # 按答案设一个 9 格的笼子，跨 3 个宫
+        cells = [(4, j) for j in range(4)] + [(5, j) for j in range(5)]
+        kc = SparseKillerConstraint(cells, int(sum(solution[i, j] for i, j in cells)))
+        ret = Sudoku(puzzle, [kc], bitmask=bitmask).solve()
+        assert np.array_equal(ret.assigned_board, solution)
+
+class DenseIncreasing(DenseMultiCellConstraint):
+    def is_valid(self, assigned_board):
+        values = assigned_board[self.rows, self.cols]
+        return bool(np.any(values == 0) or np.all(np.diff(values) > 0))
+
+class SparseIncreasing(SparseMultiCellConstraint):
+    def is_valid(self, assigned_board):
+        values = assigned_board[self.rows, self.cols]
+        return bool(np.any(values == 0) or np.all(np.diff(values) > 0))
+
+class PrunedSparseIncreasing(SparseIncreasing):
+    def __init__(self, ls):
+        self.complete_count = 0
+        super().__init__(ls)
+
+    def is_valid(self, assigned_board):
+        self.complete_count += 1
+        return super().is_valid(assigned_board)
+
+    def is_prefix_valid(self, values):
+        return len(values) < 2 or values[-1] > values[-2]
+
+def test_sparse_prefix_pruning():
+    cells = [(1, 0), (2, 1), (3, 2), (4, 3)]
+    pruned = PrunedSparseIncreasing(cells)
+    plain = SparseIncreasing(cells)
+    assert np.array_equal(pruned.valid_tuples, plain.valid_tuples)
+    # 只有递增的前缀会走到底
+    assert pruned.complete_count == len(pruned.valid_tuples) == 126
+
+def test_sparse_subclass():
+    puzzle = np.zeros((9, 9), dtype=np.int8)
+    puzzle[0, :4] = [9, 4, 2, 8]
+    puzzle[4, 4] = 5
+    cells = [(1, 0), (2, 1), (3, 2), (4, 3)]
+    tuf_boards = []
+    for constraint_class in (DenseIncreasing, SparseIncreasing):
+        s = Sudoku(puzzle, [constraint_class(cells)])
+        s.solve_true_candidates()
+        tuf_boards.append(s.tuf_board)
+    assert np.array_equal(tuf_boards[0], tuf_boards[1])
+
+class FullBoardKiller(Constraint):
+    '''Only `available_candidates` on the full board, `scoped_candidates` is the default of `Constraint`.'''
+    def __init__(self, ls, killer_sum):
+        self.inner = KillerConstraint(ls, killer_sum)
+
+    def is_valid(self, assigned_board):
+        return self.inner.is_valid(assigned_board)
+
+    def available_candidates(self, assigned_board):
+        return self.inner.available_candidates(assigned_board)
+
+def test_scoped_candidates():
+    cells = [(1,1), (1,2), (1,3), (2,3), (2,4), (2,5)]
+    board = np.zeros((9, 9), dtype=np.int8)
+    board[1, 1] = 9
+    candidates_board = np.ones((9, 9, 9), dtype=np.bool_)
+    candidates_board[1, 1] = False
+    for kc in (KillerConstraint(cells, 26), SparseKillerConstraint(cells, 26), FullBoardKiller(cells, 26)):
+        expected = kc.available_candidates_in(board, candidates_board)
+        positions, masks = kc.scoped_candidates(board, candidates_board)
+        assert positions.dtype == np.intp and masks.dtype == np.uint16
+        # 只报告约束里的格子
+        assert set(map(tuple, positions.tolist())) <= set(cells)
+        cand_board = np.ones((9, 9, 9), dtype=np.bool_)
+        for (i, j), m in zip(positions.tolist(), masks.tolist()):
+            cand_board[i, j] &= (m >> np.arange(9)) & 1 == 1
+        assert np.array_equal(cand_board, expected)
+
+@pytest.mark.parametrize("bitmask", [False, True])
+def test_scoped_default_protocol(bitmask):
+    puzzle = np.zeros((9, 9), dtype=np.int8)
+    puzzle[0, :4] = [9, 4, 2, 8]
+    puzzle[4, 4] = 5
+    cells = [(1, 0), (2, 1), (1, 1)]
+    tuf_boards = []
+    for kc in (KillerConstraint(cells, 8), FullBoardKiller(cells, 8)):
+        s = Sudoku(puzzle, [kc], bitmask=bitmask)
+        s.solve_true_candidates()
+        tuf_boards.append(s.tuf_board)
+    assert np.array_equal(tuf_boards[0], tuf_boards[1])
+
+@pytest.mark.parametrize("killer_class", [KillerConstraint, SparseKillerConstraint])
+def test_compiled_search(killer_class):
+    from src.solver.propagator import compile_constraints
+    test_df = load_data("hard", 3)
+    for puzzle_str, solution_str in zip(test_df["puzzle"], test_df["solution"]):
+        puzzle = convert_to_matrix(puzzle_str)
+        solution = convert_to_matrix(solution_str)
+        # 去掉一半的已知数，换成笼子
+        puzzle[:, ::2] = 0
+        cages = [killer_class([(i, j), (i, j + 1)], int(solution[i, j] + solution[i, j + 1]))
+                 for i in range(9) for j in range(0, 8, 2)]
+        s = Sudoku(puzzle, cages)
+        ret = s.solve_compiled()
+        # 程序只生成一次，约束换了才重新生成
+        program = s.compile_constraints()
+        assert s.compile_constraints() is program
+        assert all(cage.is_valid(ret.assigned_board) for cage in cages)
+        assert np.all(np.sort(ret.assigned_board, axis=1) == np.arange(1, 10))
+        assert np.all((puzzle == 0) | (puzzle == ret.assigned_board))
+        assert s.stats.constraint_evals > 0
+        # 和 Python 的搜索找到的解一样多
+        count, solutions = s.count_solutions(limit=1000)
+        assert count < 1000 and any(np.array_equal(board, solution) for board in solutions)
+        assert count == sum(1 for _ in Sudoku(puzzle, cages, bitmask=True).iter_solutions())
+        assert s.compile_constraints() is program
+        s.constraints = cages[:-1]
+        assert s.compile_constraints() is not program
+
+    # 用户的 DenseMultiCellConstraint 子类也能按表编译
+    cells = [(1, 0), (2, 1), (3, 2), (4, 3)]
+    cell_start, flat_cells, tuple_start, tuples = compile_constraints([DenseIncreasing(cells), SparseIncreasing(cells)])
+    assert cell_start.tolist() == [0, 4, 8] and flat_cells.tolist() == [9, 19, 29, 39] * 2
+    dense_table = tuples[:tuple_start[1]].reshape(-1, 4)
+    sparse_table = tuples[tuple_start[1]:].reshape(-1, 4)
+    assert set(map(tuple, dense_table.tolist())) == set(map(tuple, sparse_table.tolist()))
+    assert np.all(np.diff(dense_table, axis=1) > 0)
+
+def test_compiled_unsupported():
+    puzzle = np.zeros((9, 9), dtype=np.int8)
+    s = Sudoku(puzzle, [FullBoardKiller([(0, 0), (0, 1)], 3)])
+    with pytest.raises(NotImplementedError):
+        s.solve_compiled()
+    # 退回 Python 的搜索
+    count, solutions = s.count_solutions(limit=2)
+    assert count == 2 and set(solutions[:, 0, :2].ravel().tolist()) == {1, 2}
+
+    # 给的数和约束矛盾
+    puzzle[0, 0] = 3
+    assert Sudoku(puzzle, [KillerConstraint([(0, 0), (0, 1)], 3)]).solve_compiled() is None
+
+@pytest.mark.parametrize("cells", [
+    [(0,0), (0,1), (1,0), (1,1)],                  # 同一宫，选数字集合再排列
+    [(1,1), (1,2), (1,3), (2,3), (2,4), (2,5)],    # 不全在同一单元，深度优先搜索
+])
+def test_killer_combinations(cells):
+    from itertools import product
+    from src.constraints.killer import killer_combinations
+    from src.constraints.constraint import unit_conflicts
+    rows, cols = np.array(cells).T
+    conflicts = unit_conflicts(rows, cols)
+    for killer_sum in range(len(cells), 9 * len(cells) + 1):
+        combos = killer_combinations(conflicts, killer_sum)
+        expected = {combo for combo in product(range(1, 10), repeat=len(cells))
+                    if sum(combo) == killer_sum and all(combo[a] != combo[b] for a, b in zip(*np.nonzero(conflicts)))}
+        assert len(combos) == len(expected)
+        assert set(map(tuple, combos.tolist())) == expected
+
+    kc = KillerConstraint(cells, 20)
+    combos = killer_combinations(conflicts, 20)
+    assert np.count_nonzero(kc.valid_combinations) == len(combos)
+    assert kc.valid_combinations[tuple(combos.T - 1)].all()
+
+def test_candidate_cache():
+    tuf_boards = []
+    constraints = []
+    for capacity in (0, 16, 4096):
+        kc, kc2 = killer_cages(candidate_cache_capacity=capacity)
+        s = Sudoku(KILLER_PUZZLE, [kc, kc2])
+        s.solve_true_candidates()
+        tuf_boards.append(s.tuf_board)
+        constraints.append(kc)
+    assert np.array_equal(tuf_boards[0], tuf_boards[1]) and np.array_equal(tuf_boards[0], tuf_boards[2])
+
+    uncached, small, large = (kc.candidate_cache for kc in constraints)
+    assert len(uncached) == 0 and uncached.hits == 0
+    assert len(small) <= 16
+    assert large.hits > 0 and large.hit_rate >= small.hit_rate
+    # 每项只存 6 个格子的掩码
+    assert large.nbytes == len(large) * 6 * 2
+
+    # 同样的数字放在不同的格子里是不同的键
+    kc = KillerConstraint([(0, 0), (0, 1), (0, 2)], 10)
+    board = np.zeros((9, 9), dtype=np.int8)
+    board[0, :2] = [1, 2]
+    first = kc.available_candidates(board)
+    board[0, :2] = [2, 1]
+    assert np.array_equal(kc.available_candidates(board), first)
+    assert kc.candidate_cache.misses == 2 and kc.candidate_cache.hits == 0
+    assert np.array_equal(kc.available_candidates(board), first)
+    assert kc.candidate_cache.hits == 1
+    assert np.flatnonzero(first[0, 2]).tolist() == [6]
+    assert np.array_equal(kc.valuetuple_to_candboard((2, 1, 0)), first)
 
-    pos_list_2 = [(1,8), (2,8)]
-    killer_sum_2 = 10
-    kc2 = KillerConstraint(pos_list_2, killer_sum_2)
+@pytest.mark.parametrize("dumps, loads", [
+    (pickle.dumps, pickle.loads),
+    (lambda obj: pytest.importorskip("json_tricks").dumps(obj), lambda text: pytest.importorskip("json_tricks").loads(text)),
+])
+def test_candidate_cache_not_saved(dumps, loads):
+    # 保存的文件（界面用 json_tricks）不带缓存的内容，读回来缓存照样能用
+    kc = KillerConstraint([(0, 0), (0, 1), (0, 2)], 10)
+    board = np.zeros((9, 9), dtype=np.int8)
+    board[0, 0] = 1
+    first = kc.available_candidates(board)
+    assert len(kc.candidate_cache) == 1
 
-    Sudoku.reset_counter()
-    s = Sudoku(puzzle, [kc1, kc2])
-    Sudoku.reset_counter()
-    s.solve_true_candidates()
-    print(Sudoku.get_counter_stat())
-    assert s.print_true_candidates() == cands
\ No newline at end of file
+    loaded = loads(dumps(kc))
+    cache = loaded.candidate_cache
+    assert len(cache) == 0 and cache.misses == 0 and cache.capacity == kc.candidate_cache.capacity
+    assert np.array_equal(loaded.available_candidates(board), first)
+    assert np.array_equal(loaded.available_candidates(board), first)
+    assert cache.misses == 1 and cache.hits == 1
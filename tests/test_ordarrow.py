@@ -33,11 +33,10 @@ def test_cand_1():
     prod_pos_list = [(1,4), (2,5)]
     oac = OrdArrowConstraint(sum_pos_list, prod_pos_list)
 
-    Sudoku.reset_counter()
     s = Sudoku(puzzle, [oac])
-    Sudoku.reset_counter()
+    s.reset_counter()
     s.solve_true_candidates()
-    print(Sudoku.get_counter_stat())
+    print(s.get_counter_stat())
     assert s.print_true_candidates() == cands
 
 def test_cand_2():
@@ -69,9 +68,17 @@ def test_cand_2():
     prod_pos_list = [(1,5)]
     oac = OrdArrowConstraint(sum_pos_list, prod_pos_list)
 
-    Sudoku.reset_counter()
     s = Sudoku(puzzle, [oac])
-    Sudoku.reset_counter()
+    s.reset_counter()
     s.solve_true_candidates()
-    print(Sudoku.get_counter_stat())
-    assert s.print_true_candidates() == cands
\ No newline at end of file
+    print(s.get_counter_stat())
+    assert s.print_true_candidates() == cands
+def test_candidate_cache_capacity():
+    oac = OrdArrowConstraint([(0, 0), (0, 1)], [(0, 2)], candidate_cache_capacity=2)
+    assert oac.candidate_cache.capacity == 2
+    board = np.zeros((9, 9), dtype=np.int8)
+    for num in (1, 2, 3):
+        board[0, 0] = num
+        oac.available_candidates(board)
+    assert len(oac.candidate_cache) == 2
+    assert OrdArrowConstraint([(0, 0)], [(0, 1)], candidate_cache_capacity=0).candidate_cache.capacity == 0
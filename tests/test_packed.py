@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.packed import BYTES, NIBBLES, csv_to_packed, packed_to_csv, load_packed, write_packed, read_header, solve_packed, main
+from src.solver import solve_many, SOLVED, INVALID
+from tests.helpers import convert_to_array, data_path, load_data
+
+def _read_column(path, column="puzzle"):
+    '''A column of a CSV written by the CLI, as an `(N, 81)` array.'''
+    return convert_to_array(pd.read_csv(path, dtype=str)[column])
+
+@pytest.mark.parametrize("layout", [BYTES, NIBBLES])
+def test_round_trip(tmp_path, layout):
+    packed_path = tmp_path / "easy.sdk"
+    assert csv_to_packed(data_path("easy"), packed_path, layout, chunk_size=300) == 1000
+    assert read_header(packed_path) == (layout, 1000)
+    assert packed_path.stat().st_size == 16 + 1000 * (81 if layout == BYTES else 41)
+
+    puzzles = load_packed(packed_path)
+    assert np.array_equal(puzzles, convert_to_array(load_data("easy", dtype=str)["puzzle"]))
+    if layout == BYTES:
+        # 直接映射，没有复制
+        assert isinstance(puzzles, np.memmap) and not puzzles.flags.writeable
+
+    csv_path = tmp_path / "easy.csv"
+    assert packed_to_csv(packed_path, csv_path, chunk_size=300) == 1000
+    assert list(pd.read_csv(csv_path, dtype=str)["puzzle"]) == list(load_data("easy", dtype=str)["puzzle"])
+
+def test_write_packed(tmp_path):
+    puzzles = convert_to_array(load_data("hard", 5, dtype=str)["puzzle"]).reshape(-1, 9, 9)
+    for layout in (BYTES, NIBBLES):
+        write_packed(tmp_path / "hard.sdk", puzzles, layout)
+        assert np.array_equal(load_packed(tmp_path / "hard.sdk"), puzzles.reshape(-1, 81))
+    write_packed(tmp_path / "empty.sdk", np.zeros((0, 81), dtype=np.int8))
+    assert load_packed(tmp_path / "empty.sdk").shape == (0, 81)
+    (tmp_path / "bad.sdk").write_bytes(b"not a packed file")
+    with pytest.raises(ValueError):
+        load_packed(tmp_path / "bad.sdk")
+
+@pytest.mark.parametrize("layout", [BYTES, NIBBLES])
+def test_solve_packed(tmp_path, layout):
+    puzzles = convert_to_array(load_data("hard", 30, dtype=str)["puzzle"])
+    puzzles[7, 0] = 12 # INVALID
+    write_packed(tmp_path / "in.sdk", puzzles, layout)
+    status = solve_packed(tmp_path / "in.sdk", tmp_path / "out.sdk", chunk_size=8)
+
+    expected_solutions, expected_status, _ = solve_many(puzzles)
+    assert np.array_equal(status, expected_status)
+    assert status[7] == INVALID and np.sum(status == SOLVED) == 29
+    assert read_header(tmp_path / "out.sdk") == (layout, 30)
+    assert np.array_equal(load_packed(tmp_path / "out.sdk"), expected_solutions)
+
+def test_solve_many_out():
+    puzzles = convert_to_array(load_data("hard", 10, dtype=str)["puzzle"])
+    out = np.full((12, 81), 5, dtype=np.int8)
+    puzzles[3, :] = 0
+    puzzles[3, :2] = 1 # UNSOLVABLE，这一行要清零
+    solutions, status, _ = solve_many(puzzles, out=out[1:11])
+    assert np.shares_memory(solutions, out)
+    assert np.array_equal(out[1:11], solve_many(puzzles)[0])
+    assert not out[4].any() and (out[0] == 5).all() and (out[11] == 5).all()
+    with pytest.raises(ValueError):
+        solve_many(puzzles, out=np.zeros((10, 81), dtype=np.int16))
+    with pytest.raises(ValueError):
+        solve_many(puzzles, out=np.zeros((10, 162), dtype=np.int8)[:, ::2])
+
+def test_main(tmp_path):
+    packed_path = str(tmp_path / "hardest.sdk")
+    assert main(["pack", data_path("hardest"), packed_path, "--nibbles"]) == 0
+    assert main(["solve", packed_path, str(tmp_path / "solutions.sdk"), "--parallel"]) == 0
+    assert main(["unpack", str(tmp_path / "solutions.sdk"), str(tmp_path / "solutions.csv"), "--column", "solution"]) == 0
+    assert np.array_equal(_read_column(tmp_path / "solutions.csv", "solution"), solve_many(convert_to_array(load_data("hardest", dtype=str)["puzzle"]))[0])
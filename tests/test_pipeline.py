@@ -0,0 +1,51 @@
+import io
+import pandas as pd
+from src.pipeline import solve_stream, iter_chunks, main
+from tests.helpers import load_data
+
+def test_solve_stream():
+    test_df = load_data("easy", 20, dtype=str)
+    lines = ["puzzle,solution\n"]
+    for k, (puzzle, solution) in enumerate(zip(test_df["puzzle"], test_df["solution"])):
+        if k == 3:
+            lines.append("123\n") # 长度不对
+            lines.append("\n")
+        if k == 5:
+            puzzle = puzzle.replace("0", ".")
+        lines.append(f"{puzzle},{solution}\n")
+
+    out = io.StringIO()
+    log = io.StringIO()
+    counts = solve_stream(lines, out, chunk_size=4, report_interval=0, log=log)
+    assert counts["total"] == 21
+    assert counts["solved"] == 20 and counts["invalid"] == 1
+    assert "done: 21 puzzles" in log.getvalue()
+
+    rows = out.getvalue().splitlines()
+    assert rows[0] == "puzzle,solution,status"
+    assert rows[4] == "123,,invalid"
+    # 顺序和输入一致
+    del rows[4]
+    for row, solution in zip(rows[1:], test_df["solution"]):
+        assert row.split(",")[1:] == [solution, "solved"]
+    assert rows[6].startswith(test_df["puzzle"][5].replace("0", ".") + ",")
+
+def test_iter_chunks_blank_lines():
+    p1, p2 = "1" * 81 + "\n", "2" * 81 + "\n"
+    # 连续的空行不少于 chunk_size 行，后面的谜题也不能丢
+    assert list(iter_chunks(["puzzle\n", p1, "\n", "\n", p2], 2)) == [[p1], [p2]]
+    assert list(iter_chunks(["\n"] * 5 + ["puzzle\n", p1, p2], 2)) == [[p1, p2]]
+    assert list(iter_chunks([p1, "\n", "\n", "\n", p2, p1], 3)) == [[p1], [p2, p1]]
+
+def test_main(tmp_path):
+    test_df = load_data("hardest", 10, dtype=str)
+    input_path = tmp_path / "in.csv"
+    input_path.write_text("\n".join(test_df["puzzle"]) + "\n")
+    output_path = tmp_path / "out.csv"
+    assert main([str(input_path), "-o", str(output_path), "--chunk-size", "3", "--max-nodes", "5", "--quiet"]) == 0
+
+    out_df = pd.read_csv(output_path, dtype=str, keep_default_na=False)
+    assert list(out_df["puzzle"]) == list(test_df["puzzle"])
+    assert set(out_df["status"]) <= {"solved", "aborted"}
+    assert "aborted" in set(out_df["status"])
+    assert all((out_df["solution"] == "") == (out_df["status"] != "solved"))
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from src.solver import Sudoku
+from src.solver.solvingboard import SolvingBoard, QUEUE_FLAGS_START, QUEUE_RING_START
+from tests.helpers import convert_to_matrix, load_data, load_puzzle
+
+@pytest.mark.parametrize("data_set, max_num_rows", [
+    ("mid", 50),
+    ("hardest", 20)
+])
+def test_same_fixpoint_as_full_scan(data_set, max_num_rows):
+    '''Only checking the dirty units should reach the same state as the full scanners.'''
+    test_df = load_data(data_set, max_num_rows)
+    for puzzle_str in test_df["puzzle"]:
+        puzzle = convert_to_matrix(puzzle_str)
+        for use_trail in (False, True):
+            sol = Sudoku(puzzle, use_trail=use_trail).new_solving_board()
+            bsol = Sudoku(puzzle, bitmask=True).new_solving_board()
+            assert sol.quickdrops() == bsol.quickdrops()
+            assert np.array_equal(sol.assigned_board, bsol.assigned_board)
+            assert np.array_equal(sol.candidates_board, bsol.candidates_board)
+            assert sol.zobrist == bsol.zobrist
+
+def test_scan_counter():
+    puzzle = load_puzzle("hardest")
+    s = Sudoku(puzzle)
+    assert s.solve() is not None
+    assert s.stats.scans > 0
+    assert s.stats.scans_avoided > s.stats.scans
+
+    s.reset_counter()
+    assert s.stats.scans == 0 and s.stats.scans_avoided == 0
+
+def test_restore_clears_queue():
+    puzzle = load_puzzle("hardest")
+    sol = Sudoku(puzzle, use_trail=True).new_solving_board()
+    assert sol.quickdrops()
+    snapshot = sol.snapshot()
+
+    _, pos = sol.get_least_cand_pos()
+    sol.settle(pos, sol.get_cands(pos)[0])
+    assert sol.queue[1] > 0
+
+    sol.restore(snapshot)
+    assert sol.queue[1] == 0
+    assert not np.any(sol.queue[QUEUE_FLAGS_START:QUEUE_RING_START])
+
+def test_unit_without_place():
+    '''Row 0 has no place left for 9, although every cell still has a candidate.'''
+    cands = np.ones((9, 9, 9), dtype=np.bool_)
+    cands[0, :, 8] = False
+    sol = SolvingBoard(np.zeros((9, 9), dtype=np.int8), cands)
+    assert not sol.quickdrops()
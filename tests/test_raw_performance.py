@@ -1,14 +1,11 @@
 import numpy as np
-import pandas as pd
 import sys
 import pytest
 from src.solver import Sudoku
+from tests.helpers import convert_to_matrix, load_data
 
 
-def convert_to_matrix(sudoku_str):
-    """使用 numpy 将 81 位数独字符串转换为 9x9 numpy 数组"""
-    return np.array(list(sudoku_str), dtype=np.int8).reshape(9, 9)
-
+@pytest.mark.parametrize("bitmask", [False, True])
 @pytest.mark.parametrize("data_set, max_num_rows", [
     ("easy", 500),
     ("mid", 500),
@@ -16,9 +13,9 @@ def convert_to_matrix(sudoku_str):
     ("zbrSuperhard", 200),
     ("hardest", 100)
 ])
-def test_performance(data_set, max_num_rows):
+def test_performance(data_set, max_num_rows, bitmask):
     # 读取数独数据
-    test_df = pd.read_csv(f"./tests/test_data/{data_set}.csv", nrows=max_num_rows)
+    test_df = load_data(data_set, max_num_rows)
 
     # 将 puzzle 和 solution 列转换为 9×9 矩阵
     test_df["puzzle_matrix"] = test_df["puzzle"].apply(convert_to_matrix) # type: ignore
@@ -44,10 +41,10 @@ def test_performance(data_set, max_num_rows):
         row = test_df.iloc[index]
         puzzle = row["puzzle_matrix"]
 
-        s = Sudoku(puzzle)
-        Sudoku.reset_counter()
+        s = Sudoku(puzzle, bitmask=bitmask)
+        s.reset_counter()
         ret = s.solve()
-        c_count, c_time = Sudoku.get_counter_stat()
+        c_count, c_time = s.get_counter_stat()
         t_count += c_count
         t_time += c_time
 
@@ -0,0 +1,138 @@
+import json
+import numpy as np
+import pytest
+from src.solver import Sudoku, SolveStats, solve_many
+from src.solver.solvingboard import SolvingBoard
+from src.solver.bitboard import BitSolvingBoard
+from src.solver.profiler import SCANNER_PHASES
+from tests.helpers import convert_to_matrix, convert_to_array, load_data, load_puzzle, KILLER_PUZZLE, killer_cages
+
+@pytest.mark.parametrize("data_set, max_num_rows", [
+    ("hard", 20),
+    ("hardest", 10)
+])
+def test_compiled_same_as_solve_step(data_set, max_num_rows):
+    '''`_numba_dfs` counts the same way as `Sudoku.solve_step` with `BitSolvingBoard`.'''
+    test_df = load_data(data_set, max_num_rows)
+    for puzzle_str in test_df["puzzle"]:
+        puzzle = convert_to_matrix(puzzle_str)
+        ret, stats = Sudoku(puzzle, bitmask=True).solve(with_stats=True)
+        cret, cstats = Sudoku(puzzle).solve_compiled(with_stats=True)
+        assert ret is not None and cret is not None
+
+        d = stats.to_dict()
+        cd = cstats.to_dict()
+        for key in ("nodes", "settles", "backtracks", "max_depth", "placements", "depth_histogram"):
+            assert d[key] == cd[key]
+        assert sum(stats.depth_histogram) == stats.nodes
+        # 每次尝试要么回溯，要么在通往解的那条路上
+        assert 0 <= stats.settles - stats.backtracks <= stats.max_depth
+        assert not stats.running and stats.wall_time > 0
+
+def test_solve_step_stats():
+    puzzle = load_puzzle("hardest")
+    for kwargs in ({}, {"use_trail": True}):
+        s = Sudoku(puzzle, **kwargs)
+        ret, stats = s.solve(with_stats=True)
+        assert ret is not None
+        assert stats is s.stats
+        assert s.get_counter_stat() == (stats.nodes, stats.wall_time)
+        assert sum(stats.placements.values()) > 0
+        assert stats.placements["hidden_single_row"] > 0
+        assert len(stats.depth_histogram) == stats.max_depth + 1
+
+def test_merge_and_export():
+    test_df = load_data("hardest", 5)
+    all_stats = [Sudoku(convert_to_matrix(p)).solve_compiled(with_stats=True)[1] for p in test_df["puzzle"]]
+
+    total = sum(all_stats)
+    assert total.nodes == sum(st.nodes for st in all_stats)
+    assert total.max_depth == max(st.max_depth for st in all_stats)
+    assert total.wall_time == pytest.approx(sum(st.wall_time for st in all_stats))
+    assert total.depth_histogram[0] == len(all_stats)
+    # sum 不改动原来的对象
+    assert all_stats[0].nodes < total.nodes
+
+    restored = SolveStats.from_dict(json.loads(total.to_json()))
+    assert restored.to_dict() == total.to_dict()
+    assert np.array_equal(restored.counters, total.counters)
+
+@pytest.mark.parametrize("parallel", [False, True])
+def test_solve_many_stats(parallel):
+    test_df = load_data("hardest", 20)
+    puzzles = convert_to_array(test_df["puzzle"])
+    solutions, status, node_counts, stats = solve_many(puzzles, parallel=parallel, with_stats=True)
+
+    expected = sum(Sudoku(p.reshape(9, 9)).solve_compiled(with_stats=True)[1] for p in puzzles)
+    assert stats.nodes == node_counts.sum()
+    for key in ("nodes", "settles", "backtracks", "max_depth", "placements", "depth_histogram"):
+        assert stats.to_dict()[key] == expected.to_dict()[key]
+
+@pytest.mark.parametrize("kwargs", [{}, {"use_trail": True}, {"bitmask": True}])
+def test_profile(kwargs):
+    puzzle = load_puzzle("hardest")
+    s = Sudoku(puzzle, **kwargs)
+    ret, stats = s.solve(with_stats=True)
+    assert stats.phases is None and "phases" not in stats.to_dict()
+    assert type(s.new_solving_board()) in (SolvingBoard, BitSolvingBoard)
+
+    ps = Sudoku(puzzle, profile=True, **kwargs)
+    pret, pstats = ps.solve(with_stats=True)
+    assert np.array_equal(ret.assigned_board, pret.assigned_board)
+    assert np.array_equal(stats.counters, pstats.counters)
+
+    records = pstats.phases.records
+    assert records["get_least_cand_pos"][0] == pstats.nodes
+    # SolvingBoard 初始化时 settle 的已知数也计入
+    givens = 0 if kwargs.get("bitmask") else np.count_nonzero(puzzle)
+    # quickdrops 填的数也经过 settle，失败的那一次不计入 placements
+    placed = sum(pstats.placements.values())
+    assert pstats.settles + placed + givens <= records["settle"][0] <= pstats.settles + placed + givens + records["quickdrops"][0]
+    assert records["quickdrops"][0] <= pstats.settles
+    # 每种扫描单独计时
+    if kwargs.get("bitmask"):
+        # settle 失败时不再检查，初始化时检查一次；settle 的 self time 不含检查
+        assert 0 < records["check_after_settle"][0] <= records["settle"][0] + 1
+        assert records["check_after_settle"][1] <= records["settle"][1]
+        assert records["settle"][2] < records["settle"][1]
+        for phase in SCANNER_PHASES:
+            assert records[phase][0] >= records["quickdrops"][0]
+    else:
+        assert "check_after_settle" not in records
+        # 每放一个数扫一次，最后一次没有找到（放下后冲突则没有这一次）
+        assert placed <= records["quickdrops.next_single"][0] <= placed + records["quickdrops"][0]
+    for calls, total_time, self_time in records.values():
+        assert calls > 0 and 0 <= self_time <= total_time + 1e-9
+
+    restored = SolveStats.from_dict(json.loads(pstats.to_json()))
+    assert restored.phases.to_dict() == pstats.phases.to_dict()
+    assert (pstats + pstats).phases.records["settle"][0] == 2 * records["settle"][0]
+    assert "settle" in pstats.phases.report()
+
+def test_profile_constraints():
+    puzzle = KILLER_PUZZLE
+    kc1, kc2 = killer_cages()
+
+    s = Sudoku(puzzle, [kc1, kc2])
+    s.solve_true_candidates()
+    ps = Sudoku(puzzle, [kc1, kc2], profile=True)
+    pstats = ps.solve_true_candidates()
+    assert np.array_equal(s.tuf_board, ps.tuf_board)
+
+    records = pstats.phases.records
+    settle_calls = records["settle"][0]
+    # settle 失败时不会再调用约束
+    assert 0 < records["KillerConstraint[0].scoped_candidates"][0] <= settle_calls
+    # 只有看着的格子填了数才算，格子少的笼子算得少
+    assert 0 < records["KillerConstraint[1].scoped_candidates"][0] < records["KillerConstraint[0].scoped_candidates"][0]
+    assert pstats.constraint_evals == sum(records[f"KillerConstraint[{k}].scoped_candidates"][0] for k in range(2))
+    assert pstats.constraint_skips > 0
+    # settle 的 self time 不含约束
+    constraint_time = sum(records[f"KillerConstraint[{k}].scoped_candidates"][1] for k in range(2))
+    assert records["settle"][2] <= records["settle"][1] - constraint_time + 1e-9
+
+    # 多线程时每个试探的统计合并到协调者
+    ts = Sudoku(puzzle, [kc1, kc2], profile=True)
+    tstats = ts.solve_true_candidates(max_workers=2, use_threads=True)
+    assert np.array_equal(s.tuf_board, ts.tuf_board)
+    assert tstats.phases.records["settle"][0] > 0
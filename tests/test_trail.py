@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from src.solver import Sudoku
+from tests.helpers import convert_to_matrix, load_data, load_puzzle, killer_true_candidates
+
+@pytest.mark.parametrize("data_set, max_num_rows", [
+    ("mid", 50),
+    ("zbrSuperhard", 50),
+    ("hardest", 20)
+])
+def test_same_as_copy(data_set, max_num_rows):
+    test_df = load_data(data_set, max_num_rows)
+    for puzzle_str in test_df["puzzle"]:
+        puzzle = convert_to_matrix(puzzle_str)
+
+        s = Sudoku(puzzle)
+        ret = s.solve()
+
+        ts = Sudoku(puzzle, use_trail=True)
+        tret = ts.solve()
+
+        assert ret is not None and tret is not None
+        assert np.array_equal(ret.assigned_board, tret.assigned_board)
+        assert s.search_counter == ts.search_counter
+
+def test_undo_restores_boards():
+    puzzle = load_puzzle("hard")
+    sol = Sudoku(puzzle, use_trail=True).new_solving_board()
+    assigned_board = sol.assigned_board.copy()
+    candidates_board = sol.candidates_board.copy()
+
+    snapshot = sol.snapshot()
+    _, pos = sol.get_least_cand_pos()
+    sol.settle(pos, sol.get_cands(pos)[0])
+    sol.quickdrops()
+    assert not np.array_equal(sol.assigned_board, assigned_board)
+
+    sol.restore(snapshot)
+    assert np.array_equal(sol.assigned_board, assigned_board)
+    assert np.array_equal(sol.candidates_board, candidates_board)
+
+def test_killer_cand():
+    s = killer_true_candidates()
+    ts = killer_true_candidates(use_trail=True)
+    assert np.array_equal(s.tuf_board, ts.tuf_board)
+    assert s.search_counter == ts.search_counter
+
+def test_trail_with_bitmask():
+    with pytest.raises(ValueError):
+        Sudoku(np.zeros((9, 9), dtype=np.int8), bitmask=True, use_trail=True)
+
+def test_restrict_cells_scratch():
+    puzzle = load_puzzle("hard")
+    sol = Sudoku(puzzle, use_trail=True).new_solving_board()
+    other = sol.copy()
+    assert other.scratch is not sol.scratch
+
+    # 每个格子只留 1、2；重复 10 次，要删的候选比缓冲区多，分批删结果一样
+    positions = np.argwhere(sol.assigned_board == 0)
+    masks = np.full(len(positions), 0b11, dtype=np.uint16)
+    assert sol.restrict_cells(positions, masks)
+    assert other.restrict_cells(np.tile(positions, (10, 1)), np.tile(masks, 10))
+    assert np.array_equal(sol.candidates_board, other.candidates_board)
+    assert np.array_equal(sol.counts, other.counts)
+    assert not other.restrict_cells(positions, masks)
+
+    for i, j in positions:
+        assert sol.get_cands((i, j)) == tuple(np.flatnonzero(sol.candidates_board[i, j]) + 1)
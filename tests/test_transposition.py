@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from src.solver import Sudoku
+from src.solver.stats import SolveStats
+from src.solver.transposition import DeadStateTable, zobrist_hash
+from tests.helpers import convert_to_matrix, load_data, load_puzzle
+
+def test_dead_state_table():
+    table = DeadStateTable(capacity=8)
+    assert table.capacity == 8
+
+    table.add(np.uint64(12345))
+    assert np.uint64(12345) in table
+    assert np.uint64(54321) not in table
+    assert (table.hits, table.misses) == (1, 1)
+
+    # 同一组里塞满后淘汰最久没用的
+    keys = [np.uint64(k * 4 + 1) for k in range(100)]
+    for key in keys:
+        table.add(key)
+    assert len(table) <= table.capacity
+    assert table.evictions > 0
+    assert keys[-1] in table
+
+def test_zobrist_incremental():
+    puzzle = load_puzzle("hard")
+    for bitmask in [False, True]:
+        ret = Sudoku(puzzle, bitmask=bitmask).solve()
+        assert ret is not None
+        assert ret.zobrist == zobrist_hash(ret.assigned_board)
+
+@pytest.mark.parametrize("bitmask", [False, True])
+def test_same_true_candidates(bitmask):
+    test_df = load_data("hardest", 3)
+    for puzzle_str in test_df["puzzle"]:
+        puzzle = convert_to_matrix(puzzle_str)
+
+        s = Sudoku(puzzle, bitmask=bitmask)
+        s.solve_true_candidates()
+
+        ts = Sudoku(puzzle, bitmask=bitmask, dead_table_capacity=1 << 12)
+        ts.solve_true_candidates()
+
+        assert np.array_equal(s.tuf_board, ts.tuf_board)
+        assert ts.search_counter <= s.search_counter
+        assert ts.dead_table is not None
+        assert ts.dead_table.misses == ts.search_counter
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_dead_table_stats(max_workers):
+    puzzle = load_puzzle("hardest", 1)
+    s = Sudoku(puzzle, dead_table_capacity=1 << 12)
+    stats = s.solve_true_candidates(max_workers=max_workers, use_threads=True)
+    # 每个节点都先查一次表；并行时是各个 worker 的表加起来
+    assert stats.dead_misses == stats.nodes
+    assert stats.dead_hits > 0
+    if max_workers == 1:
+        assert (stats.dead_hits, stats.dead_misses, stats.dead_evictions) == (s.dead_table.hits, s.dead_table.misses, s.dead_table.evictions)
+
+    d = stats.to_dict()
+    assert (d["dead_hits"], d["dead_misses"], d["dead_evictions"]) == (stats.dead_hits, stats.dead_misses, stats.dead_evictions)
+    assert SolveStats.from_dict(d).dead_misses == stats.dead_misses
+
+    ret, stats = Sudoku(puzzle, dead_table_capacity=1 << 12).solve(with_stats=True)
+    assert ret is not None
+    assert stats.dead_misses == stats.nodes
@@ -0,0 +1,143 @@
+import numpy as np
+import pytest
+from src.solver import Sudoku, count_many, solve_many, SOLVED, ABORTED, INVALID
+from tests.helpers import convert_to_array, load_data
+
+def is_valid_solution(board, puzzle):
+    board = board.reshape(9, 9)
+    digits = np.arange(1, 10)
+    boxes = board.reshape(3, 3, 3, 3).transpose(0, 2, 1, 3).reshape(9, 9)
+    return (np.all(np.sort(board, axis=1) == digits) and np.all(np.sort(board.T, axis=1) == digits)
+            and np.all(np.sort(boxes, axis=1) == digits) and np.all((puzzle.reshape(9, 9) == 0) | (puzzle.reshape(9, 9) == board)))
+
+@pytest.mark.parametrize("data_set, max_num_rows", [
+    ("mid", 300),
+    ("hardest", 50)
+])
+def test_unique_puzzles(data_set, max_num_rows):
+    test_df = load_data(data_set, max_num_rows)
+    puzzles = convert_to_array(test_df["puzzle"])
+
+    counts, solutions, status, node_counts = count_many(puzzles)
+    assert np.all(counts == 1) and np.all(status == SOLVED)
+    assert np.array_equal(solutions[:, 0], solve_many(puzzles)[0])
+    assert not solutions[:, 1].any()
+
+    for k in range(0, len(puzzles), max(1, len(puzzles) // 10)):
+        s = Sudoku(puzzles[k].reshape(9, 9))
+        count, sols = s.count_solutions()
+        assert count == 1 and s.is_unique()
+        assert np.array_equal(sols.reshape(81), solutions[k, 0])
+        # 证明唯一要搜完整棵树，节点数不少于找到第一个解
+        assert s.search_counter == node_counts[k]
+        assert node_counts[k] >= solve_many(puzzles[[k]])[2][0]
+
+def test_multiple_solutions():
+    test_df = load_data("easy", 20)
+    rng = np.random.default_rng(0)
+    puzzles = convert_to_array(test_df["solution"])
+    for puzzle in puzzles:
+        puzzle[rng.choice(81, 50, replace=False)] = 0
+
+    counts, solutions, status, _ = count_many(puzzles, limit=10000)
+    assert np.all(status == SOLVED) and np.all(counts >= 1) and np.any(counts > 1)
+    for k, puzzle in enumerate(puzzles):
+        found = solutions[k, :counts[k]]
+        assert all(is_valid_solution(board, puzzle) for board in found)
+        assert len(np.unique(found, axis=0)) == counts[k]
+        assert not solutions[k, counts[k]:].any()
+
+    # 到 limit 就停，找到的是完整搜索的前几个解
+    limited_counts, limited_solutions, _, _ = count_many(puzzles, limit=2)
+    assert np.array_equal(limited_counts, np.minimum(counts, 2))
+    for k in range(len(puzzles)):
+        assert np.array_equal(limited_solutions[k, :limited_counts[k]], solutions[k, :limited_counts[k]])
+
+    pcounts, psolutions, pstatus, _ = count_many(puzzles, limit=10000, parallel=True, num_threads=2)
+    assert np.array_equal(counts, pcounts) and np.array_equal(solutions, psolutions)
+
+    k = int(np.argmax(counts))
+    s = Sudoku(puzzles[k].reshape(9, 9))
+    assert s.is_unique() is False
+    count, sols = s.count_solutions(limit=10000)
+    assert count == counts[k] and np.array_equal(sols.reshape(-1, 81), solutions[k, :count])
+
+def test_count_status():
+    puzzles = np.zeros((3, 81), dtype=np.int8)
+    puzzles[1, 0:2] = [5, 5]     # 同一行重复
+    puzzles[2, 0] = 10           # 非法数字
+    counts, solutions, status, _ = count_many(puzzles, limit=5)
+    assert status.tolist() == [SOLVED, INVALID, INVALID]
+    assert counts.tolist() == [5, 0, 0]
+    assert all(is_valid_solution(board, puzzles[0]) for board in solutions[0])
+    assert len(np.unique(solutions[0], axis=0)) == 5
+
+    counts, _, status, _ = count_many(puzzles[[0]], limit=1000, max_nodes=100)
+    assert status.tolist() == [ABORTED]
+    s = Sudoku(np.zeros((9, 9), dtype=np.int8))
+    count, sols = s.count_solutions(limit=1000, max_nodes=100)
+    assert count is None and len(sols) == counts[0]
+    # 两个解在 100 个节点之内就找到了
+    assert s.is_unique(max_nodes=100) is False
+
+    with pytest.raises(ValueError):
+        count_many(puzzles, limit=0)
+
+def test_count_stats():
+    test_df = load_data("hard", 20)
+    puzzles = convert_to_array(test_df["puzzle"])
+    _, _, _, node_counts, stats = count_many(puzzles, with_stats=True)
+    assert stats.nodes == node_counts.sum()
+    (count, _), s_stats = Sudoku(puzzles[0].reshape(9, 9)).count_solutions(with_stats=True)
+    assert count == 1 and s_stats.nodes == node_counts[0]
+
+@pytest.mark.parametrize("kwargs", [
+    {},
+    {"use_trail": True},
+    {"bitmask": True},
+    {"dead_table_capacity": 4096},
+])
+def test_iter_solutions(kwargs):
+    test_df = load_data("hard", 5)
+    for puzzle, solution in zip(convert_to_array(test_df["puzzle"]), convert_to_array(test_df["solution"])):
+        solutions = list(Sudoku(puzzle.reshape(9, 9), **kwargs).iter_solutions())
+        assert len(solutions) == 1 and np.array_equal(solutions[0].reshape(81), solution)
+
+    rng = np.random.default_rng(1)
+    puzzles = convert_to_array(load_data("easy", 5)["solution"])
+    for puzzle in puzzles:
+        puzzle[rng.choice(81, 50, replace=False)] = 0
+    counts, all_solutions, _, _ = count_many(puzzles, limit=10000)
+    for k, puzzle in enumerate(puzzles):
+        s = Sudoku(puzzle.reshape(9, 9), **kwargs)
+        solutions = np.array(list(s.iter_solutions())).reshape(-1, 81)
+        assert not s.stats.running
+        assert len(solutions) == counts[k]
+        if kwargs.get("bitmask"):
+            # 与编译版的搜索顺序相同
+            assert np.array_equal(solutions, all_solutions[k, :counts[k]])
+        else:
+            assert set(map(bytes, solutions)) == set(map(bytes, all_solutions[k, :counts[k]]))
+        # 第一个解就是 solve 的解
+        assert np.array_equal(solutions[0], Sudoku(puzzle.reshape(9, 9), **kwargs).solve().assigned_board.reshape(81))
+
+def test_iter_solutions_constraints():
+    from src.config import CONFIG_PUZZLE_BOARD, CONFIG_CONSTRAINTS
+    s = Sudoku(CONFIG_PUZZLE_BOARD, CONFIG_CONSTRAINTS)
+    it = s.iter_solutions()
+    solutions = [next(it) for _ in range(5)]
+    assert s.stats.running
+    it.close()
+    assert not s.stats.running
+    assert len(np.unique(np.array(solutions), axis=0)) == 5
+    for board in solutions:
+        assert is_valid_solution(board, CONFIG_PUZZLE_BOARD)
+        assert all(constraint.is_valid(board) for constraint in CONFIG_CONSTRAINTS)
+
+    # 约束编译进了 nopython 的搜索，传播更强，找到的顺序不一定相同
+    count, count_solutions = Sudoku(CONFIG_PUZZLE_BOARD, CONFIG_CONSTRAINTS).count_solutions(limit=3)
+    assert count == 3 and len(np.unique(count_solutions, axis=0)) == 3
+    for board in count_solutions:
+        assert is_valid_solution(board, CONFIG_PUZZLE_BOARD)
+        assert all(constraint.is_valid(board) for constraint in CONFIG_CONSTRAINTS)
+    assert s.count_solutions(max_nodes=10)[0] is None
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+from src.solver import Sudoku
+from src.solver.watches import ConstraintWatches
+from src.constraints import Constraint, KillerConstraint, SparseKillerConstraint
+from tests.helpers import convert_to_matrix, load_data
+
+class Unscoped(Constraint):
+    def is_valid(self, assigned_board):
+        return True
+
+def test_watch_index():
+    killer = KillerConstraint([(0, 0), (0, 1)], 3)
+    sparse = SparseKillerConstraint([(0, 1), (1, 1)], 4)
+    other = KillerConstraint([(8, 8), (8, 7)], 17)
+    watches = ConstraintWatches([killer, sparse, Unscoped(), other])
+
+    # 不用候选数的只看自己的格子；用候选数的还看同行、列、宫的格子；没有 scope 的看所有格子
+    assert watches.cell_watchers[0 * 9 + 0] == (0, 1, 2)
+    assert watches.cell_watchers[0 * 9 + 5] == (1, 2)
+    assert watches.cell_watchers[4 * 9 + 4] == (2,)
+    assert watches.cell_watchers[8 * 9 + 8] == (2, 3)
+    # 删了候选数之后，重叠的、用候选数的约束要再算
+    assert watches.overlaps == ((1,), (), (1,), ())
+    assert watches.all_constraints == (0, 1, 2, 3)
+
+@pytest.mark.parametrize("bitmask", [False, True])
+def test_constraints_applied_at_init(bitmask):
+    # 没有已知数在笼子附近，也要先算一遍
+    sol = Sudoku(np.zeros((9, 9), dtype=np.int8), [KillerConstraint([(4, 4), (4, 5)], 3)], bitmask=bitmask).new_solving_board()
+    assert np.flatnonzero(sol.candidates_board[4, 4]).tolist() == [0, 1]
+    assert np.flatnonzero(sol.candidates_board[4, 5]).tolist() == [0, 1]
+
+@pytest.mark.parametrize("bitmask, use_trail", [(False, False), (False, True), (True, False)])
+def test_many_cages(bitmask, use_trail):
+    test_df = load_data("hard", 2)
+    for puzzle_str, solution_str in zip(test_df["puzzle"], test_df["solution"]):
+        puzzle = convert_to_matrix(puzzle_str)
+        solution = convert_to_matrix(solution_str)
+        # 每行 4 个两格的笼子，共 36 个
+        cages = [KillerConstraint([(i, j), (i, j + 1)], int(solution[i, j] + solution[i, j + 1]))
+                 for i in range(9) for j in range(0, 8, 2)]
+        s = Sudoku(puzzle, cages, bitmask=bitmask, use_trail=use_trail)
+        ret = s.solve()
+        assert np.array_equal(ret.assigned_board, solution)
+        # 每次填数只叫醒这个格子上的一个笼子（初始化时每个都算一遍）
+        assert s.stats.constraint_skips > 10 * s.stats.constraint_evals